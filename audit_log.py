@@ -0,0 +1,421 @@
+"""预测审计日志
+
+每次预测的输入向量、模型版本、累积活产概率（显示的校准后概率和模型原始输出）、风险分层和SHAP向量
+追加写入SQLite（WAL模式）。
+log() / log_many() 只把记录（log_many 的一批作为一项）放入有界队列；后台线程按批
+（最多 batch_size 条或每 flush_interval 秒）在一个事务中写入，正常情况下页面请求不等待磁盘。
+    队列满时最多等待 put_timeout 秒，仍满则由调用线程直接把记录追加到溢出文件（请求不会无限期挂起）；
+    写入失败时按退避重试 WRITE_RETRIES 次，仍失败则把该批追加到溢出文件，之后写入成功时（以及下次启动时）
+    再导入数据库；溢出文件也写不进时写入线程一直重试，调用线程则放弃该记录并计入 dropped。
+溢出文件按进程区分（<数据库>.spill-<进程号>.jsonl），进程存活期间对 <数据库>.spill-<进程号>.lock 持有文件锁；
+导入时只处理本进程和已退出进程（锁可获取）的溢出文件，不会改名其他进程仍在追加的文件。
+
+特征和SHAP向量以float64二进制保存（每条约250字节）；时间戳列有索引，
+按时间范围查询只读取范围内的行。
+
+用法：
+    python audit_log.py --since "2026-10-01" --until "2026-10-08" -o audit.csv
+"""
+import argparse
+import atexit
+import glob
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from inference import BASE_DIR, FEATURE_NAMES
+
+AUDIT_DB = os.environ.get('AUDIT_DB', os.path.join(BASE_DIR, 'audit.sqlite3'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    model TEXT NOT NULL,
+    features BLOB NOT NULL,
+    birth_prob REAL NOT NULL,
+    risk_level TEXT NOT NULL,
+    shap BLOB,
+    expected_value REAL,
+    source TEXT,
+    raw_prob REAL
+);
+CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts);
+"""
+
+# 旧版本建立的表缺少的列（列名, 类型）
+_ADDED_COLUMNS = [('raw_prob', 'REAL')]
+
+INSERT_SQL = ('INSERT INTO predictions (ts, model, features, birth_prob, risk_level, shap, expected_value, '
+              'source, raw_prob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+# 写入失败后的重试次数和退避时间（秒）；用尽重试后写入溢出文件
+WRITE_RETRIES = 3
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+# 记录中的二进制列（特征、SHAP），溢出文件中以十六进制保存
+_BLOB_COLUMNS = (2, 5)
+
+# 队列满时 log() 最多等待的秒数，超时后由调用线程直接写溢出文件
+PUT_TIMEOUT = 1.0
+
+# 写入线程退出标记
+_STOP = object()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def _blob(values):
+    return None if values is None else np.asarray(values, dtype=np.float64).tobytes()
+
+
+def _try_lock(f):
+    """对已打开的文件加非阻塞排他锁，已被其他进程锁住时返回False；进程退出时锁自动释放"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _spill_owner(path, prefix):
+    """溢出文件名中的进程号（<前缀>.spill-<进程号>[-<序号>].jsonl）"""
+    return path[len(prefix):-len('.jsonl')].split('-')[0]
+
+
+class AuditLog:
+    """带后台批量写入线程的审计日志"""
+
+    def __init__(self, path=AUDIT_DB, max_queue=10000, batch_size=500, flush_interval=1.0,
+                 put_timeout=PUT_TIMEOUT):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.spill_path = f'{path}.spill-{os.getpid()}.jsonl'
+        self.lock_path = f'{path}.spill-{os.getpid()}.lock'
+        self._spill_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._queued = 0
+        self.written = 0
+        self.spilled = 0
+        self.overflowed = 0
+        self.dropped = 0
+        self.recovered = 0
+        self.batches = 0
+        self.last_error = None
+        self._has_spill = bool(glob.glob(f'{glob.escape(path)}.spill-*.jsonl'))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 进程存活期间一直持有该锁，其他进程据此判断本进程的溢出文件是否还会被追加
+        self._owner_lock = open(self.lock_path, 'a+b')
+        _try_lock(self._owner_lock)
+        with closing(_connect(path)) as conn, conn:
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(predictions)')}
+            for column, column_type in _ADDED_COLUMNS:
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE predictions ADD COLUMN {column} {column_type}')
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, model, features, birth_prob, risk_level, shap_value=None, expected_value=None, source='web',
+            raw_prob=None):
+        """记录一次预测（只入队，不等待写入）
+
+        birth_prob 为显示的（校准后）概率，raw_prob 为模型原始输出（默认与 birth_prob 相同）。
+        """
+        record = (time.time(), model, _blob(features), float(birth_prob), str(risk_level), _blob(shap_value),
+                  None if expected_value is None else float(expected_value), source,
+                  float(birth_prob if raw_prob is None else raw_prob))
+        self._enqueue([record])
+
+    def log_many(self, model, X, birth_probs, risk_levels, source, raw_probs=None):
+        """记录一批预测（批量评分、服务接口；不含SHAP向量），整批作为队列中的一项"""
+        now = time.time()
+        X = np.asarray(X, dtype=np.float64)
+        raw_probs = birth_probs if raw_probs is None else raw_probs
+        records = [(now, model, x.tobytes(), float(p), str(level), None, None, source, float(raw))
+                   for x, p, level, raw in zip(X, birth_probs, risk_levels, raw_probs)]
+        if records:
+            self._enqueue(records)
+
+    def _enqueue(self, records):
+        """放入队列；队列满超过 put_timeout 秒时在调用线程中直接写溢出文件"""
+        try:
+            self._queue.put(records, timeout=self.put_timeout)
+        except queue.Full:
+            pass
+        else:
+            with self._count_lock:
+                self._queued += len(records)
+            return
+        try:
+            self._spill(records)
+            self.overflowed += len(records)
+        except OSError as e:
+            self.dropped += len(records)
+            self._error(f"审计日志队列已满且溢出文件写入失败，丢弃 {len(records)} 条记录: {e}")
+
+    def _run(self):
+        conn = _connect(self.path)
+        if self._has_spill:
+            self._recover(conn)
+        stopping = False
+        while not stopping:
+            # 阻塞等待第一项，之后在flush_interval内尽量凑满一个批次
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while item is not _STOP:
+                batch.extend(item)
+                with self._count_lock:
+                    self._queued -= len(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            stopping = item is _STOP
+            if batch:
+                self._write(conn, batch)
+        conn.close()
+
+    def _write(self, conn, batch):
+        """写入一批：失败时退避重试，重试用尽后写入溢出文件；溢出文件也写不进时一直重试"""
+        delay = RETRY_DELAY
+        attempt = 0
+        while True:
+            try:
+                with conn:
+                    conn.executemany(INSERT_SQL, batch)
+            except sqlite3.Error as e:
+                self._error(f"审计日志写入失败: {e}")
+            else:
+                self.written += len(batch)
+                self.batches += 1
+                if self._has_spill:
+                    self._recover(conn)
+                return
+
+            attempt += 1
+            if attempt >= WRITE_RETRIES:
+                try:
+                    self._spill(batch)
+                    return
+                except OSError as e:
+                    self._error(f"审计日志溢出文件写入失败: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def _error(self, message):
+        self.last_error = message
+        print(message, file=sys.stderr)
+
+    def _spill(self, batch):
+        lines = []
+        for record in batch:
+            record = list(record)
+            for i in _BLOB_COLUMNS:
+                record[i] = None if record[i] is None else record[i].hex()
+            lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+        # 写入线程和（队列满时的）调用线程都可能追加，导入时也要在锁内改名
+        with self._spill_lock:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.spilled += len(batch)
+            self._has_spill = True
+
+    def _owner_alive(self, pid):
+        """溢出文件所属进程是否仍在运行（仍持有其锁文件的锁）"""
+        try:
+            with open(f'{self.path}.spill-{pid}.lock', 'r+b') as f:
+                return not _try_lock(f)
+        except FileNotFoundError:
+            # 没有锁文件：进程已正常退出（或为旧版本遗留的溢出文件）
+            return False
+        except OSError:
+            return True
+
+    def _claim(self, path, own):
+        """改名认领溢出文件，避免多个进程重复导入；已被其他进程认领时返回None"""
+        claimed = f'{path}.importing-{os.getpid()}'
+        try:
+            if own:
+                with self._spill_lock:
+                    os.rename(path, claimed)
+            else:
+                os.rename(path, claimed)
+        except OSError:
+            return None
+        return claimed
+
+    def _recover(self, conn):
+        """把本进程和已退出进程遗留的溢出文件导入数据库；仍在运行的其他进程的溢出文件由其自己导入"""
+        self._has_spill = False
+        prefix = f'{self.path}.spill-'
+        pid = str(os.getpid())
+        for path in glob.glob(f'{glob.escape(prefix)}*.jsonl'):
+            owner = _spill_owner(path, prefix)
+            own = owner == pid
+            if not own and self._owner_alive(owner):
+                continue
+            claimed = self._claim(path, own)
+            if claimed is None:
+                continue
+            records = []
+            with open(claimed, encoding='utf-8') as f:
+                for n, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 进程在写入途中退出时最后一行可能不完整
+                        self._error(f"审计日志溢出文件 {path} 第 {n} 行无法解析，已跳过")
+                        continue
+                    for i in _BLOB_COLUMNS:
+                        record[i] = None if record[i] is None else bytes.fromhex(record[i])
+                    records.append(record)
+            try:
+                with conn:
+                    conn.executemany(INSERT_SQL, records)
+            except sqlite3.Error as e:
+                # 数据库仍不可写：改回溢出文件名（另取新名，不覆盖原路径上新写入的文件），下次写入成功后再导入
+                self._error(f"导入审计日志溢出文件失败: {e}")
+                os.rename(claimed, f'{prefix}{pid}-{time.time_ns()}.jsonl')
+                self._has_spill = True
+                return
+            os.remove(claimed)
+            self.recovered += len(records)
+            print(f"已从溢出文件导入 {len(records)} 条审计记录", file=sys.stderr)
+
+    def close(self, timeout=10.0):
+        """写完队列中剩余的记录后停止写入线程"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        if not self._thread.is_alive() and not self._owner_lock.closed:
+            # 锁文件由本进程删除（其他进程只检查、不删除），再释放锁
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+            self._owner_lock.close()
+
+    def stats(self):
+        return {
+            'queued': self._queued,
+            'written': self.written,
+            'spilled': self.spilled,
+            'overflowed': self.overflowed,
+            'dropped': self.dropped,
+            'recovered': self.recovered,
+            'batches': self.batches,
+            'last_error': self.last_error
+        }
+
+
+def query(start=None, end=None, model=None, limit=None, path=AUDIT_DB, feature_columns=FEATURE_NAMES):
+    """按时间范围 [start, end) 读取审计记录（时间为Unix秒或本地时间的datetime），返回DataFrame
+
+    特征展开为各特征列，SHAP值展开为 shap_<特征> 列（未计算SHAP的记录为NaN）。
+    """
+    import pandas as pd
+
+    clauses, params = [], []
+    for column, op, value in (('ts', '>=', start), ('ts', '<', end), ('model', '=', model)):
+        if value is not None:
+            clauses.append(f'{column} {op} ?')
+            params.append(value.timestamp() if isinstance(value, datetime) else value)
+    sql = ('SELECT ts, model, features, birth_prob, risk_level, shap, expected_value, source, raw_prob '
+           'FROM predictions')
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY ts'
+    if limit is not None:
+        sql += f' LIMIT {int(limit)}'
+
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    n_features = len(feature_columns)
+    features = np.frombuffer(b''.join(r[2] for r in rows), dtype=np.float64).reshape(len(rows), n_features)
+    shap_values = np.full((len(rows), n_features), np.nan)
+    for i, r in enumerate(rows):
+        if r[5] is not None:
+            shap_values[i] = np.frombuffer(r[5], dtype=np.float64)
+
+    frame = pd.DataFrame({
+        'time': pd.to_datetime([datetime.fromtimestamp(r[0]) for r in rows]),
+        'model': [r[1] for r in rows],
+        'birth_prob': [r[3] for r in rows],
+        'raw_prob': [r[8] for r in rows],
+        'risk_level': [r[4] for r in rows],
+        'expected_value': [r[6] for r in rows],
+        'source': [r[7] for r in rows]
+    })
+    frame[list(feature_columns)] = features
+    frame[[f'shap_{c}' for c in feature_columns]] = shap_values
+    return frame
+
+
+def _parse_time(text):
+    return datetime.fromisoformat(text) if text else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出预测审计日志")
+    parser.add_argument('--db', default=AUDIT_DB, help="审计日志数据库")
+    parser.add_argument('--since', type=_parse_time, help="起始时间（含），如 2026-10-01 或 2026-10-01T08:00")
+    parser.add_argument('--until', type=_parse_time, help="结束时间（不含）")
+    parser.add_argument('--model', help="只导出该模型版本（名称:版本）")
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('-o', '--output', help="输出CSV文件（不指定则打印摘要）")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"审计日志不存在：{args.db}")
+    frame = query(args.since, args.until, args.model, args.limit, args.db)
+    if args.output:
+        frame.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"已导出 {len(frame)} 条记录 → {args.output}", file=sys.stderr)
+    else:
+        print(f"{len(frame)} 条记录")
+        if len(frame):
+            print(frame[['time', 'model', 'birth_prob', 'risk_level']].tail(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
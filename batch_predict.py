@@ -0,0 +1,157 @@
+"""累积活产率批量评分命令行工具
+
+按固定大小分块流式读取CSV/Parquet患者文件，每块只做一次标准化和一次predict_proba，
+输出累积活产概率及风险分层，内存占用与文件大小无关。
+默认加载校准文件（calibration.npz，与 web.py 相同），存在时输出校准后的概率（另附模型原始输出 raw_birth_prob），
+风险分层使用校准文件中的边界；--no-calibration 输出模型原始概率。
+
+用法：
+    python batch_predict.py patients.csv -o scores.csv
+    python batch_predict.py patients.parquet -o scores.parquet --chunk-size 100000 --keep patient_id
+    python batch_predict.py patients.csv -o scores.csv --calibration calibration.npz
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from calibration import add_calibration_arguments, calibrator_from_args
+from inference import load_artifacts, load_exported, predict_batch, risk_levels
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+def check_parquet_support(parser, *paths):
+    """命令行涉及Parquet文件但未安装pyarrow时直接报错退出，而不是在读写时抛出ImportError"""
+    if any(path and is_parquet(path) for path in paths):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("读写Parquet文件需要安装 pyarrow（pip install pyarrow），或改用CSV文件")
+
+
+def read_columns(path):
+    """读取输入文件的列名（不加载数据）"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def iter_chunks(path, chunk_size, columns=None, text_columns=()):
+    """按固定行数分块读取CSV/Parquet文件；text_columns 在CSV中按文本读取（保留患者编号的前导零等）"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=columns,
+                               dtype=dict.fromkeys(text_columns, str) or None)
+
+
+def keep_text_columns(keep_columns, feature_columns):
+    """原样输出的列中按文本读取的部分（特征列仍按数值读取）"""
+    return [c for c in keep_columns if c not in feature_columns]
+
+
+class ChunkWriter:
+    """逐块追加写出结果（CSV或Parquet），不在内存中累积整个结果集"""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = is_parquet(path)
+        self._writer = None
+        self._file = None
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            first = self._file is None
+            if first:
+                # utf-8-sig 便于Excel正确显示中文风险分层
+                self._file = open(self.path, 'w', newline='', encoding='utf-8-sig')
+            df.to_csv(self._file, header=first, index=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def score_chunk(model, scaler, feature_columns, chunk, keep_columns=(), calibrator=None):
+    """对一个数据块评分，返回保留列 + 概率 + 风险分层（calibrator 为 calibration.Calibrator，恒等映射时不校准）"""
+    X = chunk[feature_columns].to_numpy(dtype=np.float64)
+    prediction = predict_batch(model, scaler, X)
+
+    result = chunk[list(keep_columns)].reset_index(drop=True)
+    if calibrator is None or calibrator.is_identity:
+        result['no_birth_prob'] = prediction[:, 0]
+        result['birth_prob'] = prediction[:, 1]
+        result['risk_level'] = risk_levels(prediction[:, 1])
+    else:
+        birth_prob = calibrator.calibrate(prediction[:, 1])
+        result['no_birth_prob'] = 1.0 - birth_prob
+        result['birth_prob'] = birth_prob
+        result['raw_birth_prob'] = prediction[:, 1]
+        result['risk_level'] = risk_levels(birth_prob, calibrator.thresholds)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="累积活产率批量评分")
+    parser.add_argument('input', help="患者数据文件（.csv 或 .parquet），需包含15个特征列")
+    parser.add_argument('-o', '--output', required=True, help="结果文件（.csv 或 .parquet）")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每块行数")
+    parser.add_argument('--keep', nargs='*', default=[], help="原样输出的列（如患者编号）")
+    parser.add_argument('--model-dir', help="使用 export_model.py 导出的模型目录（不加载pickle）")
+    add_calibration_arguments(parser)
+    args = parser.parse_args(argv)
+
+    check_parquet_support(parser, args.input, args.output)
+    model, scaler, feature_columns = load_exported(args.model_dir) if args.model_dir else load_artifacts()
+    calibrator = calibrator_from_args(parser, args)
+
+    # 检查输入列是否齐全
+    available = set(read_columns(args.input))
+    missing = [c for c in list(feature_columns) + args.keep if c not in available]
+    if missing:
+        parser.error(f"输入文件缺少列: {', '.join(missing)}")
+
+    columns = list(dict.fromkeys(list(feature_columns) + args.keep))
+
+    start = time.perf_counter()
+    n_rows = 0
+    with ChunkWriter(args.output) as writer:
+        for chunk in iter_chunks(args.input, args.chunk_size, columns,
+                                 keep_text_columns(args.keep, feature_columns)):
+            writer.write(score_chunk(model, scaler, feature_columns, chunk, args.keep, calibrator))
+            n_rows += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"已评分 {n_rows} 行（{n_rows / max(elapsed, 1e-9):.0f} 行/秒）", file=sys.stderr)
+
+    print(f"完成：{n_rows} 行，用时 {time.perf_counter() - start:.2f} 秒，结果写入 {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""特征贡献后端对比：XGBoost原生 pred_contribs 与 shap.TreeExplainer
+
+先在合成患者上校验两种后端的SHAP值和期望值一致，且 期望值 + ΣSHAP 能还原出模型的预测概率
+（超出容差时以非零状态退出），再对不同批量大小分别测量两种后端的耗时。
+
+用法：
+    python benchmarks/bench_attribution.py
+    python benchmarks/bench_attribution.py --batch-sizes 1 1000 100000 --repeat 5 --atol 1e-5
+"""
+import argparse
+import os
+import sys
+import warnings
+
+import numpy as np
+
+warnings.filterwarnings('ignore')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from explain import additivity_error, batch_shap_values, build_explainer  # noqa: E402
+from inference import load_artifacts, predict_batch  # noqa: E402
+from run_benchmarks import summarize, synthetic_patients, time_call  # noqa: E402
+
+
+def validate(model, scaler, X, explainers, atol):
+    """两种后端逐元素对比并做加性校验，返回是否在容差内"""
+    (native_values, native_expected), (shap_values, shap_expected) = (
+        batch_shap_values(model, X, explainer=explainers[name], n_jobs=1, scaler=scaler)
+        for name in ('native', 'shap')
+    )
+    value_diff = float(np.abs(native_values - shap_values).max())
+    expected_diff = abs(native_expected - shap_expected)
+    additivity = additivity_error(native_values, native_expected, predict_batch(model, scaler, X)[:, 1])
+    print(f"校验 {len(X)} 行：SHAP值最大差异 {value_diff:.3g}，期望值差异 {expected_diff:.3g}，"
+          f"加性误差（概率） {additivity:.3g}")
+    return value_diff <= atol and expected_diff <= atol and additivity <= atol
+
+
+def main():
+    parser = argparse.ArgumentParser(description="特征贡献后端对比")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--validate-rows', type=int, default=5000)
+    parser.add_argument('--atol', type=float, default=1e-5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    model, scaler, feature_columns = load_artifacts()
+    feature_columns = list(feature_columns)
+    explainers = {name: build_explainer(model, backend=name) for name in ('native', 'shap')}
+
+    X_all = synthetic_patients(max(max(args.batch_sizes), args.validate_rows), feature_columns, args.seed)
+    if not validate(model, scaler, X_all[:args.validate_rows], explainers, args.atol):
+        print("两种后端结果不一致")
+        sys.exit(1)
+
+    for n_rows in sorted(args.batch_sizes):
+        X = X_all[:n_rows]
+        p50 = {}
+        for name, explainer in explainers.items():
+            timings = time_call(lambda: batch_shap_values(model, X, explainer=explainer, n_jobs=1, scaler=scaler),
+                                args.repeat)
+            p50[name] = summarize(timings, n_rows)['p50_ms']
+        print(f"n={n_rows:<7} native {p50['native']:10.3f} ms   shap {p50['shap']:10.3f} ms   "
+              f"加速比 {p50['shap'] / p50['native']:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
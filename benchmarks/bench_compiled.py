@@ -0,0 +1,73 @@
+"""编译推理与Booster推理的对比基准
+
+Booster路径：FusedPredictor（原地标准化 + Booster.inplace_predict）
+编译路径：CompiledPredictor（原地标准化 + tree_compiler 节点数组遍历）
+
+先在合成患者（含缺失值）上校验两条路径的概率差异不超过 1e-6，再分别测量单行和批量耗时。
+
+用法：python benchmarks/bench_compiled.py [--repeat 5000] [--batch 1000]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+warnings.filterwarnings('ignore')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_predictor import measure, report  # noqa: E402
+from inference import FusedPredictor, load_artifacts  # noqa: E402
+from run_benchmarks import synthetic_patients  # noqa: E402
+from tree_compiler import CompiledPredictor  # noqa: E402
+
+TOLERANCE = 1e-6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编译推理微基准")
+    parser.add_argument('--repeat', type=int, default=5000, help="单行预测的重复次数")
+    parser.add_argument('--batch', type=int, default=1000, help="批量对比的行数")
+    parser.add_argument('--check-rows', type=int, default=100000, help="校验一致性的合成患者行数")
+    args = parser.parse_args()
+
+    model, scaler, feature_columns = load_artifacts()
+    fused = FusedPredictor.from_artifacts(model, scaler)
+    start = time.perf_counter()
+    compiled = CompiledPredictor.from_artifacts(model, scaler)
+    print(f"编译 {compiled.trees.n_trees} 棵树 / {compiled.trees.n_nodes} 个节点，"
+          f"深度 {compiled.trees.depth}，用时 {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    X = synthetic_patients(args.check_rows, list(feature_columns))
+    missing = X[:args.check_rows // 10].copy()
+    missing[np.random.default_rng(1).random(missing.shape) < 0.2] = np.nan
+    # 标准化后为 ±inf 的极端值（叶子节点不能因此离开叶子）
+    extreme = X[:args.check_rows // 10].copy()
+    extreme[np.random.default_rng(2).random(extreme.shape) < 0.2] = 1e308
+    extreme[::2, 0] = -1e308
+    for name, data in (("完整输入", X), ("含缺失值", missing), ("含极端值", extreme)):
+        diff = np.abs(fused.predict(data) - compiled.predict(data)).max()
+        print(f"{name}最大概率差异: {diff:.2e}")
+        if diff > TOLERANCE:
+            sys.exit(f"差异超过 {TOLERANCE:g}")
+
+    row = X[:1]
+    print("单行:")
+    base = report("  Booster", measure(lambda: fused.predict_proba(row), args.repeat), 1)
+    fast = report("  编译推理", measure(lambda: compiled.predict_proba(row), args.repeat), 1)
+    print(f"  加速比 {base / fast:.1f}x")
+
+    batch = X[:args.batch]
+    repeat = max(args.repeat // 20, 10)
+    print(f"批量 {args.batch} 行:")
+    base = report("  Booster", measure(lambda: fused.predict_proba(batch), repeat), args.batch)
+    fast = report("  编译推理", measure(lambda: compiled.predict_proba(batch), repeat), args.batch)
+    print(f"  加速比 {base / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""SHAP解释器冷/热延迟对比
+
+冷路径：每次点击都重新构建 shap.TreeExplainer 再计算SHAP值（旧版 main() 的做法）
+热路径：复用已缓存的解释器，仅计算SHAP值（load_explainer() 的做法）
+
+用法：python benchmarks/bench_explainer.py [--repeat 50]
+"""
+import argparse
+import os
+import pickle
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import shap
+
+warnings.filterwarnings('ignore')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 与 web.py 输入表单默认值一致的样例患者
+DEFAULT_PATIENT = [30, 2.8, 15.0, 40.0, 3.0, 225, 2250, 8.0, 3.0, 200.0, 2000.0, 1.0, 12, 40.0, 1]
+
+
+def summarize(name, timings):
+    timings = np.asarray(timings) * 1000.0
+    print(f"{name:<8} 中位数 {np.median(timings):8.2f} ms   "
+          f"p95 {np.percentile(timings, 95):8.2f} ms   "
+          f"最大 {timings.max():8.2f} ms")
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SHAP解释器冷/热延迟对比")
+    parser.add_argument('--repeat', type=int, default=50, help="每种路径的重复次数")
+    args = parser.parse_args()
+
+    model = joblib.load(os.path.join(ROOT, 'best_xgboost_model.pkl'))
+    with open(os.path.join(ROOT, 'feature_columns.pkl'), 'rb') as f:
+        feature_columns = pickle.load(f)
+    input_df = pd.DataFrame([DEFAULT_PATIENT], columns=feature_columns)
+
+    # 冷路径：每次重建解释器
+    cold = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        explainer = shap.TreeExplainer(model)
+        explainer.shap_values(input_df)
+        _ = explainer.expected_value
+        cold.append(time.perf_counter() - start)
+
+    # 热路径：解释器只构建一次
+    explainer = shap.TreeExplainer(model)
+    warm = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        explainer.shap_values(input_df)
+        warm.append(time.perf_counter() - start)
+
+    cold_ms = summarize("冷路径", cold)
+    warm_ms = summarize("热路径", warm)
+    print(f"加速比 {cold_ms / warm_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""启动导入耗时剖析（python -X importtime）
+
+分别在全新解释器中测量三组导入的耗时：
+    首屏    web.py 模块顶层的导入语句（由AST自动提取，首屏表单需要等待这些导入）
+    解释    shap、matplotlib.pyplot（由后台线程预热，点击预测后才需要）
+    模型    joblib、xgboost、sklearn（load_model() 反序列化模型时导入）
+
+用法：python benchmarks/bench_importtime.py [--repeat 3] [--top 10] [--output importtime.json]
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def top_level_imports(path):
+    """提取脚本模块顶层的 import 语句源码"""
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return '\n'.join(
+        ast.get_source_segment(source, node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def profile(code, exclude=()):
+    """在新解释器中执行导入代码，返回 (总耗时ms, {顶层模块: 累计耗时ms})
+
+    exclude 中的顶层模块（解释器启动时本就会导入的模块）不计入结果。
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    packages = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        # 缩进为1的条目是被直接导入的顶层模块，其累计耗时已包含全部子导入
+        if len(indent) == 1:
+            top = name.split('.')[0]
+            if top in exclude:
+                continue
+            packages[top] = packages.get(top, 0) + int(cumulative) / 1000.0
+            total_us += int(cumulative)
+    return total_us / 1000.0, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动导入耗时剖析")
+    parser.add_argument('--repeat', type=int, default=3, help="每组重复次数（取最小值，排除磁盘缓存影响）")
+    parser.add_argument('--top', type=int, default=10, help="每组显示最耗时的顶层模块数")
+    parser.add_argument('--output', help="把结果保存为JSON，便于不同版本对比")
+    args = parser.parse_args()
+
+    groups = {
+        '首屏': top_level_imports(os.path.join(ROOT, 'web.py')),
+        '解释': 'import matplotlib.pyplot\nimport shap',
+        '模型': 'import joblib\nimport xgboost\nimport sklearn',
+    }
+
+    # 解释器启动本身导入的模块（site、encodings等）
+    _, startup = profile('pass')
+
+    report = {}
+    for name, code in groups.items():
+        runs = [profile(code, startup) for _ in range(args.repeat)]
+        total, packages = min(runs, key=lambda r: r[0])
+        heaviest = sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]
+        report[name] = {'total_ms': round(total, 1), 'packages_ms': {k: round(v, 1) for k, v in heaviest}}
+
+        print(f"{name}: {total:8.1f} ms")
+        for package, ms in heaviest:
+            print(f"    {package:<24}{ms:8.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
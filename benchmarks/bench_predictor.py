@@ -0,0 +1,77 @@
+"""融合预测器与原预测路径的微基准
+
+原路径：构造DataFrame → copy() → 按列scaler.transform → model.predict_proba（旧版 main() 的做法）
+融合路径：FusedPredictor 在预分配缓冲区上原地标准化后直接调用Booster
+
+用法：python benchmarks/bench_predictor.py [--repeat 2000] [--batch 1000]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+warnings.filterwarnings('ignore')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import FusedPredictor, load_artifacts  # noqa: E402
+
+
+def legacy_predict(model, scaler, feature_columns, rows):
+    input_df = pd.DataFrame(rows, columns=feature_columns)
+    input_scaled = input_df.copy()
+    input_scaled[feature_columns] = scaler.transform(input_df[feature_columns])
+    return model.predict_proba(input_scaled)
+
+
+def measure(fn, repeat):
+    fn()  # 预热
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    return timings * 1e6
+
+
+def report(name, timings, n_rows):
+    print(f"{name:<24} 中位数 {np.median(timings):10.1f} µs   p99 {np.percentile(timings, 99):10.1f} µs   "
+          f"{n_rows / (np.median(timings) / 1e6):12.0f} 行/秒")
+    return np.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="融合预测器微基准")
+    parser.add_argument('--repeat', type=int, default=2000, help="单行预测的重复次数")
+    parser.add_argument('--batch', type=int, default=1000, help="批量对比的行数")
+    args = parser.parse_args()
+
+    model, scaler, feature_columns = load_artifacts()
+    feature_columns = list(feature_columns)
+    predictor = FusedPredictor.from_artifacts(model, scaler)
+
+    rng = np.random.default_rng(0)
+    X = scaler.mean_ + rng.standard_normal((args.batch, len(feature_columns))) * scaler.scale_
+    row = X[:1]
+
+    diff = np.abs(legacy_predict(model, scaler, feature_columns, X) - predictor.predict_proba(X)).max()
+    print(f"两条路径的最大概率差异: {diff:.2e}")
+
+    print("单行:")
+    legacy = report("  原路径(pandas)", measure(lambda: legacy_predict(model, scaler, feature_columns, row), args.repeat), 1)
+    fused = report("  融合预测器", measure(lambda: predictor.predict_proba(row), args.repeat), 1)
+    print(f"  加速比 {legacy / fused:.1f}x")
+
+    repeat = max(args.repeat // 20, 10)
+    print(f"批量 {args.batch} 行:")
+    legacy = report("  原路径(pandas)", measure(lambda: legacy_predict(model, scaler, feature_columns, X), repeat), args.batch)
+    fused = report("  融合预测器", measure(lambda: predictor.predict_proba(X), repeat), args.batch)
+    print(f"  加速比 {legacy / fused:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""预测与解释流水线的可复现基准
+
+在各输入框范围（inference.FEATURE_INPUTS）内用固定随机种子生成合成患者，
+对不同批量大小分别测量：
+    predict    标准化 + predict_proba（FusedPredictor）
+    shap       SHAP特征贡献（explain.batch_shap_values，单进程，--backend 选择解释器后端）
+    waterfall  SVG瀑布图渲染（每行一张图）
+    force      SVG力图渲染（每行一张图）
+    matplotlib SVG渲染失败时的matplotlib条形图（每行一张图，绘制后保存为PNG，与 st.pyplot 相同）
+结果保存为JSON，便于不同版本之间对比。
+
+用法：
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --batch-sizes 1 100 10000 --stages predict shap --repeat 3
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import warnings
+
+import numpy as np
+
+warnings.filterwarnings('ignore')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from explain import BACKENDS, DEFAULT_BACKEND, batch_shap_values, build_explainer  # noqa: E402
+from inference import FEATURE_INPUTS, FusedPredictor, load_artifacts  # noqa: E402
+from render import force_plot_svg, waterfall_svg  # noqa: E402
+
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+
+# 各阶段的最大批量（超过后耗时过长，跳过）
+STAGE_MAX_BATCH = {'predict': None, 'shap': 100000, 'waterfall': 1000, 'force': 1000, 'matplotlib': 100}
+
+# 每个 (阶段, 批量) 至少测量的次数；少于 PERCENTILE_MIN_SAMPLES 次时不报告p95/p99
+MIN_REPEAT = 5
+PERCENTILE_MIN_SAMPLES = 20
+
+
+def synthetic_patients(n_rows, feature_columns, seed=0):
+    """在输入框范围内均匀生成患者，取值对齐到输入框步长"""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n_rows, len(feature_columns)), dtype=np.float64)
+    for j, name in enumerate(feature_columns):
+        spec = FEATURE_INPUTS[name]
+        n_steps = int(round((spec['max_value'] - spec['min_value']) / spec['step']))
+        X[:, j] = spec['min_value'] + rng.integers(0, n_steps + 1, n_rows) * spec['step']
+    return X
+
+
+def time_call(fn, repeat):
+    """返回每次调用的耗时（秒），首次调用作为预热不计入"""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.asarray(timings)
+
+
+def summarize(timings, n_rows):
+    ms = timings * 1000.0
+    enough = len(ms) >= PERCENTILE_MIN_SAMPLES
+    return {
+        'repeat': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)) if enough else None,
+        'p99_ms': float(np.percentile(ms, 99)) if enough else None,
+        'rows_per_sec': float(n_rows / np.median(timings))
+    }
+
+
+def matplotlib_bar(shap_value, feature_labels):
+    """web.py 中SVG瀑布图失败时的matplotlib条形图替代（含PNG编码）"""
+    import io
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(10, 6))
+    sorted_idx = np.argsort(np.abs(shap_value))[-15:]
+    bars = plt.barh(range(len(sorted_idx)), shap_value[sorted_idx])
+    plt.yticks(range(len(sorted_idx)), [feature_labels[i] for i in sorted_idx])
+    for bar, i in zip(bars, sorted_idx):
+        bar.set_color('lightcoral' if shap_value[i] >= 0 else 'lightblue')
+    plt.tight_layout()
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+
+
+def run(batch_sizes, stages, repeat, seed, backend=DEFAULT_BACKEND):
+    model, scaler, feature_columns = load_artifacts()
+    feature_columns = list(feature_columns)
+    predictor = FusedPredictor.from_artifacts(model, scaler)
+    explainer = build_explainer(model, backend=backend)
+
+    X_all = synthetic_patients(max(batch_sizes), feature_columns, seed)
+    _, expected_value = batch_shap_values(model, X_all[:1], explainer=explainer, n_jobs=1, scaler=scaler)
+
+    def render_rows(renderer, X, values):
+        for x, v in zip(X, values):
+            renderer(v, expected_value, x, feature_columns)
+
+    def matplotlib_rows(values):
+        for v in values:
+            matplotlib_bar(v, feature_columns)
+
+    results = []
+    for n_rows in batch_sizes:
+        X = X_all[:n_rows]
+        # 大批量时减少重复次数，控制总耗时
+        n_repeat = max(MIN_REPEAT, min(repeat, int(repeat * 1000 / max(n_rows, 1000))))
+        for stage in stages:
+            limit = STAGE_MAX_BATCH[stage]
+            if limit is not None and n_rows > limit:
+                continue
+            if stage == 'predict':
+                fn = lambda: predictor.predict_proba(X)  # noqa: E731
+            elif stage == 'shap':
+                fn = lambda: batch_shap_values(model, X, explainer=explainer, n_jobs=1, scaler=scaler)  # noqa: E731
+            else:
+                values, _ = batch_shap_values(model, X, explainer=explainer, n_jobs=1, scaler=scaler)
+                if stage == 'matplotlib':
+                    fn = lambda: matplotlib_rows(values)  # noqa: E731
+                else:
+                    renderer = waterfall_svg if stage == 'waterfall' else force_plot_svg
+                    fn = lambda: render_rows(renderer, X, values)  # noqa: E731
+
+            entry = {'stage': stage, 'batch_size': n_rows}
+            entry.update(summarize(time_call(fn, n_repeat), n_rows))
+            results.append(entry)
+            p95 = f"{entry['p95_ms']:10.3f} ms" if entry['p95_ms'] is not None else f"{'-':>10}   "
+            print(f"{stage:<10} n={n_rows:<7} p50 {entry['p50_ms']:10.3f} ms   "
+                  f"p95 {p95}   {entry['rows_per_sec']:14.0f} 行/秒  （{entry['repeat']} 次）")
+    return results
+
+
+def environment():
+    import shap
+    import xgboost
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'xgboost': xgboost.__version__,
+        'shap': shap.__version__
+    }
+
+
+def compare(old_path, new_path):
+    """按 (阶段, 批量) 对比两次结果的p50耗时"""
+    with open(old_path, encoding='utf-8') as f:
+        old = {(r['stage'], r['batch_size']): r for r in json.load(f)['results']}
+    with open(new_path, encoding='utf-8') as f:
+        new = {(r['stage'], r['batch_size']): r for r in json.load(f)['results']}
+
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]['p50_ms'], new[key]['p50_ms']
+        print(f"{key[0]:<10} n={key[1]:<7} {before:10.3f} ms → {after:10.3f} ms   {before / after:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预测与解释流水线基准")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGE_MAX_BATCH), default=list(STAGE_MAX_BATCH))
+    parser.add_argument('--repeat', type=int, default=20, help="小批量的重复次数（大批量自动减少）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND, help="SHAP解释器后端")
+    parser.add_argument('-o', '--output', help="结果JSON文件")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="对比两次结果")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(sorted(args.batch_sizes), args.stages, args.repeat, args.seed, args.backend)
+    if args.output:
+        report = {
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'seed': args.seed,
+            'backend': args.backend,
+            'environment': environment(),
+            'results': results
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
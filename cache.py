@@ -0,0 +1,95 @@
+"""进程内LRU缓存"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    """线程安全的定长LRU缓存，统计命中、未命中和淘汰次数"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_create(self, key, factory):
+        """命中时直接返回，否则调用factory()生成并写入缓存"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class PredictionCache(LRUCache):
+    """单个患者的预测结果缓存（概率、SHAP值和渲染好的图表）
+
+    缓存键按各输入框的步长量化：落在步长网格上的取值记为网格序号，从而消除浮点误差；
+    手动输入的网格外取值按原值记录，不会与相邻网格点混用结果。
+    """
+
+    def __init__(self, origins, steps, maxsize=1024):
+        super().__init__(maxsize)
+        self.origins = np.asarray(origins, dtype=np.float64)
+        self.steps = np.asarray(steps, dtype=np.float64)
+
+    @classmethod
+    def from_inputs(cls, feature_inputs, feature_names, maxsize=1024):
+        """由 inference.FEATURE_INPUTS 构建"""
+        origins = [feature_inputs[f]['min_value'] for f in feature_names]
+        steps = [feature_inputs[f]['step'] for f in feature_names]
+        return cls(origins, steps, maxsize)
+
+    def key(self, features):
+        values = np.asarray(features, dtype=np.float64)
+        position = (values - self.origins) / self.steps
+        grid = np.rint(position)
+        on_grid = np.abs(position - grid) < 1e-6
+        return tuple(
+            int(g) if ok else ('raw', float(v))
+            for g, ok, v in zip(grid, on_grid, values)
+        )
+
+
+_MISSING = object()
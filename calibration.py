@@ -0,0 +1,266 @@
+"""概率校准与风险分层阈值选择
+
+在本中心带结局标签的患者数据上，把模型原始输出的累积活产概率校准为实际发生率：
+    isotonic  保序回归（分段常数，单调不减）
+    platt     对原始概率的对数几率做logistic回归
+两种方法都保存为单调的查找表（节点 x → y，约数百个节点），应用时 np.interp 二分定位并线性插值，
+每次查询 O(log n)，单患者约数微秒。
+
+阈值扫描：对数千个候选切点一次性计算灵敏度、特异度、PPV、NPV（排序 + 累积和 + searchsorted，
+不逐个切点循环），据此选择风险分层边界：
+    高概率：PPV（≥ 切点的患者中实际活产的比例）达到 --high-ppv 的最小切点
+    低概率：NPV（< 切点的患者中未活产的比例）达到 --low-npv 的最大切点
+查找表在训练部分上拟合，扫描和边界选择只用留出部分（--test-size）；边界与查找表一起保存，应用于校准后的概率。
+
+校准文件（默认与 scaler.pkl 同目录的 calibration.npz）不存在时使用恒等映射和原有的 0.3/0.7 分层。
+web.py、batch_predict.py、cohort_report.py 和 service.py 默认都加载该文件；命令行工具可用
+--calibration 指定其他文件，--no-calibration 输出模型原始概率（add_calibration_arguments）。
+
+用法：
+    python calibration.py labelled.csv --label live_birth --method isotonic --high-ppv 0.9 --low-npv 0.6
+    python calibration.py labelled.csv --label live_birth --sweep-output sweep.csv
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+from inference import BASE_DIR, RISK_THRESHOLDS
+
+CALIBRATION_PATH = os.environ.get('CALIBRATION_PATH', os.path.join(BASE_DIR, 'calibration.npz'))
+
+METHODS = ('isotonic', 'platt')
+
+# Platt校准查找表在对数几率空间等距取点
+PLATT_GRID = np.linspace(-12.0, 12.0, 481)
+
+# 默认的阈值扫描切点（0.1%间隔）
+SWEEP_THRESHOLDS = np.linspace(0.0, 1.0, 1001)
+
+
+def _logit(p):
+    p = np.clip(p, 1e-7, 1 - 1e-7)
+    return np.log(p / (1 - p))
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class Calibrator:
+    """单调查找表形式的概率校准及风险分层边界"""
+
+    def __init__(self, knots_x, knots_y, method, thresholds=RISK_THRESHOLDS, n_samples=0):
+        self.knots_x = np.asarray(knots_x, dtype=np.float64)
+        self.knots_y = np.asarray(knots_y, dtype=np.float64)
+        self.method = method
+        self.thresholds = tuple(float(t) for t in thresholds)
+        self.n_samples = int(n_samples)
+
+    @classmethod
+    def identity(cls):
+        """未校准：概率原样返回，使用原有的分层边界"""
+        return cls([0.0, 1.0], [0.0, 1.0], 'none')
+
+    @property
+    def is_identity(self):
+        return self.method == 'none'
+
+    @classmethod
+    def fit(cls, probs, labels, method='isotonic', thresholds=RISK_THRESHOLDS):
+        """probs 为模型原始输出的累积活产概率，labels 为实际结局（1: 累积活产）"""
+        probs = np.asarray(probs, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.float64)
+        if method == 'isotonic':
+            from sklearn.isotonic import IsotonicRegression
+            iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip').fit(probs, labels)
+            x, y = iso.X_thresholds_, iso.y_thresholds_
+            # 补上0和1两端，查找表覆盖整个概率区间（两端外按端点值截断，与 out_of_bounds='clip' 一致）
+            knots_x = np.concatenate([[0.0], x, [1.0]])
+            knots_y = np.concatenate([[y[0]], y, [y[-1]]])
+        elif method == 'platt':
+            from sklearn.linear_model import LogisticRegression
+            lr = LogisticRegression(C=1e6).fit(_logit(probs)[:, None], labels)
+            a, b = lr.coef_[0, 0], lr.intercept_[0]
+            knots_x = np.concatenate([[0.0], _sigmoid(PLATT_GRID), [1.0]])
+            knots_y = _sigmoid(a * np.concatenate([[-40.0], PLATT_GRID, [40.0]]) + b)
+        else:
+            raise ValueError(f"未知的校准方法：{method}（可选 {', '.join(METHODS)}）")
+        return cls(knots_x, knots_y, method, thresholds, len(probs))
+
+    @classmethod
+    def load(cls, path=CALIBRATION_PATH):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['knots_x'], f['knots_y'], str(f['method']), f['thresholds'], f['n_samples'])
+
+    def save(self, path=CALIBRATION_PATH):
+        np.savez(path, knots_x=self.knots_x, knots_y=self.knots_y, method=np.asarray(self.method),
+                 thresholds=np.asarray(self.thresholds), n_samples=np.int64(self.n_samples))
+
+    @property
+    def fingerprint(self):
+        """查找表和分层边界的摘要（报告续跑时校验校准未变化）"""
+        digest = hashlib.sha1(self.method.encode('utf-8'))
+        for array in (self.knots_x, self.knots_y, np.asarray(self.thresholds)):
+            digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def calibrate(self, probs):
+        """校准后的累积活产概率；标量输入返回float"""
+        calibrated = np.interp(probs, self.knots_x, self.knots_y)
+        return float(calibrated) if np.ndim(probs) == 0 else calibrated
+
+
+def load_calibration(path=None):
+    """未指定文件时加载默认校准文件（不存在时返回恒等映射）；指定的文件必须存在"""
+    if path is None:
+        return Calibrator.load(CALIBRATION_PATH) if os.path.exists(CALIBRATION_PATH) else Calibrator.identity()
+    return Calibrator.load(path)
+
+
+def add_calibration_arguments(parser):
+    """命令行工具共用的校准参数"""
+    parser.add_argument('--calibration', help=f"calibration.py 生成的校准文件（默认 {CALIBRATION_PATH}，不存在时不校准）")
+    parser.add_argument('--no-calibration', action='store_true', help="不校准，输出模型原始概率和 0.3/0.7 分层")
+
+
+def calibrator_from_args(parser, args):
+    if args.no_calibration:
+        return Calibrator.identity()
+    if args.calibration and not os.path.exists(args.calibration):
+        parser.error(f"校准文件不存在：{args.calibration}")
+    return load_calibration(args.calibration)
+
+
+def threshold_sweep(probs, labels, thresholds=SWEEP_THRESHOLDS):
+    """各切点（概率 ≥ 切点判为累积活产）的混淆矩阵指标，返回DataFrame
+
+    按概率排序后对标签做一次累积和，每个切点以下的样本数和活产数由 searchsorted 一次得到。
+    """
+    import pandas as pd
+
+    probs = np.asarray(probs, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.int64)
+    order = np.argsort(probs, kind='stable')
+    sorted_probs = probs[order]
+    positives_below = np.concatenate([[0], np.cumsum(labels[order])])
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    below = np.searchsorted(sorted_probs, thresholds, side='left')
+    n, n_pos = len(probs), int(labels.sum())
+    n_neg = n - n_pos
+    fn = positives_below[below]
+    tp = n_pos - fn
+    tn = below - fn
+    predicted_pos = n - below
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sensitivity = tp / n_pos if n_pos else np.full(len(thresholds), np.nan)
+        specificity = tn / n_neg if n_neg else np.full(len(thresholds), np.nan)
+        frame = pd.DataFrame({
+            'threshold': thresholds,
+            'sensitivity': sensitivity,
+            'specificity': specificity,
+            'ppv': np.where(predicted_pos > 0, tp / predicted_pos, np.nan),
+            'npv': np.where(below > 0, tn / below, np.nan),
+            'youden': sensitivity + specificity - 1.0,
+            'positive_rate': predicted_pos / n
+        })
+    return frame
+
+
+def choose_thresholds(sweep, high_ppv=None, low_npv=None):
+    """由阈值扫描结果选择 (低, 高) 分层边界；未指定要求或没有切点达到要求时对应边界为None"""
+    low = high = None
+    if high_ppv is not None:
+        candidates = sweep.loc[sweep['ppv'] >= high_ppv, 'threshold']
+        high = float(candidates.min()) if len(candidates) else None
+    if low_npv is not None:
+        candidates = sweep.loc[sweep['npv'] >= low_npv, 'threshold']
+        low = float(candidates.max()) if len(candidates) else None
+    return low, high
+
+
+def calibration_metrics(probs, labels, n_bins=10):
+    """Brier分数和期望校准误差（ECE，按概率等宽分箱）"""
+    probs = np.asarray(probs, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.float64)
+    bins = np.minimum((probs * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    gap = np.abs(np.bincount(bins, probs, n_bins) - np.bincount(bins, labels, n_bins))
+    return {
+        'brier': float(np.mean((probs - labels) ** 2)),
+        'ece': float(gap.sum() / max(counts.sum(), 1))
+    }
+
+
+def main(argv=None):
+    from batch_predict import check_parquet_support, iter_chunks, read_columns
+    from inference import load_artifacts, load_exported, predict_batch
+
+    parser = argparse.ArgumentParser(description="概率校准与风险分层阈值选择")
+    parser.add_argument('input', help="带结局标签的患者文件（.csv 或 .parquet），需包含15个特征列和标签列")
+    parser.add_argument('--label', required=True, help="结局标签列（1: 累积活产，0: 未活产）")
+    parser.add_argument('--method', choices=METHODS, default='isotonic')
+    parser.add_argument('--test-size', type=float, default=0.3, help="留出评估的比例（按固定随机种子划分）")
+    parser.add_argument('--high-ppv', type=float, help="高概率分层要求的最低PPV（不指定则保留原边界）")
+    parser.add_argument('--low-npv', type=float, help="低概率分层要求的最低NPV（不指定则保留原边界）")
+    parser.add_argument('--sweep-output', help="把校准后概率的阈值扫描结果写入CSV")
+    parser.add_argument('--model-dir', help="使用 export_model.py 导出的模型目录（不加载pickle）")
+    parser.add_argument('-o', '--output', default=CALIBRATION_PATH, help="校准文件")
+    args = parser.parse_args(argv)
+
+    check_parquet_support(parser, args.input)
+    model, scaler, feature_columns = load_exported(args.model_dir) if args.model_dir else load_artifacts()
+    missing = [c for c in list(feature_columns) + [args.label] if c not in read_columns(args.input)]
+    if missing:
+        parser.error(f"输入文件缺少列: {', '.join(missing)}")
+
+    probs, labels = [], []
+    for chunk in iter_chunks(args.input, 100000, list(feature_columns) + [args.label]):
+        chunk = chunk.dropna(subset=[args.label])
+        probs.append(predict_batch(model, scaler, chunk[feature_columns].to_numpy(dtype=np.float64))[:, 1])
+        labels.append(chunk[args.label].to_numpy(dtype=np.int64))
+    probs, labels = np.concatenate(probs), np.concatenate(labels)
+    if not set(np.unique(labels)) <= {0, 1}:
+        parser.error(f"标签列 {args.label} 只能取0或1")
+
+    test = np.random.default_rng(0).random(len(probs)) < args.test_size
+    calibrator = Calibrator.fit(probs[~test], labels[~test], args.method)
+    print(f"校准（{args.method}）：训练 {int((~test).sum())} 例，留出 {int(test.sum())} 例，"
+          f"查找表 {len(calibrator.knots_x)} 个节点", file=sys.stderr)
+    if test.any():
+        before = calibration_metrics(probs[test], labels[test])
+        after = calibration_metrics(calibrator.calibrate(probs[test]), labels[test])
+        print(f"留出集 Brier {before['brier']:.4f} → {after['brier']:.4f}，"
+              f"ECE {before['ece']:.4f} → {after['ece']:.4f}", file=sys.stderr)
+
+    # 分层边界在留出集的校准后概率上选择：校准器在训练部分上拟合（保序回归近乎记住了这些样本），
+    # 在其上估计的PPV/NPV偏乐观；没有留出集时退回全部样本
+    if test.any():
+        sweep = threshold_sweep(calibrator.calibrate(probs[test]), labels[test])
+    else:
+        print("没有留出集（--test-size 0），分层边界在校准所用的样本上选择，PPV/NPV可能偏乐观", file=sys.stderr)
+        sweep = threshold_sweep(calibrator.calibrate(probs), labels)
+    if args.sweep_output:
+        sweep.to_csv(args.sweep_output, index=False)
+    low, high = calibrator.thresholds
+    chosen_low, chosen_high = choose_thresholds(sweep, args.high_ppv, args.low_npv)
+    for requested, chosen, name in ((args.low_npv, chosen_low, "低概率NPV"), (args.high_ppv, chosen_high, "高概率PPV")):
+        if requested is not None and chosen is None:
+            print(f"没有切点满足{name} ≥ {requested}，保留原边界", file=sys.stderr)
+    low = low if chosen_low is None else chosen_low
+    high = high if chosen_high is None else chosen_high
+    if low > high:
+        parser.error(f"选出的低概率边界 {low:.3f} 高于高概率边界 {high:.3f}，请调整 --high-ppv/--low-npv")
+    calibrator.thresholds = (low, high)
+    print(f"风险分层边界：低概率 < {low:.3f} ≤ 中等概率 < {high:.3f} ≤ 高概率", file=sys.stderr)
+
+    calibrator.save(args.output)
+    print(f"已写入 {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""队列报告生成命令行工具
+
+对整个患者队列按块流式执行 标准化 → 预测 → 概率校准 → SHAP特征贡献，逐块写出每位患者的
+概率、风险分层和主要贡献特征（与 web.py 单患者视图一致），并生成HTML汇总报告。
+与 web.py 相同，默认加载校准文件（calibration.npz，不存在时不校准）；SHAP值解释的是模型原始输出。
+内存中只保留当前数据块和汇总统计，不保留整个队列或任何图表。
+
+每完成一块即写出一个分片文件并更新清单（manifest.json）；中断后以相同参数重新运行，
+会跳过已完成的分块，从下一块继续。全部完成后分片合并为单个结果文件（先写临时文件再替换），
+清单标记完成后才删除分片，任何时刻中断都可以续跑。--keep 的列在CSV中按文本读写（保留前导零）。
+
+输出目录结构：
+    report_dir/manifest.json        进度与汇总统计
+    report_dir/parts/part-00000.*   各块结果（合并后删除）
+    report_dir/scores.csv|parquet   合并后的逐患者结果
+    report_dir/report.html          汇总报告（可在浏览器中打印为PDF）
+
+用法：
+    python cohort_report.py patients.csv -o report_dir
+    python cohort_report.py patients.parquet -o report_dir --format parquet --keep patient_id --top-k 5
+"""
+import argparse
+import html
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from batch_predict import (ChunkWriter, check_parquet_support, iter_chunks, keep_text_columns, read_columns,
+                           score_chunk)
+from calibration import add_calibration_arguments, calibrator_from_args
+from explain import SHAP_INPUT, batch_shap_values, build_explainer, check_additivity
+from inference import RISK_LEVELS, load_artifacts, load_exported
+from render import NEGATIVE_COLOR, POSITIVE_COLOR, bar_svg
+
+DEFAULT_CHUNK_SIZE = 20000
+DEFAULT_TOP_K = 3
+
+MANIFEST_FILE = 'manifest.json'
+PARTS_DIR = 'parts'
+REPORT_FILE = 'report.html'
+
+# 概率分布直方图的分箱数
+PROB_BINS = 20
+
+
+def input_fingerprint(path, args, calibrator):
+    """输入文件、校准与影响输出的参数；与清单不一致时不能续跑"""
+    stat = os.stat(path)
+    return {
+        'input': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'chunk_size': args.chunk_size,
+        'top_k': args.top_k,
+        'keep': args.keep,
+        'format': args.format,
+        'model_dir': os.path.abspath(args.model_dir) if args.model_dir else None,
+        'shap_input': SHAP_INPUT,
+        'calibration': calibrator.fingerprint
+    }
+
+
+def new_manifest(fingerprint, feature_columns):
+    n_features = len(feature_columns)
+    return {
+        'fingerprint': fingerprint,
+        'feature_columns': list(feature_columns),
+        'completed_chunks': 0,
+        'complete': False,
+        'expected_value': None,
+        'stats': {
+            'rows': 0,
+            'prob_sum': 0.0,
+            'prob_hist': [0] * PROB_BINS,
+            'risk_counts': {level: 0 for level in RISK_LEVELS},
+            'shap_sum': [0.0] * n_features,
+            'abs_shap_sum': [0.0] * n_features,
+            'top_counts': [0] * n_features
+        }
+    }
+
+
+def load_manifest(report_dir):
+    path = os.path.join(report_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(report_dir, manifest):
+    """先写临时文件再替换，中断时清单不会处于半写入状态"""
+    path = os.path.join(report_dir, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def part_path(report_dir, index, fmt):
+    return os.path.join(report_dir, PARTS_DIR, f'part-{index:05d}.{fmt}')
+
+
+def top_contributors(attributions, feature_columns, top_k):
+    """每行按绝对贡献取前top_k个特征，返回 {列名: 数组}"""
+    order = np.argsort(-np.abs(attributions), axis=1, kind='stable')[:, :top_k]
+    names = np.asarray(feature_columns, dtype=object)
+    columns = {}
+    for k in range(order.shape[1]):
+        columns[f'top{k + 1}_feature'] = names[order[:, k]]
+        columns[f'top{k + 1}_impact'] = np.take_along_axis(attributions, order[:, k:k + 1], axis=1)[:, 0]
+    return columns
+
+
+def update_stats(stats, result, attributions):
+    """把一个数据块累加到汇总统计"""
+    probs = result['birth_prob'].to_numpy()
+    stats['rows'] += len(probs)
+    stats['prob_sum'] += float(probs.sum())
+    hist, _ = np.histogram(probs, bins=PROB_BINS, range=(0.0, 1.0))
+    stats['prob_hist'] = (np.asarray(stats['prob_hist']) + hist).tolist()
+    for level, count in result['risk_level'].value_counts().items():
+        stats['risk_counts'][level] = stats['risk_counts'].get(level, 0) + int(count)
+    stats['shap_sum'] = (np.asarray(stats['shap_sum']) + attributions.sum(axis=0)).tolist()
+    stats['abs_shap_sum'] = (np.asarray(stats['abs_shap_sum']) + np.abs(attributions).sum(axis=0)).tolist()
+    top = np.bincount(np.abs(attributions).argmax(axis=1), minlength=attributions.shape[1])
+    stats['top_counts'] = (np.asarray(stats['top_counts']) + top).tolist()
+
+
+def process_chunk(model, scaler, explainer, feature_columns, chunk, keep, top_k, calibrator=None):
+    """单块：评分（含校准） + 特征贡献，返回 (结果表, 贡献矩阵, 期望值)"""
+    result = score_chunk(model, scaler, feature_columns, chunk, keep, calibrator)
+
+    # SHAP值在模型实际评分的标准化输入上计算
+    X = chunk[feature_columns].to_numpy(dtype=np.float64)
+    attributions, expected_value = batch_shap_values(model, X, explainer=explainer, scaler=scaler)
+    # 加性校验针对模型原始输出（校准后的概率不是 期望值 + ΣSHAP 的logistic变换）
+    check_additivity(attributions, expected_value, result.get('raw_birth_prob', result['birth_prob']).to_numpy())
+    for name, values in top_contributors(attributions, feature_columns, top_k).items():
+        result[name] = values
+    return result, attributions, expected_value
+
+
+def merge_parts(report_dir, n_parts, fmt, text_columns=()):
+    """逐个分片追加到最终结果文件（先写临时文件再替换）；分片由调用方在清单标记完成后删除"""
+    import pandas as pd
+
+    output = os.path.join(report_dir, f'scores.{fmt}')
+    tmp_path = f'{output}.tmp.{fmt}'
+    with ChunkWriter(tmp_path) as writer:
+        for index in range(n_parts):
+            path = part_path(report_dir, index, fmt)
+            if fmt == 'parquet':
+                writer.write(pd.read_parquet(path))
+            else:
+                writer.write(pd.read_csv(path, encoding='utf-8-sig', dtype=dict.fromkeys(text_columns, str) or None))
+    os.replace(tmp_path, output)
+    return output
+
+
+def render_report(manifest):
+    """由汇总统计生成自包含的HTML报告"""
+    stats = manifest['stats']
+    n_rows = stats['rows']
+    feature_columns = manifest['feature_columns']
+
+    mean_abs = np.asarray(stats['abs_shap_sum']) / max(n_rows, 1)
+    mean_shap = np.asarray(stats['shap_sum']) / max(n_rows, 1)
+    order = np.argsort(-mean_abs, kind='stable')
+
+    risk_rows = ''.join(
+        f'<tr><td>{html.escape(level)}</td><td>{count}</td><td>{count / max(n_rows, 1):.1%}</td></tr>'
+        for level, count in stats['risk_counts'].items()
+    )
+    feature_rows = ''.join(
+        f'<tr><td>{html.escape(feature_columns[i])}</td><td>{mean_abs[i]:.4f}</td>'
+        f'<td style="color:{POSITIVE_COLOR if mean_shap[i] >= 0 else NEGATIVE_COLOR}">{mean_shap[i]:+.4f}</td>'
+        f'<td>{stats["top_counts"][i]}</td></tr>'
+        for i in order
+    )
+    edges = np.linspace(0.0, 1.0, PROB_BINS + 1)
+    hist_labels = [f'{lo:.0%} - {hi:.0%}' for lo, hi in zip(edges[:-1], edges[1:])]
+
+    return f"""<!DOCTYPE html>
+<html lang="zh">
+<head>
+<meta charset="utf-8">
+<title>队列累积活产率预测报告</title>
+<style>
+body {{ font-family: 'Noto Sans CJK SC','Microsoft YaHei','PingFang SC',sans-serif; margin: 32px; color: #222; }}
+table {{ border-collapse: collapse; margin: 12px 0 28px 0; }}
+th, td {{ border: 1px solid #ddd; padding: 6px 12px; text-align: right; }}
+th:first-child, td:first-child {{ text-align: left; }}
+th {{ background: #f5f5f5; }}
+</style>
+</head>
+<body>
+<h1>队列累积活产率预测报告</h1>
+<p>生成时间：{time.strftime('%Y-%m-%d %H:%M:%S')}　患者数：{n_rows}
+平均累积活产概率：{stats['prob_sum'] / max(n_rows, 1):.2%}　SHAP期望值：{manifest['expected_value'] or 0:.4f}</p>
+
+<h2>风险分层</h2>
+<table><tr><th>风险分层</th><th>人数</th><th>占比</th></tr>{risk_rows}</table>
+
+<h2>累积活产概率分布</h2>
+{bar_svg(stats['prob_hist'], hist_labels, value_format='{:.0f}')}
+
+<h2>特征贡献汇总</h2>
+{bar_svg(mean_abs[order], [feature_columns[i] for i in order])}
+<table><tr><th>特征</th><th>平均绝对贡献</th><th>平均贡献</th><th>作为首要贡献特征的人数</th></tr>{feature_rows}</table>
+</body>
+</html>
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="队列累积活产率预测报告")
+    parser.add_argument('input', help="患者数据文件（.csv 或 .parquet），需包含15个特征列")
+    parser.add_argument('-o', '--output-dir', required=True, help="报告输出目录")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="逐患者结果的文件格式")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每块行数")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help="每位患者输出的主要贡献特征数")
+    parser.add_argument('--keep', nargs='*', default=[], help="原样输出的列（如患者编号）")
+    parser.add_argument('--model-dir', help="使用 export_model.py 导出的模型目录（不加载pickle）")
+    parser.add_argument('--restart', action='store_true', help="忽略已有进度，从头生成")
+    add_calibration_arguments(parser)
+    args = parser.parse_args(argv)
+
+    check_parquet_support(parser, args.input, f'scores.{args.format}')
+    model, scaler, feature_columns = load_exported(args.model_dir) if args.model_dir else load_artifacts()
+    calibrator = calibrator_from_args(parser, args)
+    feature_columns = list(feature_columns)
+
+    available = set(read_columns(args.input))
+    missing = [c for c in feature_columns + args.keep if c not in available]
+    if missing:
+        parser.error(f"输入文件缺少列: {', '.join(missing)}")
+
+    report_dir = args.output_dir
+    parts_dir = os.path.join(report_dir, PARTS_DIR)
+    os.makedirs(parts_dir, exist_ok=True)
+    text_columns = keep_text_columns(args.keep, feature_columns)
+
+    fingerprint = input_fingerprint(args.input, args, calibrator)
+    manifest = None if args.restart else load_manifest(report_dir)
+    if manifest is not None and manifest['fingerprint'] != fingerprint:
+        parser.error("输出目录中已有使用不同输入或参数生成的进度，请更换目录或使用 --restart")
+    if manifest is None:
+        manifest = new_manifest(fingerprint, feature_columns)
+
+    if not manifest['complete']:
+        done = manifest['completed_chunks']
+        if done:
+            print(f"从第 {done + 1} 块继续（已完成 {manifest['stats']['rows']} 行）", file=sys.stderr)
+
+        explainer = build_explainer(model)
+        columns = list(dict.fromkeys(feature_columns + args.keep))
+        for index, chunk in enumerate(iter_chunks(args.input, args.chunk_size, columns, text_columns)):
+            if index < done:
+                continue
+            chunk_start = time.perf_counter()
+            result, attributions, expected_value = process_chunk(
+                model, scaler, explainer, feature_columns, chunk, args.keep, args.top_k, calibrator
+            )
+
+            # 分片写完后再更新清单：中断时最多重算当前块
+            path = part_path(report_dir, index, args.format)
+            tmp_path = f'{path}.tmp.{args.format}'
+            with ChunkWriter(tmp_path) as writer:
+                writer.write(result)
+            os.replace(tmp_path, path)
+
+            update_stats(manifest['stats'], result, attributions)
+            manifest['expected_value'] = expected_value
+            manifest['completed_chunks'] = index + 1
+            save_manifest(report_dir, manifest)
+
+            elapsed = time.perf_counter() - chunk_start
+            print(f"已完成 {index + 1} 块，共 {manifest['stats']['rows']} 行（{len(chunk) / max(elapsed, 1e-9):.0f} 行/秒）",
+                  file=sys.stderr)
+
+        output = merge_parts(report_dir, manifest['completed_chunks'], args.format, text_columns)
+        manifest['complete'] = True
+        save_manifest(report_dir, manifest)
+        print(f"逐患者结果写入 {output}", file=sys.stderr)
+
+    # 清单已标记完成，分片不再需要（上次在删除前中断时在此补删）
+    shutil.rmtree(parts_dir, ignore_errors=True)
+
+    report_path = os.path.join(report_dir, REPORT_FILE)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(render_report(manifest))
+    print(f"完成：{manifest['stats']['rows']} 行，汇总报告写入 {report_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
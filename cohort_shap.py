@@ -0,0 +1,231 @@
+"""参考人群的SHAP矩阵与汇总统计
+
+对参考数据集预先计算每位患者的特征值、SHAP值和累积活产概率，以平铺的float32文件保存，
+查看时用只读内存映射打开；各特征的平均|SHAP|等汇总统计保存在 meta.json 中，
+打开队列只需读取这一个小文件，与参考人群规模无关。
+追加新患者时只写入新增行并累加汇总统计，不重新计算整个参考人群。
+
+目录结构：
+    cohort_dir/meta.json      特征列、行数、期望值、SHAP输入空间和累加统计
+    cohort_dir/features.f32   (n_rows, 15) 原始特征值
+    cohort_dir/shap.f32       (n_rows, 15) SHAP值（正类，对数几率空间，基于标准化后的输入计算）
+    cohort_dir/prob.f32       (n_rows,) 累积活产概率
+
+用法：
+    python cohort_shap.py build reference.csv -o cohort_shap
+    python cohort_shap.py append new_patients.csv -o cohort_shap
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from explain import SHAP_INPUT
+from inference import BASE_DIR
+
+COHORT_DIR = os.environ.get('COHORT_SHAP_DIR', os.path.join(BASE_DIR, 'cohort_shap'))
+
+META_FILE = 'meta.json'
+FEATURES_FILE = 'features.f32'
+SHAP_FILE = 'shap.f32'
+PROB_FILE = 'prob.f32'
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+class CohortExplanations:
+    """参考人群的内存映射SHAP矩阵及增量维护的汇总统计"""
+
+    def __init__(self, cohort_dir=COHORT_DIR):
+        self.cohort_dir = cohort_dir
+        self._lock = threading.Lock()
+        self._maps = None
+        self._meta_mtime = None
+        self.refresh()
+
+    @classmethod
+    def create(cls, cohort_dir, feature_columns, expected_value):
+        """新建空的参考人群目录"""
+        os.makedirs(cohort_dir, exist_ok=True)
+        n_features = len(feature_columns)
+        meta = {
+            'feature_columns': list(feature_columns),
+            'expected_value': float(expected_value),
+            'shap_input': SHAP_INPUT,
+            'n_rows': 0,
+            'shap_sum': [0.0] * n_features,
+            'abs_shap_sum': [0.0] * n_features,
+            'feature_sum': [0.0] * n_features,
+            'prob_sum': 0.0,
+            'updated_at': None
+        }
+        for name in (FEATURES_FILE, SHAP_FILE, PROB_FILE):
+            open(os.path.join(cohort_dir, name), 'wb').close()
+        _write_meta(cohort_dir, meta)
+        return cls(cohort_dir)
+
+    def _path(self, name):
+        return os.path.join(self.cohort_dir, name)
+
+    def refresh(self):
+        """其他进程追加数据后重新读取 meta.json（未变化时只做一次stat）"""
+        mtime = os.stat(self._path(META_FILE)).st_mtime_ns
+        if mtime != self._meta_mtime:
+            with open(self._path(META_FILE), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('shap_input') != SHAP_INPUT:
+                raise ValueError(f"参考人群 {self.cohort_dir} 的SHAP值不是基于标准化后的输入计算的，请用 cohort_shap.py build 重新生成")
+            self.meta = meta
+            self._meta_mtime = mtime
+        return self
+
+    @property
+    def feature_columns(self):
+        return self.meta['feature_columns']
+
+    @property
+    def n_rows(self):
+        return self.meta['n_rows']
+
+    @property
+    def expected_value(self):
+        return self.meta['expected_value']
+
+    @property
+    def fingerprint(self):
+        """meta.json 内容（行数、累加统计、更新时间等）的摘要；追加或重新生成后变化，用作图表缓存的键"""
+        return hashlib.sha1(json.dumps(self.meta, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def arrays(self):
+        """(特征值, SHAP值, 概率) 的只读内存映射，行数以 meta.json 为准"""
+        with self._lock:
+            if self._maps is None or len(self._maps[2]) != self.n_rows:
+                self._maps = self._open_maps(self.n_rows)
+            return self._maps
+
+    def _open_maps(self, n_rows):
+        n_features = len(self.feature_columns)
+        if n_rows == 0:
+            return np.empty((0, n_features), np.float32), np.empty((0, n_features), np.float32), np.empty(0, np.float32)
+        return (
+            np.memmap(self._path(FEATURES_FILE), dtype=np.float32, mode='r', shape=(n_rows, n_features)),
+            np.memmap(self._path(SHAP_FILE), dtype=np.float32, mode='r', shape=(n_rows, n_features)),
+            np.memmap(self._path(PROB_FILE), dtype=np.float32, mode='r', shape=(n_rows,))
+        )
+
+    def add(self, X, shap_values, probs):
+        """追加患者并累加汇总统计
+
+        先写数据文件再更新 meta.json；中断时数据文件末尾多出的行会在下次追加前截掉。
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        shap_values = np.atleast_2d(np.asarray(shap_values, dtype=np.float32))
+        probs = np.atleast_1d(np.asarray(probs, dtype=np.float32))
+        n_features = len(self.feature_columns)
+        if X.shape[1] != n_features or shap_values.shape != X.shape or len(probs) != len(X):
+            raise ValueError(f"追加数据的形状不一致：特征 {X.shape}，SHAP {shap_values.shape}，概率 {probs.shape}")
+
+        with self._lock:
+            # 以磁盘上最新的行数为准（单写入者；其他进程只读）
+            n_rows = self.refresh().meta['n_rows']
+            for name, array, row_bytes in ((FEATURES_FILE, X, n_features * 4),
+                                           (SHAP_FILE, shap_values, n_features * 4),
+                                           (PROB_FILE, probs, 4)):
+                with open(self._path(name), 'r+b') as f:
+                    f.truncate(n_rows * row_bytes)
+                    f.seek(0, os.SEEK_END)
+                    f.write(np.ascontiguousarray(array).tobytes())
+
+            meta = dict(self.meta)
+            meta['n_rows'] = n_rows + len(X)
+            meta['shap_sum'] = (np.asarray(meta['shap_sum']) + shap_values.sum(axis=0, dtype=np.float64)).tolist()
+            meta['abs_shap_sum'] = (np.asarray(meta['abs_shap_sum'])
+                                    + np.abs(shap_values).sum(axis=0, dtype=np.float64)).tolist()
+            meta['feature_sum'] = (np.asarray(meta['feature_sum']) + X.sum(axis=0, dtype=np.float64)).tolist()
+            meta['prob_sum'] = meta['prob_sum'] + float(probs.sum(dtype=np.float64))
+            meta['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            _write_meta(self.cohort_dir, meta)
+            self.meta = meta
+            self._meta_mtime = os.stat(self._path(META_FILE)).st_mtime_ns
+
+    def mean_abs_shap(self):
+        """各特征的平均|SHAP|（来自累加统计，无需读取SHAP矩阵）"""
+        return np.asarray(self.meta['abs_shap_sum']) / max(self.n_rows, 1)
+
+    def mean_shap(self):
+        return np.asarray(self.meta['shap_sum']) / max(self.n_rows, 1)
+
+    def sample_rows(self, max_rows=1000):
+        """等间隔抽样的行号（绘图用，只读取抽中的行）"""
+        if self.n_rows <= max_rows:
+            return np.arange(self.n_rows)
+        return np.linspace(0, self.n_rows - 1, max_rows).astype(np.int64)
+
+    def sample(self, max_rows=1000):
+        """抽样后的 (特征值, SHAP值, 概率)，已从内存映射复制到内存"""
+        rows = self.sample_rows(max_rows)
+        X, shap_values, probs = self.arrays()
+        return np.asarray(X[rows]), np.asarray(shap_values[rows]), np.asarray(probs[rows])
+
+
+def _write_meta(cohort_dir, meta):
+    path = os.path.join(cohort_dir, META_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def add_file(cohort, model, scaler, explainer, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """把患者文件按块评分、计算SHAP值后追加到参考人群"""
+    from batch_predict import iter_chunks
+    from explain import batch_shap_values, check_additivity
+    from inference import predict_batch
+
+    feature_columns = cohort.feature_columns
+    for chunk in iter_chunks(path, chunk_size, feature_columns):
+        X = chunk[feature_columns].to_numpy(dtype=np.float64)
+        probs = predict_batch(model, scaler, X)[:, 1]
+        # SHAP值在模型实际评分的标准化输入上计算，features.f32 保存原始值供显示
+        attributions, expected_value = batch_shap_values(model, X, explainer=explainer, scaler=scaler)
+        check_additivity(attributions, expected_value, probs)
+        cohort.add(X, attributions, probs)
+        print(f"已加入 {cohort.n_rows} 行", file=sys.stderr)
+
+
+def main(argv=None):
+    from batch_predict import check_parquet_support
+    from explain import build_explainer
+    from inference import load_artifacts, load_exported
+
+    parser = argparse.ArgumentParser(description="参考人群SHAP矩阵")
+    parser.add_argument('command', choices=['build', 'append'], help="build: 新建；append: 追加患者")
+    parser.add_argument('input', help="患者数据文件（.csv 或 .parquet），需包含15个特征列")
+    parser.add_argument('-o', '--output-dir', default=COHORT_DIR, help="参考人群目录")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每块行数")
+    parser.add_argument('--model-dir', help="使用 export_model.py 导出的模型目录（不加载pickle）")
+    args = parser.parse_args(argv)
+
+    check_parquet_support(parser, args.input)
+    model, scaler, feature_columns = load_exported(args.model_dir) if args.model_dir else load_artifacts()
+    explainer = build_explainer(model)
+
+    if args.command == 'build':
+        cohort = CohortExplanations.create(args.output_dir, feature_columns, explainer.expected_value)
+    else:
+        cohort = CohortExplanations(args.output_dir)
+        if cohort.feature_columns != list(feature_columns):
+            parser.error("参考人群的特征列与模型不一致")
+
+    start = time.perf_counter()
+    add_file(cohort, model, scaler, explainer, args.input, args.chunk_size)
+    print(f"完成：参考人群共 {cohort.n_rows} 行，用时 {time.perf_counter() - start:.2f} 秒", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
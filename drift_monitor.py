@@ -0,0 +1,442 @@
+"""输入漂移与数据质量监控
+
+对线上评分的15个输入特征和预测概率增量维护常数内存的统计量：
+    Welford 均值/方差、最小/最大值、缺失值和超出输入框范围的计数；
+    固定分箱直方图（N_BINS 个箱，箱边界取基线分布的等概率分位点），由此计算 PSI 和 KS。
+
+基线：各列的箱边界和期望占比取自百分位索引（percentiles.npz）中参考人群的经验分位点；
+离散特征（如移植周期数）的多个分位点重合，重合处的箱为空箱（期望占比0），
+每个取值整体落在同一个箱中，未漂移的流量不会因分箱而产生PSI。
+索引中没有的特征列按scaler的均值和标准差以正态分布近似，箱边界对齐到输入框步长的半格处；
+没有索引时预测概率列只统计不计算漂移。均值偏移（以训练标准差为单位）和方差比直接与scaler的矩比较。
+
+record() 只把数据追加到待处理列表，累计 FLUSH_ROWS 行后一次性向量化合并，
+单次请求的开销在微秒级。状态定期写入 state.json（原子替换），重启后从中恢复；
+每个统计窗口（默认一天）结束时把窗口汇总追加到 history.jsonl 并开始新窗口。
+每个模型版本在 DRIFT_DIR 下有自己的状态目录（version_state_dir），切换版本不会互相覆盖；
+同一状态目录只应由一个进程写入。
+
+用法：
+    python drift_monitor.py                          # 查看目录下pkl模型的累计和当前窗口漂移报告
+    python drift_monitor.py --model pcos_clbr:1.1    # 查看注册表中某个版本的报告
+    python drift_monitor.py --history                # 查看历史窗口
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+from inference import BASE_DIR, FEATURE_INPUTS, out_of_bounds
+
+DRIFT_DIR = os.environ.get('DRIFT_DIR', os.path.join(BASE_DIR, 'drift'))
+
+STATE_FILE = 'state.json'
+HISTORY_FILE = 'history.jsonl'
+
+# 未使用注册表时的模型版本（registry.ModelVersion.from_artifacts 的默认名称:版本）
+DEFAULT_MODEL_KEY = 'default:pkl'
+
+# 预测概率在报告中的列名（与 percentiles.OUTPUT_COLUMN 一致）
+OUTPUT_COLUMN = 'birth_prob'
+
+# 直方图箱数（KS按箱边界计算），PSI按相邻箱合并为 PSI_GROUPS 组计算
+N_BINS = 40
+PSI_GROUPS = 10
+
+# PSI 分级阈值：< 0.1 稳定，0.1~0.25 轻度漂移，> 0.25 显著漂移
+PSI_THRESHOLDS = (0.1, 0.25)
+DRIFT_LEVELS = ['稳定', '轻度漂移', '显著漂移']
+
+# 样本少于该行数时不计算PSI/KS（直方图占比不稳定）
+MIN_DRIFT_ROWS = 100
+
+FLUSH_ROWS = 256
+SNAPSHOT_INTERVAL = 60.0
+WINDOW_SECONDS = 86400.0
+
+
+def quantile_bins(quantiles, levels):
+    """由一列的分位点表（升序，levels 为对应的百分位0~100）取等概率箱的边界和各箱期望占比
+
+    箱为 [左边界, 右边界)，期望占比为参考人群中小于右边界与小于左边界的比例之差；
+    取值相同的一段（离散特征）只落在一个箱中，重合边界之间的箱期望占比为0。
+    """
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+    positions = np.arange(1, N_BINS) * (len(quantiles) - 1) / N_BINS
+    edges = np.interp(positions, np.arange(len(quantiles)), quantiles)
+
+    # 小于边界的比例：边界恰为某个分位点（含相同取值的一段）时取该段起点的百分位，否则线性插值
+    right = np.searchsorted(quantiles, edges, side='left')
+    left = np.maximum(right - 1, 0)
+    x0, x1 = quantiles[left], quantiles[right]
+    width = np.where(x1 > x0, x1 - x0, 1.0)
+    fraction = np.where(x1 > x0, (edges - x0) / width, 1.0)
+    below = (levels[left] + fraction * (levels[right] - levels[left])) / 100.0
+    return edges, np.diff(np.concatenate([[0.0], below, [1.0]]))
+
+
+def normal_bins(mean, std, step=None, origin=0.0):
+    """无经验分位点时按正态分布取等概率箱；给定输入步长时边界对齐到相邻网格点的中间，
+    离散取值不会落在边界上，期望占比按对齐后的边界重新计算"""
+    dist = NormalDist(mean, std)
+    edges = np.array([dist.inv_cdf(k / N_BINS) for k in range(1, N_BINS)])
+    if step:
+        edges = origin + (np.floor((edges - origin) / step) + 0.5) * step
+    below = np.array([dist.cdf(e) for e in edges])
+    return edges, np.diff(np.concatenate([[0.0], below, [1.0]]))
+
+
+class DriftBaseline:
+    """各列的直方图箱边界 (列数, N_BINS-1) 与基线下各箱的期望占比 (列数, N_BINS)
+
+    期望占比为NaN的列（没有基线）只统计不计算漂移。
+    """
+
+    def __init__(self, columns, edges, expected, mean, std):
+        self.columns = list(columns)
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.expected = np.asarray(expected, dtype=np.float64)
+        # 百分位索引以float32保存，分箱时统一按float32比较（取值恰为某个分位点时与参考人群落在同一箱）
+        self._edges32 = self.edges.astype(np.float32)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+
+    @classmethod
+    def from_scaler(cls, scaler, feature_columns, percentile_index=None):
+        """箱边界取百分位索引中参考人群的经验分位点；索引中没有的特征列按scaler的均值/标准差正态近似"""
+        mean = np.asarray(scaler.mean_, dtype=np.float64)
+        std = np.asarray(scaler.scale_, dtype=np.float64)
+        indexed = percentile_index.columns if percentile_index is not None else []
+
+        edges, expected = [], []
+        for j, column in enumerate(feature_columns):
+            if column in indexed:
+                bins = quantile_bins(percentile_index.quantiles[indexed.index(column)], percentile_index.levels)
+            else:
+                inputs = FEATURE_INPUTS.get(column, {})
+                bins = normal_bins(mean[j], std[j], inputs.get('step'), inputs.get('min_value', 0.0))
+            edges.append(bins[0])
+            expected.append(bins[1])
+
+        if OUTPUT_COLUMN in indexed:
+            row = percentile_index.quantiles[indexed.index(OUTPUT_COLUMN)]
+            prob_edges, prob_expected = quantile_bins(row, percentile_index.levels)
+            prob_mean, prob_std = float(np.mean(row)), float(np.std(row))
+        else:
+            prob_edges = np.linspace(0.0, 1.0, N_BINS + 1)[1:-1]
+            prob_expected = np.full(N_BINS, np.nan)
+            prob_mean, prob_std = np.nan, np.nan
+
+        return cls(list(feature_columns) + [OUTPUT_COLUMN],
+                   np.vstack(edges + [prob_edges]), np.vstack(expected + [prob_expected]),
+                   np.append(mean, prob_mean), np.append(std, prob_std))
+
+    @property
+    def fingerprint(self):
+        digest = hashlib.sha1(json.dumps(self.columns).encode('utf-8'))
+        for array in (self.edges, self.expected):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()[:16]
+
+    def bins(self, data):
+        """各元素所在的箱号 (n, 列数)；NaN落在最后一箱，由调用方排除"""
+        return (data.astype(np.float32)[:, :, None] >= self._edges32[None, :, :]).sum(axis=2)
+
+
+# RunningStats 中需要持久化的数组
+_STATE_FIELDS = ('count', 'mean', 'm2', 'min', 'max', 'hist', 'missing', 'out_of_range')
+
+
+class RunningStats:
+    """各列的常数内存统计：Welford矩、极值、直方图、缺失和越界计数"""
+
+    def __init__(self, n_columns, n_bins=N_BINS):
+        self.count = np.zeros(n_columns, dtype=np.int64)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+        self.hist = np.zeros((n_columns, n_bins), dtype=np.int64)
+        self.missing = np.zeros(n_columns, dtype=np.int64)
+        self.out_of_range = np.zeros(n_columns, dtype=np.int64)
+        self.rows = 0
+
+    def update(self, data, bins, invalid):
+        """合并一批数据（Chan等的并行Welford合并）；invalid 为越界标记，不含缺失值"""
+        valid = ~np.isnan(data)
+        n_b = valid.sum(axis=0)
+        filled = np.where(valid, data, 0.0)
+        mean_b = filled.sum(axis=0) / np.maximum(n_b, 1)
+        m2_b = (np.where(valid, data - mean_b, 0.0) ** 2).sum(axis=0)
+
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.mean = np.where(n > 0, self.mean + delta * n_b / np.maximum(n, 1), self.mean)
+            self.m2 = self.m2 + m2_b + delta ** 2 * n_a * n_b / np.maximum(n, 1)
+        self.count = n
+        self.min = np.fmin(self.min, np.where(valid, data, np.inf).min(axis=0))
+        self.max = np.fmax(self.max, np.where(valid, data, -np.inf).max(axis=0))
+
+        n_bins = self.hist.shape[1]
+        columns = np.broadcast_to(np.arange(data.shape[1]), data.shape)
+        flat = (columns * n_bins + bins)[valid]
+        self.hist += np.bincount(flat, minlength=self.hist.size).reshape(self.hist.shape)
+        self.missing += (~valid).sum(axis=0)
+        self.out_of_range += (invalid & valid).sum(axis=0)
+        self.rows += len(data)
+
+    def std(self):
+        return np.sqrt(self.m2 / np.maximum(self.count - 1, 1))
+
+    def to_dict(self):
+        state = {name: getattr(self, name).tolist() for name in _STATE_FIELDS}
+        state['rows'] = self.rows
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(len(state['count']), len(state['hist'][0]))
+        for name in _STATE_FIELDS:
+            setattr(stats, name, np.asarray(state[name], dtype=getattr(stats, name).dtype))
+        stats.rows = state['rows']
+        return stats
+
+
+def drift_scores(hist, expected):
+    """直方图计数相对期望占比的 (PSI, KS)，每列一个值；没有基线或样本不足的列为NaN"""
+    totals = hist.sum(axis=1, keepdims=True)
+    observed = hist / np.maximum(totals, 1)
+    ks = np.abs(np.cumsum(observed, axis=1) - np.cumsum(expected, axis=1)).max(axis=1)
+
+    group = hist.shape[1] // PSI_GROUPS
+    p = np.clip(observed.reshape(len(hist), PSI_GROUPS, group).sum(axis=2), 1e-4, None)
+    q = np.clip(expected.reshape(len(hist), PSI_GROUPS, group).sum(axis=2), 1e-4, None)
+    psi = ((p - q) * np.log(p / q)).sum(axis=1)
+
+    too_few = totals[:, 0] < MIN_DRIFT_ROWS
+    return np.where(too_few, np.nan, psi), np.where(too_few, np.nan, ks)
+
+
+def drift_level(psi):
+    if np.isnan(psi):
+        return ''
+    return DRIFT_LEVELS[int(np.searchsorted(PSI_THRESHOLDS, psi, side='right'))]
+
+
+class DriftMonitor:
+    """线上评分的漂移监控（累计统计 + 当前窗口统计）"""
+
+    def __init__(self, baseline, state_dir=DRIFT_DIR, snapshot_interval=SNAPSHOT_INTERVAL,
+                 window_seconds=WINDOW_SECONDS, flush_rows=FLUSH_ROWS):
+        self.baseline = baseline
+        self.state_dir = state_dir
+        self.snapshot_interval = snapshot_interval
+        self.window_seconds = window_seconds
+        self.flush_rows = flush_rows
+        self._feature_columns = baseline.columns[:-1]
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_rows = 0
+        self._thread = None
+        self._stopped = threading.Event()
+
+        n_columns = len(baseline.columns)
+        self.total = RunningStats(n_columns)
+        self.window = RunningStats(n_columns)
+        self.window_started = time.time()
+        self._restore()
+
+    @classmethod
+    def from_artifacts(cls, scaler, feature_columns, percentile_index=None, **kwargs):
+        return cls(DriftBaseline.from_scaler(scaler, feature_columns, percentile_index), **kwargs)
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def _restore(self):
+        """从 state.json 恢复；基线（模型/标准化参数）变化后重新开始统计"""
+        try:
+            with open(self._path(STATE_FILE), encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        if state.get('fingerprint') != self.baseline.fingerprint:
+            print("漂移监控基线已变化，重新开始统计", file=sys.stderr)
+            return
+        self.total = RunningStats.from_dict(state['total'])
+        self.window = RunningStats.from_dict(state['window'])
+        self.window_started = state['window_started']
+
+    def record(self, X, probs):
+        """记录一批评分（原始特征矩阵和累积活产概率），只追加到待处理列表"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        probs = np.atleast_1d(np.asarray(probs, dtype=np.float64))
+        with self._lock:
+            self._pending.append((X, probs))
+            self._pending_rows += len(X)
+            if self._pending_rows >= self.flush_rows:
+                self._flush()
+
+    def _flush(self):
+        # 调用方持有锁
+        if not self._pending:
+            return
+        X = np.vstack([x for x, _ in self._pending])
+        probs = np.concatenate([p for _, p in self._pending])
+        self._pending, self._pending_rows = [], 0
+
+        data = np.column_stack([X, probs])
+        bins = self.baseline.bins(data)
+        invalid = np.column_stack([out_of_bounds(X, self._feature_columns), (probs < 0) | (probs > 1)])
+        self.total.update(data, bins, invalid)
+        self.window.update(data, bins, invalid)
+
+    def report(self, which='total'):
+        """各列的统计与漂移指标（which 为 'total' 或 'window'）"""
+        with self._lock:
+            self._flush()
+            stats = self.total if which == 'total' else self.window
+            psi, ks = drift_scores(stats.hist, self.baseline.expected)
+            std = stats.std()
+            rows = max(stats.rows, 1)
+            return [{
+                'column': column,
+                'count': int(stats.count[j]),
+                'mean': float(stats.mean[j]) if stats.count[j] else np.nan,
+                'std': float(std[j]) if stats.count[j] > 1 else np.nan,
+                'min': float(stats.min[j]) if stats.count[j] else np.nan,
+                'max': float(stats.max[j]) if stats.count[j] else np.nan,
+                # 均值偏移以训练标准差为单位；方差比 = 线上方差 / 训练方差
+                'mean_shift': float((stats.mean[j] - self.baseline.mean[j]) / self.baseline.std[j])
+                              if stats.count[j] else np.nan,
+                'variance_ratio': float((std[j] / self.baseline.std[j]) ** 2) if stats.count[j] > 1 else np.nan,
+                'psi': float(psi[j]),
+                'ks': float(ks[j]),
+                'drift': drift_level(psi[j]),
+                'missing_rate': float(stats.missing[j] / rows),
+                'out_of_range_rate': float(stats.out_of_range[j] / rows)
+            } for j, column in enumerate(self.baseline.columns)]
+
+    def snapshot(self):
+        """写入状态文件；当前窗口到期时把窗口汇总追加到历史并开始新窗口"""
+        now = time.time()
+        window_summary = None
+        with self._lock:
+            self._flush()
+            if now - self.window_started >= self.window_seconds and self.window.rows:
+                psi, ks = drift_scores(self.window.hist, self.baseline.expected)
+                window_summary = {
+                    'start': self.window_started,
+                    'end': now,
+                    'rows': self.window.rows,
+                    'psi': dict(zip(self.baseline.columns, np.round(psi, 4).tolist())),
+                    'ks': dict(zip(self.baseline.columns, np.round(ks, 4).tolist())),
+                    'mean': dict(zip(self.baseline.columns, np.round(self.window.mean, 4).tolist()))
+                }
+                self.window = RunningStats(len(self.baseline.columns))
+                self.window_started = now
+            state = {
+                'fingerprint': self.baseline.fingerprint,
+                'columns': self.baseline.columns,
+                'updated_at': now,
+                'window_started': self.window_started,
+                'total': self.total.to_dict(),
+                'window': self.window.to_dict()
+            }
+
+        os.makedirs(self.state_dir, exist_ok=True)
+        if window_summary is not None:
+            with open(self._path(HISTORY_FILE), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(window_summary, ensure_ascii=False) + '\n')
+        tmp_path = self._path(STATE_FILE) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._path(STATE_FILE))
+
+    def start(self):
+        """启动定期快照的后台线程，并在进程正常退出时再写一次"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='drift-snapshot', daemon=True)
+            self._thread.start()
+            atexit.register(self.snapshot)
+        return self
+
+    def stop(self):
+        """停止后台线程并写入最后一次快照（模型切换后释放旧版本的监控）"""
+        if self._thread is not None and not self._stopped.is_set():
+            self._stopped.set()
+            self._thread.join()
+            atexit.unregister(self.snapshot)
+            self.snapshot()
+
+    def _run(self):
+        while not self._stopped.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except OSError as e:
+                print(f"写入漂移监控快照失败: {e}", file=sys.stderr)
+
+
+def version_state_dir(root, model_key):
+    """模型版本（名称:版本）的状态目录，文件名中不安全的字符替换为 _"""
+    return os.path.join(root, re.sub(r'[^\w.\-]', '_', model_key))
+
+
+def load_history(state_dir=DRIFT_DIR):
+    path = os.path.join(state_dir, HISTORY_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    import pandas as pd
+
+    from inference import load_artifacts
+    from percentiles import load_index
+
+    parser = argparse.ArgumentParser(description="输入漂移与数据质量报告")
+    parser.add_argument('--state-dir', default=DRIFT_DIR, help="漂移监控状态根目录")
+    parser.add_argument('--model', default=DEFAULT_MODEL_KEY,
+                        help="模型版本（名称:版本，注册表中的模型；默认为目录下的pkl模型）")
+    parser.add_argument('--history', action='store_true', help="显示历史窗口的PSI")
+    args = parser.parse_args(argv)
+    state_dir = version_state_dir(args.state_dir, args.model)
+
+    if args.history:
+        history = load_history(state_dir)
+        if not history:
+            parser.error("没有历史窗口")
+        frame = pd.DataFrame([h['psi'] for h in history],
+                             index=[time.strftime('%Y-%m-%d %H:%M', time.localtime(h['end'])) for h in history])
+        print(frame.round(3).T.to_string())
+        return
+
+    if args.model == DEFAULT_MODEL_KEY:
+        _, scaler, feature_columns = load_artifacts()
+    else:
+        from registry import ModelRegistry
+        name, _, version = args.model.partition(':')
+        loaded = ModelRegistry().load(name, version or None)
+        scaler, feature_columns = loaded.scaler, loaded.feature_columns
+    monitor = DriftMonitor.from_artifacts(scaler, feature_columns, load_index(), state_dir=state_dir)
+    for which, title in (('total', "累计"), ('window', "当前窗口")):
+        frame = pd.DataFrame(monitor.report(which)).set_index('column')
+        print(f"{title}（{int(frame['count'].max())} 行）:")
+        print(frame[['mean', 'mean_shift', 'variance_ratio', 'psi', 'ks', 'drift', 'missing_rate',
+                     'out_of_range_rate']].round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
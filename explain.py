@@ -0,0 +1,185 @@
+"""SHAP特征贡献计算
+
+默认使用XGBoost原生的TreeSHAP（Booster.predict(pred_contribs=True)，C++多线程），
+不再依赖shap库；shap.TreeExplainer 作为可选后端保留。
+单行和批量解释共用同一套SHAP输出整理逻辑；shap后端批量输入较大时按行切分到多个进程并行计算。
+
+模型在标准化后的输入上训练和预测，SHAP值必须在同一输入（scaler.transform 的输出）上计算，
+原始特征值只用于显示；check_additivity 校验 期望值 + ΣSHAP 与预测概率一致。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from inference import BoosterClassifier
+
+# 每个进程分片的默认行数
+DEFAULT_SHARD_SIZE = 20000
+
+# SHAP值所解释的输入空间，写入参考人群和报告清单；旧版本按原始输入计算的结果不再复用
+SHAP_INPUT = 'scaled'
+
+# 加性校验容差（概率空间；模型以float32累加，对数几率空间的比较在概率接近0或1时不稳定）
+ADDITIVITY_TOL = 1e-5
+
+# 解释器后端：'native' 为XGBoost原生贡献值，'shap' 为 shap.TreeExplainer
+BACKENDS = ('native', 'shap')
+DEFAULT_BACKEND = 'native'
+
+# 子进程内的解释器（由进程池initializer构建，每个进程只构建一次）
+_worker_explainer = None
+
+
+def _booster(model):
+    """XGBClassifier（pickle模型）、BoosterClassifier（导出/注册表模型）或Booster本身"""
+    if isinstance(model, BoosterClassifier):
+        return model.booster
+    return model.get_booster() if hasattr(model, 'get_booster') else model
+
+
+class NativeExplainer:
+    """XGBoost原生TreeSHAP解释器
+
+    与 shap.TreeExplainer 提供相同的 shap_values / expected_value 接口，
+    输出直接为正类（累积活产）对数几率空间的 (n_rows, 15) 矩阵。
+    """
+
+    def __init__(self, model):
+        self.booster = _booster(model)
+        self.feature_names = self.booster.feature_names
+        self._expected_value = None
+
+    def contributions(self, X):
+        """返回 (特征贡献 (n_rows, 15), 偏置 (n_rows,))，偏置即期望值"""
+        import xgboost
+
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        contribs = self.booster.predict(xgboost.DMatrix(X, feature_names=self.feature_names), pred_contribs=True)
+        return contribs[:, :-1], contribs[:, -1]
+
+    def shap_values(self, X):
+        return self.contributions(X)[0]
+
+    @property
+    def expected_value(self):
+        # 偏置项与输入无关，用全零行计算一次即可
+        if self._expected_value is None:
+            _, bias = self.contributions(np.zeros((1, self.booster.num_features())))
+            self._expected_value = float(bias[0])
+        return self._expected_value
+
+
+def build_explainer(model, backend=DEFAULT_BACKEND):
+    """构建解释器（默认XGBoost原生后端）"""
+    if backend == 'native':
+        return NativeExplainer(model)
+    if backend == 'shap':
+        import shap
+        return shap.TreeExplainer(_booster(model))
+    raise ValueError(f"未知的解释器后端: {backend}")
+
+
+def positive_class_shap(shap_values, expected_values):
+    """把不同版本SHAP的输出整理为正类的 (n_rows, n_features) 矩阵和期望值
+
+    形状为 (n, 特征数, 2) 的三维数组、按类别组成的列表以及普通二维数组都会被统一处理。
+    """
+    if isinstance(shap_values, np.ndarray) and shap_values.ndim == 3:
+        # 取正类（累积活产，索引1）的SHAP值
+        values = shap_values[:, :, 1]
+        expected_value = np.ravel(expected_values)[1]
+    elif isinstance(shap_values, list):
+        values = np.asarray(shap_values[1])
+        expected_value = expected_values[1] if isinstance(expected_values, list) else expected_values
+    else:
+        values = np.asarray(shap_values)
+        expected_value = expected_values
+    return np.atleast_2d(values), float(np.ravel(expected_value)[-1])
+
+
+def _init_worker(model):
+    global _worker_explainer
+    _worker_explainer = build_explainer(model, backend='shap')
+
+
+def _worker_shap(X):
+    return positive_class_shap(_worker_explainer.shap_values(X), _worker_explainer.expected_value)[0]
+
+
+def batch_shap_values(model, X, explainer=None, n_jobs=None, shard_size=DEFAULT_SHARD_SIZE, scaler=None):
+    """批量计算 N×15 输入的SHAP值
+
+    返回 (attributions, expected_value)，attributions 为 N×15 的NumPy数组。
+    X 为原始特征时传入 scaler，先标准化再解释（与预测的输入一致）；不传则认为 X 已标准化。
+    原生后端自身多线程，始终在当前进程计算；shap后端在行数不超过 shard_size
+    或 n_jobs 为1时在当前进程计算，否则切分到进程池。
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if scaler is not None:
+        X = np.asarray(scaler.transform(X), dtype=np.float64)
+    if explainer is None:
+        explainer = build_explainer(model)
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if isinstance(explainer, NativeExplainer) or n_jobs == 1 or len(X) <= shard_size:
+        values, expected_value = positive_class_shap(explainer.shap_values(X), explainer.expected_value)
+        return values, expected_value
+
+    shards = [X[i:i + shard_size] for i in range(0, len(X), shard_size)]
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(shards)),
+                             initializer=_init_worker, initargs=(model,)) as pool:
+        parts = list(pool.map(_worker_shap, shards))
+
+    # 期望值与输入无关，用主进程的解释器计算一次即可
+    _, expected_value = positive_class_shap(explainer.shap_values(X[:1]), explainer.expected_value)
+    return np.vstack(parts), expected_value
+
+
+def additivity_error(attributions, expected_value, probs):
+    """各行 sigmoid(期望值 + ΣSHAP) 与预测概率之差的最大绝对值"""
+    margin = expected_value + np.atleast_2d(attributions).sum(axis=1, dtype=np.float64)
+    reconstructed = 1.0 / (1.0 + np.exp(-margin))
+    return float(np.max(np.abs(reconstructed - np.asarray(probs, dtype=np.float64)), initial=0.0))
+
+
+def check_additivity(attributions, expected_value, probs, tol=ADDITIVITY_TOL):
+    """期望值 + ΣSHAP 必须还原出预测概率，否则SHAP值解释的不是模型实际评分的输入"""
+    error = additivity_error(attributions, expected_value, probs)
+    if not error <= tol:
+        raise ValueError(f"SHAP值与预测概率不一致（最大误差 {error:.2e}），请确认解释的是标准化后的输入")
+    return error
+
+
+def contribution_table(feature_values, shap_value, feature_labels):
+    """单个患者的特征贡献分析表（特征、数值、影响，按绝对影响降序）"""
+    shap_df = pd.DataFrame({
+        '特征': feature_labels,
+        '数值': np.asarray(feature_values, dtype=float),
+        '影响': np.asarray(shap_value, dtype=float)
+    })
+
+    # 按绝对影响排序
+    shap_df['绝对影响'] = shap_df['影响'].abs()
+    shap_df = shap_df.sort_values('绝对影响', ascending=False)
+    return shap_df[['特征', '数值', '影响']]
+
+
+def contribution_frame(X, attributions, feature_labels, row_ids=None):
+    """批量特征贡献表：长表格式，每个患者的15行与单行表结构相同，另加'患者'列"""
+    X = np.asarray(X, dtype=float)
+    n_rows, n_features = attributions.shape
+    if row_ids is None:
+        row_ids = np.arange(n_rows)
+
+    # 每行内部按绝对影响降序
+    order = np.argsort(-np.abs(attributions), axis=1, kind='stable')
+    rows = np.repeat(np.arange(n_rows), n_features)
+    cols = order.ravel()
+    return pd.DataFrame({
+        '患者': np.asarray(row_ids)[rows],
+        '特征': np.asarray(feature_labels, dtype=object)[cols],
+        '数值': X[rows, cols],
+        '影响': attributions[rows, cols]
+    })
@@ -0,0 +1,63 @@
+"""导出免pickle的轻量模型
+
+把 best_xgboost_model.pkl 中的Booster保存为XGBoost原生格式（.ubj/.json），
+把 scaler.pkl 的均值和标准差保存为平铺的 .npy 数组，供 inference.load_exported() 加载。
+
+用法：python export_model.py [-o exported_model] [--format ubj|json]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from inference import (
+    EXPORT_BOOSTER_FILE, EXPORT_DIR, EXPORT_MEAN_FILE, EXPORT_METADATA_FILE, EXPORT_SCALE_FILE,
+    load_artifacts, load_exported, predict_batch
+)
+
+
+def export_model(model, scaler, feature_columns, export_dir=EXPORT_DIR, booster_format='ubj'):
+    """把模型、标准化参数和特征列名写入导出目录，返回Booster文件路径"""
+    os.makedirs(export_dir, exist_ok=True)
+
+    booster_file = os.path.splitext(EXPORT_BOOSTER_FILE)[0] + '.' + booster_format
+    booster_path = os.path.join(export_dir, booster_file)
+    model.get_booster().save_model(booster_path)
+
+    np.save(os.path.join(export_dir, EXPORT_MEAN_FILE), np.asarray(scaler.mean_, dtype=np.float64))
+    np.save(os.path.join(export_dir, EXPORT_SCALE_FILE), np.asarray(scaler.scale_, dtype=np.float64))
+
+    metadata = {
+        'feature_columns': list(feature_columns),
+        'booster_file': booster_file,
+        'objective': model.get_params().get('objective'),
+        'exported_at': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    with open(os.path.join(export_dir, EXPORT_METADATA_FILE), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    return booster_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出免pickle的轻量模型")
+    parser.add_argument('-o', '--output', default=EXPORT_DIR, help="导出目录")
+    parser.add_argument('--format', choices=['ubj', 'json'], default='ubj', help="Booster保存格式")
+    args = parser.parse_args(argv)
+
+    model, scaler, feature_columns = load_artifacts()
+    booster_path = export_model(model, scaler, feature_columns, args.output, args.format)
+
+    # 用随机样本核对导出前后的预测概率
+    rng = np.random.default_rng(0)
+    X = scaler.mean_ + rng.standard_normal((1000, len(feature_columns))) * scaler.scale_
+    exported = load_exported(args.output)
+    diff = np.abs(predict_batch(model, scaler, X) - predict_batch(exported[0], exported[1], X)).max()
+
+    print(f"已导出到 {args.output}（Booster: {os.path.basename(booster_path)}），预测最大差异 {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
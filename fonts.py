@@ -0,0 +1,134 @@
+"""中文字体解析
+
+每个进程只解析一次可用的中文字体，并把结果按fontconfig状态持久化到磁盘缓存，
+之后的进程在字体目录未变化时无需再遍历 fontManager.ttflist。
+所有matplotlib绘图路径都通过 apply_chinese_font() 设置字体。
+"""
+import hashlib
+import json
+import os
+import threading
+
+# 按优先级排列的中文字体
+CHINESE_FONTS = [
+    'WenQuanYi Zen Hei',  # 文泉驿正黑（Linux常用）
+    'WenQuanYi Micro Hei',  # 文泉驿微米黑
+    'Noto Sans CJK SC',  # Google Noto字体（packages.txt中的fonts-noto-cjk）
+    'SimHei',  # 黑体
+    'Microsoft YaHei',  # 微软雅黑
+    'PingFang SC',  # 苹果字体
+    'Hiragino Sans GB',  # 冬青黑体
+    'Source Han Sans SC'  # 思源黑体
+]
+
+FALLBACK_FONTS = ['DejaVu Sans', 'Arial', 'Liberation Sans']
+
+# 字体安装目录与fontconfig缓存目录，任一目录变化都会使磁盘缓存失效
+FONT_DIRS = [
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    '/var/cache/fontconfig',
+    os.path.expanduser('~/.fonts'),
+    os.path.expanduser('~/.local/share/fonts'),
+    os.path.expanduser('~/.cache/fontconfig'),
+    os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+    '/Library/Fonts',
+    '/System/Library/Fonts'
+]
+
+CACHE_FILE_NAME = 'chinese_font.json'
+
+_lock = threading.Lock()
+_resolved = None
+
+
+def _cache_path():
+    import matplotlib
+    return os.path.join(matplotlib.get_cachedir(), CACHE_FILE_NAME)
+
+
+def fontconfig_key():
+    """由matplotlib版本和各字体目录的修改时间生成的状态键"""
+    import matplotlib
+
+    state = [matplotlib.__version__]
+    for path in FONT_DIRS:
+        try:
+            state.append(f"{path}:{os.stat(path).st_mtime_ns}")
+        except OSError:
+            continue
+    return hashlib.sha1('|'.join(state).encode('utf-8')).hexdigest()
+
+
+def _read_cache(key):
+    try:
+        with open(_cache_path(), encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('key') != key:
+        return None
+    # 字体文件被删除时重新解析
+    if cached.get('path') and not os.path.exists(cached['path']):
+        return None
+    return cached
+
+
+def _write_cache(entry):
+    path = _cache_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        # 缓存目录不可写时只影响下次启动速度
+        pass
+
+
+def _scan_fonts():
+    """遍历一次 fontManager.ttflist，返回 (字体名, 字体文件路径)"""
+    import matplotlib.font_manager as fm
+
+    available = {}
+    for f in fm.fontManager.ttflist:
+        available.setdefault(f.name, f.fname)
+    for font in CHINESE_FONTS:
+        if font in available:
+            return font, available[font]
+    return None, None
+
+
+def resolve_chinese_font():
+    """返回可用的中文字体名（没有时返回None），每个进程只解析一次"""
+    global _resolved
+    if _resolved is not None:
+        return _resolved['name']
+
+    with _lock:
+        if _resolved is None:
+            key = fontconfig_key()
+            entry = _read_cache(key)
+            if entry is None:
+                name, path = _scan_fonts()
+                entry = {'key': key, 'name': name, 'path': path}
+                _write_cache(entry)
+            _resolved = entry
+    return _resolved['name']
+
+
+def apply_chinese_font():
+    """把解析到的中文字体写入matplotlib全局设置，并关闭unicode负号，返回字体名"""
+    import matplotlib
+
+    try:
+        font = resolve_chinese_font()
+    except Exception as e:
+        print(f"字体设置失败: {e}")
+        font = None
+
+    matplotlib.rcParams['font.sans-serif'] = ([font] if font else []) + FALLBACK_FONTS
+    matplotlib.rcParams['font.family'] = 'sans-serif'
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return font
@@ -0,0 +1,211 @@
+"""模型加载与批量推理工具
+
+不依赖streamlit，供 web.py 与命令行脚本共用同一套模型文件和风险分层规则。
+"""
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from tracing import span
+
+# 模型文件所在目录（与web.py同目录）
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, 'best_xgboost_model.pkl')
+SCALER_PATH = os.path.join(BASE_DIR, 'scaler.pkl')
+FEATURE_COLUMNS_PATH = os.path.join(BASE_DIR, 'feature_columns.pkl')
+
+# 导出的免pickle模型目录（由 export_model.py 生成）
+EXPORT_DIR = os.path.join(BASE_DIR, 'exported_model')
+EXPORT_BOOSTER_FILE = 'model.ubj'
+EXPORT_MEAN_FILE = 'scaler_mean.npy'
+EXPORT_SCALE_FILE = 'scaler_scale.npy'
+EXPORT_METADATA_FILE = 'metadata.json'
+
+# 模型使用的15个特征（全部为需要标准化的连续变量）
+FEATURE_NAMES = [
+    'age', 'LDL', 'bPRL', 'bE2', 'AMH', 'S_Dose', 'T_Dose',
+    'D5_FSH', 'D5_LH', 'D5_E2', 'HCG_E2', 'HCG_LH', 'Ocytes', 'BFR', 'Cycles'
+]
+
+# 各特征的输入范围、默认值和步长（web.py 中 st.number_input 的参数）
+FEATURE_INPUTS = {
+    'age': {'min_value': 18, 'max_value': 50, 'value': 30, 'step': 1},
+    'LDL': {'min_value': 1.0, 'max_value': 8.0, 'value': 2.8, 'step': 0.1},
+    'bPRL': {'min_value': 1.0, 'max_value': 100.0, 'value': 15.0, 'step': 0.1},
+    'bE2': {'min_value': 10.0, 'max_value': 200.0, 'value': 40.0, 'step': 1.0},
+    'AMH': {'min_value': 0.1, 'max_value': 20.0, 'value': 3.0, 'step': 0.1},
+    'S_Dose': {'min_value': 75, 'max_value': 450, 'value': 225, 'step': 1},
+    'T_Dose': {'min_value': 500, 'max_value': 5000, 'value': 2250, 'step': 1},
+    'D5_FSH': {'min_value': 1.0, 'max_value': 50.0, 'value': 8.0, 'step': 0.1},
+    'D5_LH': {'min_value': 0.5, 'max_value': 30.0, 'value': 3.0, 'step': 0.1},
+    'D5_E2': {'min_value': 50.0, 'max_value': 2000.0, 'value': 200.0, 'step': 10.0},
+    'HCG_E2': {'min_value': 500.0, 'max_value': 8000.0, 'value': 2000.0, 'step': 50.0},
+    'HCG_LH': {'min_value': 0.1, 'max_value': 20.0, 'value': 1.0, 'step': 0.1},
+    'Ocytes': {'min_value': 1, 'max_value': 50, 'value': 12, 'step': 1},
+    'BFR': {'min_value': 0.0, 'max_value': 100.0, 'value': 40.0, 'step': 1.0},
+    'Cycles': {'min_value': 1, 'max_value': 10, 'value': 1, 'step': 1}
+}
+
+# 风险分层阈值（累积活产概率）
+LOW_PROB_THRESHOLD = 0.3
+HIGH_PROB_THRESHOLD = 0.7
+RISK_THRESHOLDS = (LOW_PROB_THRESHOLD, HIGH_PROB_THRESHOLD)
+
+RISK_LEVELS = ['低概率', '中等概率', '高概率']
+RISK_COLORS = ['red', 'orange', 'green']
+
+
+def load_artifacts(model_path=MODEL_PATH, scaler_path=SCALER_PATH, feature_columns_path=FEATURE_COLUMNS_PATH):
+    """加载XGBoost模型、标准化器和特征列名"""
+    import joblib
+
+    # 加载XGBoost模型
+    model = joblib.load(model_path)
+
+    # 加载标准化器
+    scaler = joblib.load(scaler_path)
+
+    # 加载特征列名
+    with open(feature_columns_path, 'rb') as f:
+        feature_columns = pickle.load(f)
+
+    return model, scaler, feature_columns
+
+
+class AffineScaler:
+    """与StandardScaler等价的标准化：(X - mean) / scale"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class BoosterClassifier:
+    """直接调用XGBoost原生Booster的二分类器，提供与XGBClassifier相同的predict_proba"""
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    def predict_proba(self, X):
+        birth_prob = self.booster.inplace_predict(np.asarray(X, dtype=np.float64))
+        return np.column_stack([1.0 - birth_prob, birth_prob])
+
+    @property
+    def feature_importances_(self):
+        """与XGBClassifier.feature_importances_ 口径一致（gain，归一化）"""
+        score = self.booster.get_score(importance_type='gain')
+        values = np.array([score.get(f, 0.0) for f in self.booster.feature_names], dtype=np.float32)
+        total = values.sum()
+        return values / total if total > 0 else values
+
+
+class FusedPredictor:
+    """融合标准化与Booster推理的预测器
+
+    输入为按 feature_columns 顺序排列的原始特征向量或矩阵（float32/float64均可），
+    在预分配缓冲区上原地完成 (X - mean) / scale，再直接调用Booster.inplace_predict，
+    热路径中不构造任何pandas对象。缓冲区按线程分配，可在多线程中共用同一实例。
+    """
+
+    def __init__(self, booster, mean, scale, initial_rows=64):
+        self.booster = booster
+        self.mean = np.ascontiguousarray(mean, dtype=np.float64)
+        self.scale = np.ascontiguousarray(scale, dtype=np.float64)
+        self.n_features = len(self.mean)
+        self.initial_rows = initial_rows
+        self._local = threading.local()
+
+    @classmethod
+    def from_artifacts(cls, model, scaler, **kwargs):
+        """由 load_artifacts() 或 load_exported() 的模型和标准化器构建"""
+        booster = model.booster if isinstance(model, BoosterClassifier) else model.get_booster()
+        return cls(booster, scaler.mean_, scaler.scale_, **kwargs)
+
+    def _buffer(self, n_rows):
+        buf = getattr(self._local, 'buf', None)
+        if buf is None or len(buf) < n_rows:
+            buf = np.empty((max(n_rows, self.initial_rows), self.n_features), dtype=np.float64)
+            self._local.buf = buf
+        return buf[:n_rows]
+
+    def predict(self, X):
+        """返回累积活产概率（一维数组）"""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"特征数量应为 {self.n_features}，实际为 {X.shape[1]}")
+
+        buf = self._buffer(len(X))
+        with span('scaler.transform'):
+            np.subtract(X, self.mean, out=buf)
+            np.divide(buf, self.scale, out=buf)
+        with span('predict_proba'):
+            return self.booster.inplace_predict(buf)
+
+    def predict_proba(self, X):
+        """返回 n×2 概率矩阵（无累积活产、累积活产）"""
+        birth_prob = self.predict(X)
+        return np.column_stack([1.0 - birth_prob, birth_prob])
+
+
+def load_exported(export_dir=EXPORT_DIR, mmap_mode=None):
+    """加载 export_model.py 导出的模型，返回值与 load_artifacts() 相同
+
+    只依赖NumPy和xgboost核心库，不需要scikit-learn，也不读取任何pickle文件。
+    mmap_mode='r' 时标准化参数以只读内存映射方式加载，多个进程共享同一份页缓存。
+    """
+    from xgboost import Booster
+
+    with open(os.path.join(export_dir, EXPORT_METADATA_FILE), encoding='utf-8') as f:
+        metadata = json.load(f)
+
+    booster_file = metadata.get('booster_file', EXPORT_BOOSTER_FILE)
+    booster = Booster(model_file=os.path.join(export_dir, booster_file))
+    scaler = AffineScaler(
+        np.load(os.path.join(export_dir, EXPORT_MEAN_FILE), mmap_mode=mmap_mode),
+        np.load(os.path.join(export_dir, EXPORT_SCALE_FILE), mmap_mode=mmap_mode)
+    )
+    return BoosterClassifier(booster), scaler, metadata['feature_columns']
+
+
+def out_of_bounds(X, feature_columns):
+    """逐元素检查是否超出输入框范围（缺失值也视为超出），返回与X同形的布尔矩阵"""
+    lower = np.array([FEATURE_INPUTS[c]['min_value'] for c in feature_columns], dtype=np.float64)
+    upper = np.array([FEATURE_INPUTS[c]['max_value'] for c in feature_columns], dtype=np.float64)
+    # 容许浮点表示误差（如 0.1 累加得到的 20.000000000000004）
+    tol = 1e-9 * np.maximum(1.0, np.abs(upper))
+    X = np.asarray(X, dtype=np.float64)
+    # NaN与任何数比较均为False，因此同样被标记
+    return ~((X >= lower - tol) & (X <= upper + tol))
+
+
+def risk_index(birth_prob, thresholds=RISK_THRESHOLDS):
+    """返回风险分层下标（0: 低概率, 1: 中等概率, 2: 高概率），支持标量和数组
+
+    thresholds 为 (低, 高) 分层边界，默认 0.3/0.7；使用校准文件时为其中保存的边界。
+    """
+    return np.searchsorted(thresholds, birth_prob, side='right')
+
+
+def get_risk_level(birth_prob, thresholds=RISK_THRESHOLDS):
+    """单个概率对应的风险分层及显示颜色"""
+    idx = int(risk_index(birth_prob, thresholds))
+    return RISK_LEVELS[idx], RISK_COLORS[idx]
+
+
+def risk_levels(birth_probs, thresholds=RISK_THRESHOLDS):
+    """批量概率对应的风险分层标签"""
+    return np.asarray(RISK_LEVELS, dtype=object)[risk_index(birth_probs, thresholds)]
+
+
+def predict_batch(model, scaler, X):
+    """对 N×15 的原始特征矩阵做一次标准化和一次predict_proba，返回 N×2 概率矩阵"""
+    X_scaled = scaler.transform(X)
+    return model.predict_proba(X_scaled)
@@ -0,0 +1,131 @@
+"""参考人群百分位索引
+
+对每个输入特征和模型输出（累积活产概率）预先计算 0%~100% 共 QUANTILE_POINTS 个分位点，
+保存为与 scaler.pkl 同目录的小型 .npz 文件（约65KB）。查询时在分位点表上定位并线性插值，
+一次查询全部16列只需数十微秒。取值相同的一段（如移植周期数等离散特征）取该段的中间百分位。
+
+用法：
+    python percentiles.py reference.csv                 # 由患者文件构建
+    python percentiles.py --from-cohort cohort_shap     # 由 cohort_shap.py 的参考人群构建
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from inference import BASE_DIR
+
+PERCENTILES_PATH = os.path.join(BASE_DIR, 'percentiles.npz')
+
+# 模型输出在索引中的列名
+OUTPUT_COLUMN = 'birth_prob'
+
+# 分位点个数（0.1% 间隔）
+QUANTILE_POINTS = 1001
+
+
+class PercentileIndex:
+    """按列保存的分位点表，percentiles() 返回各取值在参考人群中的百分位（0~100）"""
+
+    def __init__(self, columns, quantiles, n_rows):
+        self.columns = list(columns)
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.levels = np.linspace(0.0, 100.0, self.quantiles.shape[1])
+        self.n_rows = int(n_rows)
+        self._position = {c: i for i, c in enumerate(self.columns)}
+
+        # 各列分位点平移到互不重叠的区间后拼成一个有序数组，一次searchsorted即可查询所有列
+        self._low = self.quantiles.min()
+        self._stride = self.quantiles.max() - self._low + 1.0
+        self._offsets = np.arange(len(self.columns)) * self._stride
+        self._flat = (self.quantiles - self._low + self._offsets[:, None]).ravel()
+
+    @classmethod
+    def build(cls, columns, data):
+        """data 为 (n_rows, 列数) 的参考数据"""
+        data = np.asarray(data, dtype=np.float64)
+        quantiles = np.quantile(data, np.linspace(0.0, 1.0, QUANTILE_POINTS), axis=0).T
+        return cls(columns, quantiles, len(data))
+
+    @classmethod
+    def load(cls, path=PERCENTILES_PATH):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['columns'].tolist(), f['quantiles'], f['n_rows'])
+
+    def save(self, path=PERCENTILES_PATH):
+        np.savez(path, columns=np.asarray(self.columns), quantiles=self.quantiles.astype(np.float32),
+                 n_rows=np.int64(self.n_rows))
+
+    def percentiles(self, values, columns=None):
+        """各列取值对应的百分位；columns 默认为全部列，顺序与 values 对应"""
+        positions = np.arange(len(self.columns)) if columns is None else np.array([self._position[c] for c in columns])
+        values = np.asarray(values, dtype=np.float64)
+        rows = self.quantiles[positions]
+        n_points = rows.shape[1]
+
+        # 超出参考人群范围的取值直接记为0或100
+        below, above = values < rows[:, 0], values > rows[:, -1]
+        shifted = np.clip(values, rows[:, 0], rows[:, -1]) - self._low + self._offsets[positions]
+        base = positions * n_points
+        left = np.searchsorted(self._flat, shifted, side='left') - base
+        right = np.searchsorted(self._flat, shifted, side='right') - base
+
+        # 落在两个分位点之间：线性插值；与若干分位点相等：取这段相同取值的中间百分位
+        lo = np.maximum(left - 1, 0)
+        hi = np.minimum(left, n_points - 1)
+        x0, x1 = rows[np.arange(len(rows)), lo], rows[np.arange(len(rows)), hi]
+        width = np.where(x1 > x0, x1 - x0, 1.0)
+        between = self.levels[lo] + (values - x0) / width * (self.levels[hi] - self.levels[lo])
+        tied = (self.levels[np.minimum(left, n_points - 1)] + self.levels[np.maximum(right - 1, 0)]) / 2
+
+        result = np.where(right > left, tied, between)
+        return np.where(below, 0.0, np.where(above, 100.0, result))
+
+    def percentile(self, column, value):
+        return float(self.percentiles([value], [column])[0])
+
+
+def load_index(path=PERCENTILES_PATH):
+    """索引文件不存在时返回None"""
+    return PercentileIndex.load(path) if os.path.exists(path) else None
+
+
+def main(argv=None):
+    from inference import FEATURE_NAMES
+
+    parser = argparse.ArgumentParser(description="构建参考人群百分位索引")
+    parser.add_argument('input', nargs='?', help="患者数据文件（.csv 或 .parquet），需包含15个特征列")
+    parser.add_argument('--from-cohort', help="使用 cohort_shap.py 生成的参考人群目录")
+    parser.add_argument('-o', '--output', default=PERCENTILES_PATH, help="索引文件")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="读取患者文件时的每块行数")
+    args = parser.parse_args(argv)
+
+    columns = FEATURE_NAMES + [OUTPUT_COLUMN]
+    if args.from_cohort:
+        from cohort_shap import CohortExplanations
+        cohort = CohortExplanations(args.from_cohort)
+        if cohort.feature_columns != FEATURE_NAMES:
+            parser.error("参考人群的特征列与模型不一致")
+        X, _, probs = cohort.arrays()
+        data = np.column_stack([X, probs])
+    elif args.input:
+        from batch_predict import check_parquet_support, iter_chunks
+        check_parquet_support(parser, args.input)
+        from inference import load_artifacts, predict_batch
+        model, scaler, feature_columns = load_artifacts()
+        parts = []
+        for chunk in iter_chunks(args.input, args.chunk_size, list(feature_columns)):
+            X = chunk[feature_columns].to_numpy(dtype=np.float64)
+            parts.append(np.column_stack([X, predict_batch(model, scaler, X)[:, 1]]).astype(np.float32))
+        data = np.vstack(parts)
+    else:
+        parser.error("需要指定患者数据文件或 --from-cohort")
+
+    index = PercentileIndex.build(columns, data)
+    index.save(args.output)
+    print(f"已写入 {args.output}（{index.n_rows} 行，{os.path.getsize(args.output) / 1024:.0f} KB）", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""版本化模型注册表
+
+注册表目录按 <名称>/<版本>/ 组织，每个版本目录与 export_model.py 的导出格式相同
+（Booster原生文件 + 标准化参数 .npy + metadata.json），另有 compiled/ 保存编译后的树节点数组。
+加载时校验特征列与模型的15个特征一致。
+推理引擎可选 compiled（默认，tree_compiler.py 编译后的节点数组）或 xgboost（Booster.inplace_predict）。
+标准化参数和编译后的节点数组以只读内存映射方式加载，多个工作进程共享同一份页缓存；
+Booster 由 XGBoost 读入各进程自己的内存（SHAP解释仍需要它），不在进程间共享。
+因此评分数据的进程间共享只适用于 compiled 引擎，且版本目录中需有 compiled/
+（publish 时写入；早期发布的版本用 compile 子命令补写，否则每个进程各自编译一份）。
+
+热切换：每个名称的"当前版本"是一个不可变的 ModelVersion 对象，切换时在锁内整体替换引用。
+请求开始时取一次当前版本并一直使用到结束，切换不会影响进行中的请求，也不会出现新旧文件混用。
+
+用法：
+    python registry.py publish pcos_clbr 1.1            # 把目录下的pkl模型发布为新版本
+    python registry.py compile pcos_clbr 1.0            # 为早期发布的版本补写编译后的节点数组
+    python registry.py list
+"""
+import argparse
+import os
+import re
+import shutil
+import threading
+import time
+
+from inference import BASE_DIR, FEATURE_NAMES, FusedPredictor, load_artifacts, load_exported
+from tree_compiler import COMPILED_DIR, CompiledPredictor, CompiledTrees
+
+REGISTRY_DIR = os.environ.get('MODEL_REGISTRY', os.path.join(BASE_DIR, 'models'))
+
+# 推理引擎：名称 → 预测器类（接口相同）
+# 默认 compiled：web.py 和 service.py 以单行、小批量评分为主，编译推理更快，且节点数组可内存映射共享；
+# 数千行以上的批量 Booster 更快（见 benchmarks/bench_compiled.py），但在界面批量评分中相差仅数毫秒
+ENGINES = {'xgboost': FusedPredictor, 'compiled': CompiledPredictor}
+DEFAULT_ENGINE = 'compiled'
+
+
+def validate_feature_columns(feature_columns):
+    """特征列必须与模型的15个特征完全一致（含顺序）"""
+    feature_columns = list(feature_columns)
+    if feature_columns != FEATURE_NAMES:
+        missing = [c for c in FEATURE_NAMES if c not in feature_columns]
+        extra = [c for c in feature_columns if c not in FEATURE_NAMES]
+        detail = f"缺少 {missing}，多出 {extra}" if missing or extra else "顺序不一致"
+        raise ValueError(f"特征列与模型要求的{len(FEATURE_NAMES)}个特征不符：{detail}")
+    return feature_columns
+
+
+def version_key(version):
+    """版本号排序键：数字部分按数值比较（1.10 > 1.9）"""
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part) for part in re.split(r'[.\-_]', version)]
+
+
+class ModelVersion:
+    """一个已加载的模型版本（加载后不再修改）"""
+
+    def __init__(self, name, version, model, scaler, feature_columns, path=None, engine=DEFAULT_ENGINE):
+        if engine not in ENGINES:
+            raise ValueError(f"未知的推理引擎：{engine}（可选 {', '.join(ENGINES)}）")
+        self.name = name
+        self.version = version
+        self.path = path
+        self.model = model
+        self.scaler = scaler
+        self.feature_columns = validate_feature_columns(feature_columns)
+        self.engine = engine
+        if engine == 'compiled' and path is not None:
+            self.predictor = CompiledPredictor.from_version_dir(model, scaler, path)
+        else:
+            self.predictor = ENGINES[engine].from_artifacts(model, scaler)
+        self.loaded_at = time.time()
+
+    @property
+    def key(self):
+        return f'{self.name}:{self.version}'
+
+    @classmethod
+    def from_artifacts(cls, model, scaler, feature_columns, name='default', version='pkl', engine=DEFAULT_ENGINE):
+        """由 load_artifacts() 的pickle模型构建（未使用注册表时）"""
+        return cls(name, version, model, scaler, feature_columns, engine=engine)
+
+    def info(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'type': type(self.model).__name__,
+            'engine': self.engine,
+            'n_features': len(self.feature_columns),
+            'loaded_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.loaded_at))
+        }
+
+
+class ModelRegistry:
+    """按名称/版本加载模型，支持多个版本并存和原子热切换"""
+
+    def __init__(self, root=REGISTRY_DIR, engine=DEFAULT_ENGINE):
+        self.root = root
+        self.engine = engine
+        self._loaded = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def versions(self, name):
+        """已发布的版本（升序）；以 . 开头的目录为发布中的临时目录，不计入"""
+        model_dir = os.path.join(self.root, name)
+        if not os.path.isdir(model_dir):
+            return []
+        versions = [v for v in os.listdir(model_dir)
+                    if not v.startswith('.') and os.path.isdir(os.path.join(model_dir, v))]
+        return sorted(versions, key=version_key)
+
+    def latest_version(self, name):
+        versions = self.versions(name)
+        if not versions:
+            raise LookupError(f"注册表 {self.root} 中没有模型 {name}")
+        return versions[-1]
+
+    def load(self, name, version=None):
+        """加载指定版本（默认最新版本）；同一版本在进程内只加载一次"""
+        version = version or self.latest_version(name)
+        key = (name, version)
+        with self._lock:
+            loaded = self._loaded.get(key)
+        if loaded is not None:
+            return loaded
+
+        path = os.path.join(self.root, name, version)
+        if not os.path.isdir(path):
+            raise LookupError(f"模型 {name} 没有版本 {version}")
+        model, scaler, feature_columns = load_exported(path, mmap_mode='r')
+        loaded = ModelVersion(name, version, model, scaler, feature_columns, path, self.engine)
+
+        with self._lock:
+            # 并发加载同一版本时保留先完成的一个
+            return self._loaded.setdefault(key, loaded)
+
+    def activate(self, name, version=None):
+        """把指定版本设为当前版本；新版本先完整加载并校验，再替换引用"""
+        loaded = self.load(name, version)
+        with self._lock:
+            self._active[name] = loaded
+        return loaded
+
+    def active(self, name):
+        """当前版本（尚未激活时激活最新版本）"""
+        with self._lock:
+            loaded = self._active.get(name)
+        return loaded if loaded is not None else self.activate(name)
+
+    def refresh(self, name):
+        """有更新的版本发布时切换过去，返回是否发生切换"""
+        latest = self.latest_version(name)
+        with self._lock:
+            current = self._active.get(name)
+        if current is not None and current.version == latest:
+            return False
+        self.activate(name, latest)
+        return True
+
+    def unload(self, name, version):
+        """释放不再使用的版本（当前版本不能释放）"""
+        with self._lock:
+            current = self._active.get(name)
+            if current is not None and current.version == version:
+                raise ValueError(f"{name}:{version} 是当前版本，不能释放")
+            self._loaded.pop((name, version), None)
+
+
+def publish(model, scaler, feature_columns, name, version, root=REGISTRY_DIR, booster_format='ubj'):
+    """把模型发布为注册表中的新版本
+
+    先写入同级的临时目录，写完后整体重命名为版本目录，其他进程不会看到写了一半的版本。
+    """
+    from export_model import export_model
+
+    validate_feature_columns(feature_columns)
+    model_dir = os.path.join(root, name)
+    target = os.path.join(model_dir, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"版本已存在：{target}")
+
+    tmp_dir = os.path.join(model_dir, f'.{version}.tmp-{os.getpid()}')
+    try:
+        export_model(model, scaler, feature_columns, tmp_dir, booster_format)
+        CompiledTrees.from_booster(model.get_booster()).save(os.path.join(tmp_dir, COMPILED_DIR))
+        os.rename(tmp_dir, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+def compile_version(name, version, root=REGISTRY_DIR):
+    """为已发布的版本写入编译后的节点数组（同样先写临时目录再重命名）"""
+    path = os.path.join(root, name, version)
+    target = os.path.join(path, COMPILED_DIR)
+    if os.path.exists(target):
+        raise FileExistsError(f"已有编译结果：{target}")
+    model, _, _ = load_exported(path)
+
+    tmp_dir = os.path.join(path, f'.{COMPILED_DIR}.tmp-{os.getpid()}')
+    try:
+        CompiledTrees.from_booster(model.booster).save(tmp_dir)
+        os.rename(tmp_dir, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="版本化模型注册表")
+    parser.add_argument('--root', default=REGISTRY_DIR, help="注册表目录")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = subparsers.add_parser('publish', help="把pkl模型发布为新版本")
+    publish_parser.add_argument('name')
+    publish_parser.add_argument('version')
+    publish_parser.add_argument('--format', choices=['ubj', 'json'], default='ubj', help="Booster保存格式")
+
+    compile_parser = subparsers.add_parser('compile', help="为已发布的版本写入编译后的节点数组")
+    compile_parser.add_argument('name')
+    compile_parser.add_argument('version')
+
+    subparsers.add_parser('list', help="列出已发布的模型和版本")
+    args = parser.parse_args(argv)
+
+    if args.command == 'publish':
+        model, scaler, feature_columns = load_artifacts()
+        target = publish(model, scaler, feature_columns, args.name, args.version, args.root, args.format)
+        print(f"已发布 {args.name}:{args.version} → {target}")
+    elif args.command == 'compile':
+        target = compile_version(args.name, args.version, args.root)
+        print(f"已编译 {args.name}:{args.version} → {target}")
+    else:
+        registry = ModelRegistry(args.root)
+        for name in registry.names():
+            print(f"{name}: {', '.join(registry.versions(name))}")
+
+
+if __name__ == "__main__":
+    main()
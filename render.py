@@ -0,0 +1,496 @@
+"""SHAP解释图的轻量渲染
+
+直接由SHAP向量生成SVG字符串，不经过matplotlib；渲染结果按取整后的输入向量做LRU缓存。
+"""
+import html
+
+import numpy as np
+
+from cache import LRUCache
+
+# 与SHAP官方配色一致：正向贡献为红色，负向贡献为蓝色
+POSITIVE_COLOR = '#ff0051'
+NEGATIVE_COLOR = '#008bfb'
+
+FONT_FAMILY = ("'WenQuanYi Zen Hei','WenQuanYi Micro Hei','Noto Sans CJK SC','Source Han Sans SC',"
+               "'Microsoft YaHei','PingFang SC','SimHei',sans-serif")
+
+
+def _fmt(value, digits=3):
+    # 统一使用ASCII负号，避免字体缺少unicode minus
+    return f"{value:+.{digits}f}".replace('−', '-')
+
+
+def _fmt_data(value):
+    return f"{value:.4g}"
+
+
+def _ticks(lo, hi, n=6):
+    """生成约n个取整刻度"""
+    span = hi - lo
+    if span <= 0:
+        return [lo]
+    raw = span / n
+    magnitude = 10 ** np.floor(np.log10(raw))
+    step = min((m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw), default=raw)
+    start = np.ceil(lo / step) * step
+    return list(np.arange(start, hi + step * 0.5, step))
+
+
+def waterfall_svg(shap_value, expected_value, feature_values, feature_labels, max_display=15, width=820):
+    """生成SHAP瀑布图SVG
+
+    与 shap.waterfall_plot 的读法相同：自下而上从期望值 E[f(X)] 出发，逐个累加特征贡献，
+    最终到达该患者的模型输出 f(x)；按绝对贡献从上到下降序排列。
+    """
+    shap_value = np.asarray(shap_value, dtype=float)
+    feature_values = np.asarray(feature_values, dtype=float)
+    expected_value = float(expected_value)
+
+    order = np.argsort(-np.abs(shap_value), kind='stable')
+    rows = [(f"{_fmt_data(feature_values[i])} = {feature_labels[i]}", shap_value[i]) for i in order[:max_display]]
+    if len(order) > max_display:
+        rest = order[max_display:]
+        rows.append((f"其他{len(rest)}个特征", float(shap_value[rest].sum())))
+
+    # 自下而上累加，计算每个条形的起止位置
+    n = len(rows)
+    starts = np.empty(n)
+    cumulative = expected_value
+    for r in range(n - 1, -1, -1):
+        starts[r] = cumulative
+        cumulative += rows[r][1]
+    ends = starts + np.array([v for _, v in rows])
+    fx = cumulative
+
+    lo = min(starts.min(), ends.min(), expected_value, fx)
+    hi = max(starts.max(), ends.max(), expected_value, fx)
+    pad = (hi - lo) * 0.08 or 0.5
+    lo, hi = lo - pad, hi + pad
+
+    label_width, right_margin = 270, 40
+    top, row_height, bottom = 40, 30, 60
+    plot_width = width - label_width - right_margin
+    height = top + n * row_height + bottom
+
+    def x(v):
+        return label_width + (v - lo) / (hi - lo) * plot_width
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" font-size="13">',
+        f'<rect width="{width}" height="{height}" fill="white"/>'
+    ]
+
+    # 横轴与刻度
+    axis_y = top + n * row_height + 6
+    parts.append(f'<line x1="{label_width}" y1="{axis_y}" x2="{width - right_margin}" y2="{axis_y}" stroke="#888"/>')
+    for t in _ticks(lo, hi):
+        tx = x(t)
+        parts.append(f'<line x1="{tx:.1f}" y1="{axis_y}" x2="{tx:.1f}" y2="{axis_y + 5}" stroke="#888"/>')
+        parts.append(f'<text x="{tx:.1f}" y="{axis_y + 18}" text-anchor="middle" fill="#555">{t:.2f}</text>'.replace('−', '-'))
+
+    # 期望值与模型输出的参考线
+    for value, label, y_text in ((expected_value, 'E[f(X)]', axis_y + 40), (fx, 'f(x)', top - 14)):
+        vx = x(value)
+        parts.append(f'<line x1="{vx:.1f}" y1="{top - 6}" x2="{vx:.1f}" y2="{axis_y}" stroke="#bbb" stroke-dasharray="3,3"/>')
+        parts.append(f'<text x="{vx:.1f}" y="{y_text}" text-anchor="middle" fill="#333">{label} = {value:.3f}</text>'.replace('−', '-'))
+
+    # 各特征的贡献条形
+    bar_height = row_height * 0.62
+    for r, (label, value) in enumerate(rows):
+        y = top + r * row_height
+        color = POSITIVE_COLOR if value >= 0 else NEGATIVE_COLOR
+        x0, x1 = sorted((x(starts[r]), x(ends[r])))
+        parts.append(f'<line x1="{label_width}" y1="{y + row_height / 2:.1f}" x2="{width - right_margin}" '
+                     f'y2="{y + row_height / 2:.1f}" stroke="#f0f0f0"/>')
+        parts.append(f'<rect x="{x0:.1f}" y="{y + (row_height - bar_height) / 2:.1f}" '
+                     f'width="{max(x1 - x0, 1):.1f}" height="{bar_height:.1f}" fill="{color}"/>')
+        parts.append(f'<text x="{label_width - 8}" y="{y + row_height / 2 + 4:.1f}" text-anchor="end" fill="#333">'
+                     f'{html.escape(label)}</text>')
+        if value >= 0:
+            parts.append(f'<text x="{x1 + 4:.1f}" y="{y + row_height / 2 + 4:.1f}" fill="{color}">{_fmt(value)}</text>')
+        else:
+            parts.append(f'<text x="{x0 - 4:.1f}" y="{y + row_height / 2 + 4:.1f}" text-anchor="end" '
+                         f'fill="{color}">{_fmt(value)}</text>')
+
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def force_plot_svg(shap_value, expected_value, feature_values, feature_labels, width=900, label_min_width=70):
+    """生成SHAP力图SVG（替代 shap.force_plot 的HTML/JS版本）
+
+    红色箭头为把输出推高的特征，蓝色箭头为把输出拉低的特征，两者在 f(x) 处相接；
+    较窄的片段不显示文字，鼠标悬停可查看特征名、取值和贡献。
+    """
+    shap_value = np.asarray(shap_value, dtype=float)
+    feature_values = np.asarray(feature_values, dtype=float)
+    expected_value = float(expected_value)
+    fx = expected_value + shap_value.sum()
+
+    positive = [i for i in np.argsort(shap_value) if shap_value[i] > 0]  # 升序，最大者紧邻 f(x)
+    negative = [i for i in np.argsort(shap_value) if shap_value[i] < 0]  # 最负者紧邻 f(x)
+
+    left = fx - shap_value[positive].sum()
+    right = fx - shap_value[negative].sum()
+    lo, hi = min(left, expected_value), max(right, expected_value)
+    pad = (hi - lo) * 0.06 or 0.5
+    lo, hi = lo - pad, hi + pad
+
+    margin = 20
+    plot_width = width - 2 * margin
+    height = 170
+    axis_y, bar_top, bar_height = 52, 60, 26
+    mid = bar_top + bar_height / 2
+
+    def x(v):
+        return margin + (v - lo) / (hi - lo) * plot_width
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" font-size="12">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<text x="{margin}" y="16" fill="{POSITIVE_COLOR}">推高 →</text>',
+        f'<text x="{margin + 60}" y="16" fill="{NEGATIVE_COLOR}">← 拉低</text>',
+        f'<line x1="{margin}" y1="{axis_y}" x2="{width - margin}" y2="{axis_y}" stroke="#888"/>'
+    ]
+    for t in _ticks(lo, hi, n=8):
+        tx = x(t)
+        parts.append(f'<line x1="{tx:.1f}" y1="{axis_y - 4}" x2="{tx:.1f}" y2="{axis_y}" stroke="#888"/>')
+        parts.append(f'<text x="{tx:.1f}" y="{axis_y - 8}" text-anchor="middle" fill="#777">{t:.2f}</text>'.replace('−', '-'))
+
+    def segment(i, start, end, color, pointing_right):
+        x0, x1 = x(start), x(end)
+        a = min(6.0, (x1 - x0) / 2)
+        if pointing_right:
+            points = [(x0, bar_top), (x1, bar_top), (x1 + a, mid), (x1, bar_top + bar_height),
+                      (x0, bar_top + bar_height), (x0 + a, mid)]
+        else:
+            points = [(x0, bar_top), (x1, bar_top), (x1 - a, mid), (x1, bar_top + bar_height),
+                      (x0, bar_top + bar_height), (x0 - a, mid)]
+        label = f"{feature_labels[i]} = {_fmt_data(feature_values[i])}"
+        tip = html.escape(f"{label}（{_fmt(shap_value[i])}）")
+        parts.append(f'<polygon points="{" ".join(f"{px:.1f},{py:.1f}" for px, py in points)}" fill="{color}" '
+                     f'stroke="white" stroke-width="1"><title>{tip}</title></polygon>')
+        if x1 - x0 >= label_min_width:
+            parts.append(f'<text x="{(x0 + x1) / 2:.1f}" y="{bar_top + bar_height + 16}" text-anchor="middle" '
+                         f'fill="#333">{html.escape(label)}</text>')
+
+    cursor = left
+    for i in positive:
+        segment(i, cursor, cursor + shap_value[i], POSITIVE_COLOR, True)
+        cursor += shap_value[i]
+    for i in negative:
+        segment(i, cursor, cursor - shap_value[i], NEGATIVE_COLOR, False)
+        cursor -= shap_value[i]
+
+    # 期望值与模型输出标记
+    bx, fxx = x(expected_value), x(fx)
+    parts.append(f'<line x1="{bx:.1f}" y1="{bar_top - 4}" x2="{bx:.1f}" y2="{bar_top + bar_height + 40}" '
+                 f'stroke="#999" stroke-dasharray="3,3"/>')
+    parts.append(f'<text x="{bx:.1f}" y="{bar_top + bar_height + 52}" text-anchor="middle" fill="#555">'
+                 f'基准值 {expected_value:.3f}</text>'.replace('−', '-'))
+    parts.append(f'<text x="{fxx:.1f}" y="34" text-anchor="middle" font-weight="bold" font-size="14" fill="#333">'
+                 f'f(x) = {fx:.3f}</text>'.replace('−', '-'))
+
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def bar_svg(values, labels, width=720, color=POSITIVE_COLOR, value_format='{:.3f}'):
+    """横向条形图SVG（用于队列报告中的平均贡献、概率分布等汇总）"""
+    values = np.asarray(values, dtype=float)
+    label_width, right_margin = 160, 70
+    top, row_height = 10, 22
+    plot_width = width - label_width - right_margin
+    height = top * 2 + len(values) * row_height
+    vmax = values.max() if len(values) and values.max() > 0 else 1.0
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" font-size="12">'
+    ]
+    for r, (label, value) in enumerate(zip(labels, values)):
+        y = top + r * row_height
+        bar = max(value, 0) / vmax * plot_width
+        parts.append(f'<text x="{label_width - 8}" y="{y + row_height / 2 + 4:.1f}" text-anchor="end" fill="#333">'
+                     f'{html.escape(str(label))}</text>')
+        parts.append(f'<rect x="{label_width}" y="{y + 3}" width="{bar:.1f}" height="{row_height - 6}" fill="{color}"/>')
+        parts.append(f'<text x="{label_width + bar + 4:.1f}" y="{y + row_height / 2 + 4:.1f}" fill="#555">'
+                     f'{value_format.format(value)}</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def _blend(low_color, high_color, t):
+    """按 t（0~1，数组）在两种颜色之间线性插值"""
+    low = np.array([int(low_color[i:i + 2], 16) for i in (1, 3, 5)])
+    high = np.array([int(high_color[i:i + 2], 16) for i in (1, 3, 5)])
+    rgb = (low + (high - low) * np.clip(np.asarray(t, dtype=float), 0, 1)[..., None]).astype(int)
+    return [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in rgb.reshape(-1, 3)]
+
+
+def _value_colors(values):
+    """按取值在样本中的分位把颜色从蓝（低）渐变到红（高），与SHAP官方蜂群图一致"""
+    values = np.asarray(values, dtype=float)
+    rank = np.argsort(np.argsort(values, kind='stable'), kind='stable') / max(len(values) - 1, 1)
+    return _blend(NEGATIVE_COLOR, POSITIVE_COLOR, rank)
+
+
+def beeswarm_svg(shap_values, feature_values, feature_labels, order=None, width=820, row_height=34, bins=120):
+    """SHAP蜂群图SVG：每行一个特征，每点一位患者，横坐标为SHAP值，颜色为特征取值高低
+
+    同一行内落在同一横向分箱的点依次上下错开，点多时按行高截断。
+    """
+    shap_values = np.asarray(shap_values, dtype=float)
+    feature_values = np.asarray(feature_values, dtype=float)
+    n_rows, n_features = shap_values.shape
+    if order is None:
+        order = np.argsort(-np.abs(shap_values).mean(axis=0), kind='stable')
+
+    lo, hi = shap_values.min(), shap_values.max()
+    pad = (hi - lo) * 0.05 or 0.5
+    lo, hi = lo - pad, hi + pad
+
+    label_width, right_margin = 180, 30
+    top, bottom = 16, 50
+    plot_width = width - label_width - right_margin
+    height = top + len(order) * row_height + bottom
+    radius = 2.2
+
+    def x(v):
+        return label_width + (v - lo) / (hi - lo) * plot_width
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" font-size="12">',
+        f'<rect width="{width}" height="{height}" fill="white"/>'
+    ]
+    zero = x(0.0)
+    parts.append(f'<line x1="{zero:.1f}" y1="{top}" x2="{zero:.1f}" y2="{top + len(order) * row_height}" stroke="#ccc"/>')
+
+    for r, j in enumerate(order):
+        center = top + r * row_height + row_height / 2
+        parts.append(f'<text x="{label_width - 8}" y="{center + 4:.1f}" text-anchor="end" fill="#333">'
+                     f'{html.escape(feature_labels[j])}</text>')
+        values = shap_values[:, j]
+        # 每个分箱内的序号：0, 1, 2, ... 交替映射为 0, +1, -1, +2, -2, ...
+        bin_index = np.clip(((values - lo) / (hi - lo) * bins).astype(int), 0, bins - 1)
+        by_bin = np.argsort(bin_index, kind='stable')
+        sorted_bins = bin_index[by_bin]
+        first = np.searchsorted(sorted_bins, sorted_bins)
+        slot = np.empty(n_rows, dtype=int)
+        slot[by_bin] = np.arange(n_rows) - first
+        offset = np.where(slot % 2 == 1, (slot + 1) // 2, -(slot // 2)) * radius * 0.9
+        offset = np.clip(offset, -row_height * 0.42, row_height * 0.42)
+
+        for v, dy, color in zip(values, offset, _value_colors(feature_values[:, j])):
+            parts.append(f'<circle cx="{x(v):.1f}" cy="{center + dy:.1f}" r="{radius}" fill="{color}" fill-opacity="0.8"/>')
+
+    axis_y = top + len(order) * row_height + 6
+    parts.append(f'<line x1="{label_width}" y1="{axis_y}" x2="{width - right_margin}" y2="{axis_y}" stroke="#888"/>')
+    for t in _ticks(lo, hi):
+        tx = x(t)
+        parts.append(f'<line x1="{tx:.1f}" y1="{axis_y}" x2="{tx:.1f}" y2="{axis_y + 5}" stroke="#888"/>')
+        parts.append(f'<text x="{tx:.1f}" y="{axis_y + 18}" text-anchor="middle" fill="#555">{t:.2f}</text>'.replace('−', '-'))
+    parts.append(f'<text x="{label_width + plot_width / 2:.1f}" y="{axis_y + 38}" text-anchor="middle" fill="#333">'
+                 f'SHAP值（对模型输出的影响）　<tspan fill="{NEGATIVE_COLOR}">● 取值低</tspan>　'
+                 f'<tspan fill="{POSITIVE_COLOR}">● 取值高</tspan></text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def dependence_svg(feature_values, shap_values, feature_label, highlight=None, width=640, height=360):
+    """单特征SHAP依赖图SVG：横坐标为特征取值，纵坐标为该特征的SHAP值
+
+    highlight 为 (取值, SHAP值) 时用黑色标出当前患者。
+    """
+    feature_values = np.asarray(feature_values, dtype=float)
+    shap_values = np.asarray(shap_values, dtype=float)
+    xs, ys = feature_values, shap_values
+    if highlight is not None:
+        xs, ys = np.append(xs, highlight[0]), np.append(ys, highlight[1])
+
+    x_lo, x_hi = xs.min(), xs.max()
+    y_lo, y_hi = ys.min(), ys.max()
+    x_pad, y_pad = (x_hi - x_lo) * 0.05 or 0.5, (y_hi - y_lo) * 0.08 or 0.5
+    x_lo, x_hi, y_lo, y_hi = x_lo - x_pad, x_hi + x_pad, y_lo - y_pad, y_hi + y_pad
+
+    left, right, top, bottom = 60, 20, 16, 50
+    plot_width, plot_height = width - left - right, height - top - bottom
+
+    def px(v):
+        return left + (v - x_lo) / (x_hi - x_lo) * plot_width
+
+    def py(v):
+        return top + (y_hi - v) / (y_hi - y_lo) * plot_height
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" font-size="12">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<line x1="{left}" y1="{top + plot_height}" x2="{width - right}" y2="{top + plot_height}" stroke="#888"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_height}" stroke="#888"/>'
+    ]
+    if y_lo < 0 < y_hi:
+        parts.append(f'<line x1="{left}" y1="{py(0):.1f}" x2="{width - right}" y2="{py(0):.1f}" stroke="#ddd"/>')
+    for t in _ticks(x_lo, x_hi):
+        parts.append(f'<text x="{px(t):.1f}" y="{top + plot_height + 18}" text-anchor="middle" fill="#555">'
+                     f'{_fmt_data(t)}</text>')
+    for t in _ticks(y_lo, y_hi, n=5):
+        parts.append(f'<text x="{left - 6}" y="{py(t) + 4:.1f}" text-anchor="end" fill="#555">{t:.2f}</text>'
+                     .replace('−', '-'))
+
+    colors = np.where(shap_values >= 0, POSITIVE_COLOR, NEGATIVE_COLOR)
+    for v, s, color in zip(feature_values, shap_values, colors):
+        parts.append(f'<circle cx="{px(v):.1f}" cy="{py(s):.1f}" r="2.5" fill="{color}" fill-opacity="0.6"/>')
+    if highlight is not None:
+        parts.append(f'<circle cx="{px(highlight[0]):.1f}" cy="{py(highlight[1]):.1f}" r="6" fill="none" '
+                     f'stroke="black" stroke-width="2"><title>当前患者</title></circle>')
+
+    parts.append(f'<text x="{left + plot_width / 2:.1f}" y="{height - 12}" text-anchor="middle" fill="#333">'
+                 f'{html.escape(feature_label)}</text>')
+    parts.append(f'<text x="14" y="{top + plot_height / 2:.1f}" text-anchor="middle" fill="#333" '
+                 f'transform="rotate(-90 14 {top + plot_height / 2:.1f})">SHAP值</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def response_curve_svg(values, probs, feature_label, base_value=None, thresholds=(), width=420, height=260):
+    """假设分析的一维响应曲线SVG：横坐标为特征取值，纵坐标为累积活产概率
+
+    thresholds 为风险分层阈值（画虚线），base_value 为当前取值（画竖线并标出概率）。
+    """
+    values = np.asarray(values, dtype=float)
+    probs = np.asarray(probs, dtype=float)
+    left, right, top, bottom = 46, 14, 24, 44
+    plot_width, plot_height = width - left - right, height - top - bottom
+    x_lo, x_hi = values.min(), values.max()
+    if x_hi == x_lo:
+        x_hi = x_lo + 1.0
+
+    def px(v):
+        return left + (v - x_lo) / (x_hi - x_lo) * plot_width
+
+    def py(p):
+        return top + (1.0 - p) * plot_height
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<line x1="{left}" y1="{top + plot_height}" x2="{width - right}" y2="{top + plot_height}" stroke="#888"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_height}" stroke="#888"/>'
+    ]
+    for p in (0.0, 0.25, 0.5, 0.75, 1.0):
+        parts.append(f'<text x="{left - 5}" y="{py(p) + 4:.1f}" text-anchor="end" fill="#555">{p:.0%}</text>')
+    for t in thresholds:
+        parts.append(f'<line x1="{left}" y1="{py(t):.1f}" x2="{width - right}" y2="{py(t):.1f}" '
+                     f'stroke="#bbb" stroke-dasharray="4,3"/>')
+    for t in _ticks(x_lo, x_hi, n=5):
+        parts.append(f'<text x="{px(t):.1f}" y="{top + plot_height + 16}" text-anchor="middle" fill="#555">'
+                     f'{_fmt_data(t)}</text>')
+
+    points = ' '.join(f'{px(v):.1f},{py(p):.1f}' for v, p in zip(values, probs))
+    parts.append(f'<polyline points="{points}" fill="none" stroke="{NEGATIVE_COLOR}" stroke-width="2"/>')
+
+    if base_value is not None:
+        base_prob = float(np.interp(base_value, values, probs))
+        bx = px(base_value)
+        parts.append(f'<line x1="{bx:.1f}" y1="{top}" x2="{bx:.1f}" y2="{top + plot_height}" stroke="{POSITIVE_COLOR}" '
+                     f'stroke-dasharray="3,3"/>')
+        parts.append(f'<circle cx="{bx:.1f}" cy="{py(base_prob):.1f}" r="4" fill="{POSITIVE_COLOR}"/>')
+        parts.append(f'<text x="{bx:.1f}" y="{top - 8}" text-anchor="middle" fill="{POSITIVE_COLOR}">'
+                     f'当前 {_fmt_data(base_value)}：{base_prob:.1%}</text>')
+
+    parts.append(f'<text x="{left + plot_width / 2:.1f}" y="{height - 8}" text-anchor="middle" fill="#333">'
+                 f'{html.escape(feature_label)}</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def heatmap_svg(values_x, values_y, probs, label_x, label_y, base=None, width=620, height=460):
+    """假设分析的二维响应面SVG：颜色表示累积活产概率，base 为当前 (x, y) 取值"""
+    values_x = np.asarray(values_x, dtype=float)
+    values_y = np.asarray(values_y, dtype=float)
+    probs = np.asarray(probs, dtype=float)
+    left, right, top, bottom = 70, 90, 16, 50
+    plot_width, plot_height = width - left - right, height - top - bottom
+    cell_w, cell_h = plot_width / len(values_x), plot_height / len(values_y)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="white"/>'
+    ]
+    colors = _blend('#f7fbff', '#08306b', probs)
+    for k, color in enumerate(colors):
+        i, j = divmod(k, len(values_x))
+        # y轴自下而上递增
+        parts.append(f'<rect x="{left + j * cell_w:.1f}" y="{top + (len(values_y) - 1 - i) * cell_h:.1f}" '
+                     f'width="{cell_w + 0.5:.1f}" height="{cell_h + 0.5:.1f}" fill="{color}"/>')
+
+    def px(v):
+        return left + (np.searchsorted(values_x, v) + 0.5) * cell_w
+
+    def py(v):
+        return top + (len(values_y) - 0.5 - np.searchsorted(values_y, v)) * cell_h
+
+    for t in _ticks(values_x.min(), values_x.max(), n=5):
+        parts.append(f'<text x="{px(t):.1f}" y="{top + plot_height + 16}" text-anchor="middle" fill="#555">'
+                     f'{_fmt_data(t)}</text>')
+    for t in _ticks(values_y.min(), values_y.max(), n=5):
+        parts.append(f'<text x="{left - 6}" y="{py(t) + 4:.1f}" text-anchor="end" fill="#555">{_fmt_data(t)}</text>')
+    if base is not None:
+        parts.append(f'<circle cx="{px(base[0]):.1f}" cy="{py(base[1]):.1f}" r="6" fill="none" stroke="{POSITIVE_COLOR}" '
+                     f'stroke-width="2"><title>当前患者</title></circle>')
+
+    # 色标
+    legend_x = width - right + 24
+    for k, color in enumerate(_blend('#f7fbff', '#08306b', np.linspace(1, 0, 50))):
+        parts.append(f'<rect x="{legend_x}" y="{top + k * plot_height / 50:.1f}" width="14" '
+                     f'height="{plot_height / 50 + 0.5:.1f}" fill="{color}"/>')
+    for p in (0.0, 0.5, 1.0):
+        parts.append(f'<text x="{legend_x + 18}" y="{top + (1 - p) * plot_height + 4:.1f}" fill="#555">{p:.0%}</text>')
+
+    parts.append(f'<text x="{left + plot_width / 2:.1f}" y="{height - 10}" text-anchor="middle" fill="#333">'
+                 f'{html.escape(label_x)}</text>')
+    parts.append(f'<text x="14" y="{top + plot_height / 2:.1f}" text-anchor="middle" fill="#333" '
+                 f'transform="rotate(-90 14 {top + plot_height / 2:.1f})">{html.escape(label_y)}</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+class ExplanationRenderer:
+    """带LRU缓存的解释图渲染器
+
+    缓存键包含图的全部输入：模型版本、取整后的输入向量和SHAP向量、期望值、特征标签和显示特征数，
+    模型切换或显示参数不同时不会复用旧图。
+    """
+
+    def __init__(self, maxsize=256, decimals=4, shap_decimals=6):
+        self.cache = LRUCache(maxsize)
+        self.decimals = decimals
+        self.shap_decimals = shap_decimals
+
+    def cache_key(self, kind, feature_values, shap_value, expected_value, feature_labels, max_display=None,
+                  model_key=None):
+        rounded = np.round(np.asarray(feature_values, dtype=float), self.decimals)
+        shap_rounded = np.round(np.asarray(shap_value, dtype=float), self.shap_decimals)
+        return (kind, model_key, max_display, round(float(expected_value), 6), tuple(rounded.tolist()),
+                tuple(shap_rounded.tolist()), tuple(feature_labels))
+
+    def waterfall(self, shap_value, expected_value, feature_values, feature_labels, max_display=15, model_key=None):
+        key = self.cache_key('waterfall', feature_values, shap_value, expected_value, feature_labels, max_display,
+                             model_key)
+        return self.cache.get_or_create(
+            key, lambda: waterfall_svg(shap_value, expected_value, feature_values, feature_labels, max_display)
+        )
+
+    def force(self, shap_value, expected_value, feature_values, feature_labels, model_key=None):
+        key = self.cache_key('force', feature_values, shap_value, expected_value, feature_labels,
+                             model_key=model_key)
+        return self.cache.get_or_create(
+            key, lambda: force_plot_svg(shap_value, expected_value, feature_values, feature_labels)
+        )
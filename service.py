@@ -0,0 +1,368 @@
+"""累积活产率JSON预测服务
+
+独立于Streamlit界面的轻量HTTP服务：启动时加载一次模型文件，并发请求在后台线程中
+合并为小批量，由预测器统一完成标准化和推理。
+
+接口：
+    GET  /health    服务状态
+    GET  /metrics   各阶段耗时（Prometheus文本格式）
+    GET  /drift     输入漂移与数据质量报告（指定 --drift-dir 时）
+    POST /predict   {"features": {"age": 30, ...}} 或 {"features": [30, 2.8, ...]}
+                    批量：{"instances": [{...}, [...], ...]}
+
+模型来源：默认加载目录下的pkl文件；--model-dir 加载导出目录；--model 从版本化注册表加载，
+未固定版本时按 --watch-interval 定期检查新版本并原子切换（进行中的批次仍用旧版本完成）。
+默认使用 tree_compiler.py 的编译推理（单行评分不经过Booster的包装开销，注册表版本的节点数组在进程间共享），
+--engine xgboost 改用Booster。
+--drift-dir 开启 drift_monitor.py 的漂移监控，在批处理线程中记录每个批次，不占用请求线程。
+与 web.py 相同，默认加载 calibration.py 生成的校准文件（--calibration 指定其他文件，--no-calibration 关闭），
+存在时返回校准后的概率（另附 raw_birth_prob）和相应的风险分层。
+每次预测写入 audit_log.py 的审计日志（--audit-db 指定数据库，--no-audit 关闭）。
+
+用法：
+    python service.py --port 8000
+    python service.py --model pcos_clbr --watch-interval 30
+    python service.py --engine xgboost
+"""
+import argparse
+import json
+import queue
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from audit_log import AUDIT_DB, AuditLog
+from calibration import add_calibration_arguments, calibrator_from_args, load_calibration
+from drift_monitor import DriftMonitor, version_state_dir
+from inference import load_artifacts, load_exported, out_of_bounds, risk_levels
+from percentiles import load_index
+from registry import DEFAULT_ENGINE, ENGINES, ModelRegistry, ModelVersion
+from tracing import span, tracer
+
+# 单次请求等待结果的超时时间（秒）
+REQUEST_TIMEOUT = 10.0
+
+# 监听队列长度（默认的5在并发客户端较多时会触发SYN重传，尾延迟达到秒级）
+REQUEST_QUEUE_SIZE = 128
+
+
+class PredictionServer(ThreadingHTTPServer):
+    request_queue_size = REQUEST_QUEUE_SIZE
+    daemon_threads = True
+
+
+class MicroBatcher:
+    """把并发到达的预测请求合并成小批量后统一推理"""
+
+    def __init__(self, predictor, max_batch_size=64, max_wait_ms=2.0, monitor=None, model_key=None):
+        # (预测器, 模型版本键) 作为一个整体替换，批次结果总能对应到实际评分的版本
+        self.model = (predictor, model_key)
+        self.monitor = monitor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def tracking(self):
+        """请求处理期间计入在途请求数（含尚在解析、未提交的请求），凑批时据此判断是否值得等待"""
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+
+    def submit(self, X):
+        """提交 n×15 特征矩阵，返回结果Future（(n×2概率矩阵, 评分所用模型版本键)）"""
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def _collect(self):
+        # 阻塞等待第一个请求，再取走已在排队的请求；只有还有其他在途请求（尚未提交）时
+        # 才在max_wait内等待它们，空闲时单个请求立即推理
+        items = [self._queue.get()]
+        n_rows = len(items[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while n_rows < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if self._in_flight <= len(items) or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            items.append(item)
+            n_rows += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            try:
+                X = np.vstack([x for x, _ in items])
+                # 每个批次只读取一次模型引用，热切换时进行中的批次不受影响
+                predictor, model_key = self.model
+                prediction = predictor.predict_proba(X)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(X)
+            offset = 0
+            for x, future in items:
+                future.set_result((prediction[offset:offset + len(x)], model_key))
+                offset += len(x)
+
+            if self.monitor is not None:
+                # 监控失败不能影响批处理线程
+                try:
+                    self.monitor.record(X, prediction[:, 1])
+                except Exception as e:
+                    print(f"漂移监控记录失败: {e}", file=sys.stderr)
+
+
+def parse_instance(instance, feature_columns):
+    """把单个患者（按特征名的字典或按feature_columns顺序的列表）转换为特征向量"""
+    if isinstance(instance, dict):
+        missing = [c for c in feature_columns if c not in instance]
+        if missing:
+            raise ValueError(f"缺少特征: {', '.join(missing)}")
+        values = [instance[c] for c in feature_columns]
+    elif isinstance(instance, list):
+        if len(instance) != len(feature_columns):
+            raise ValueError(f"特征数量应为 {len(feature_columns)}，实际为 {len(instance)}")
+        values = instance
+    else:
+        raise ValueError("特征必须是对象或数组")
+    return [float(v) for v in values]
+
+
+def validate_ranges(X, feature_columns):
+    """与批量上传相同的范围校验：缺失值、无穷大或超出输入框范围时抛出ValueError"""
+    invalid = out_of_bounds(X, feature_columns)
+    if invalid.any():
+        rows, cols = np.nonzero(invalid)
+        details = [f"第{r}个患者 {feature_columns[c]}={X[r, c]:g}" for r, c in zip(rows[:10], cols[:10])]
+        more = f" 等{len(rows)}处" if len(rows) > 10 else ""
+        raise ValueError(f"特征取值缺失或超出允许范围: {'; '.join(details)}{more}")
+
+
+def format_results(prediction, calibrator=None):
+    if calibrator is None or calibrator.is_identity:
+        levels = risk_levels(prediction[:, 1])
+        return [
+            {'no_birth_prob': float(p[0]), 'birth_prob': float(p[1]), 'risk_level': str(level)}
+            for p, level in zip(prediction, levels)
+        ]
+    birth_probs = calibrator.calibrate(prediction[:, 1])
+    levels = risk_levels(birth_probs, calibrator.thresholds)
+    return [
+        {'no_birth_prob': 1.0 - float(p), 'birth_prob': float(p), 'raw_birth_prob': float(raw),
+         'risk_level': str(level)}
+        for p, raw, level in zip(birth_probs, prediction[:, 1], levels)
+    ]
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    # 由 make_server 注入
+    batcher = None
+    feature_columns = None
+    model_info = None
+    calibrator = None
+    audit_log = None
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # 关闭逐请求访问日志，避免占用请求线程
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = tracer.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/drift':
+            monitor = self.batcher.monitor
+            if monitor is None:
+                self._send_json(404, {'error': '未开启漂移监控（--drift-dir）'})
+            else:
+                # NaN（尚无数据或没有基线）输出为null
+                report = [{k: (None if isinstance(v, float) and v != v else v) for k, v in row.items()}
+                          for row in monitor.report()]
+                self._send_json(200, {'total': report})
+        elif self.path == '/health':
+            self._send_json(200, {
+                'status': 'ok',
+                'model': self.model_info,
+                'batches': self.batcher.batches,
+                'rows': self.batcher.rows
+            })
+        else:
+            self._send_json(404, {'error': '未找到该接口'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': '未找到该接口'})
+            return
+        with self.batcher.tracking():
+            self._predict()
+
+    def _predict(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if 'instances' in payload:
+                instances = payload['instances']
+                single = False
+            elif 'features' in payload:
+                instances = [payload['features']]
+                single = True
+            else:
+                raise ValueError("请求体需要包含 features 或 instances")
+            if not isinstance(instances, list) or not instances:
+                raise ValueError("instances 必须是非空数组")
+            X = np.array([parse_instance(i, self.feature_columns) for i in instances], dtype=np.float64)
+            validate_ranges(X, self.feature_columns)
+        except (ValueError, TypeError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            with span('request'):
+                prediction, model_key = self.batcher.submit(X).result(timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            self._send_json(500, {'error': f"预测失败: {e}"})
+            return
+
+        results = format_results(prediction, self.calibrator)
+        if self.audit_log is not None:
+            self.audit_log.log_many(model_key, X, [r['birth_prob'] for r in results],
+                                    [r['risk_level'] for r in results], 'service', prediction[:, 1])
+        self._send_json(200, results[0] if single else {'predictions': results})
+
+
+def start_monitor(drift_dir, model_version):
+    """模型版本的漂移监控（状态保存在该版本单独的目录中）"""
+    return DriftMonitor.from_artifacts(model_version.scaler, model_version.feature_columns, load_index(),
+                                       state_dir=version_state_dir(drift_dir, model_version.key)).start()
+
+
+def watch_registry(registry, name, handler, interval):
+    """定期检查注册表中的新版本，切换后更新批处理器的预测器和漂移监控并释放旧版本"""
+    while True:
+        time.sleep(interval)
+        try:
+            previous = registry.active(name)
+            if registry.refresh(name):
+                current = registry.active(name)
+                handler.batcher.model = (current.predictor, current.key)
+                handler.model_info = current.info()
+                registry.unload(name, previous.version)
+                old_monitor = handler.batcher.monitor
+                if old_monitor is not None:
+                    handler.batcher.monitor = start_monitor(handler.drift_dir, current)
+                    old_monitor.stop()
+                print(f"模型已切换：{previous.key} → {current.key}", file=sys.stderr)
+        except Exception as e:
+            # 新版本不完整或校验失败时继续使用当前版本
+            print(f"检查模型新版本失败: {e}", file=sys.stderr)
+
+
+def make_server(host='127.0.0.1', port=8000, max_batch_size=64, max_wait_ms=2.0, model_dir=None,
+                model_name=None, model_version=None, watch_interval=None, engine=DEFAULT_ENGINE,
+                drift_dir=None, calibrator=None, audit_db=None):
+    """加载模型并创建HTTP服务（调用方负责 serve_forever）；calibrator 为None时加载默认校准文件"""
+    registry = None
+    if model_name:
+        registry = ModelRegistry(engine=engine)
+        current = registry.activate(model_name, model_version)
+    elif model_dir:
+        current = ModelVersion.from_artifacts(*load_exported(model_dir, mmap_mode='r'), version='exported',
+                                           engine=engine)
+    else:
+        current = ModelVersion.from_artifacts(*load_artifacts(), engine=engine)
+
+    monitor = start_monitor(drift_dir, current) if drift_dir else None
+
+    handler = type('Handler', (PredictionHandler,), {
+        'batcher': MicroBatcher(current.predictor, max_batch_size, max_wait_ms, monitor, current.key),
+        'feature_columns': current.feature_columns,
+        'model_info': current.info(),
+        'drift_dir': drift_dir,
+        'audit_log': AuditLog(audit_db) if audit_db else None,
+        'calibrator': load_calibration() if calibrator is None else calibrator
+    })
+    if registry is not None and model_version is None and watch_interval:
+        threading.Thread(target=watch_registry, args=(registry, model_name, handler, watch_interval),
+                         name='registry-watch', daemon=True).start()
+
+    server = PredictionServer((host, port), handler)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="累积活产率JSON预测服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=64, help="单个批次的最大行数")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="凑批的最长等待时间（毫秒）")
+    parser.add_argument('--model-dir', help="使用 export_model.py 导出的模型目录（不加载pickle）")
+    parser.add_argument('--model', help="从模型注册表加载，格式为 名称 或 名称:版本")
+    parser.add_argument('--watch-interval', type=float, default=30.0,
+                        help="未固定版本时检查注册表新版本的间隔（秒），0为不检查")
+    parser.add_argument('--engine', choices=list(ENGINES), default=DEFAULT_ENGINE,
+                        help="推理引擎：compiled（默认，编译为NumPy节点数组）或 xgboost")
+    parser.add_argument('--drift-dir', help="漂移监控状态根目录（每个模型版本一个子目录；不指定则不监控）")
+    add_calibration_arguments(parser)
+    parser.add_argument('--audit-db', default=AUDIT_DB, help="预测审计日志数据库")
+    parser.add_argument('--no-audit', action='store_true', help="不写审计日志")
+    args = parser.parse_args(argv)
+
+    model_name, _, model_version = (args.model or '').partition(':')
+    server = make_server(args.host, args.port, args.max_batch_size, args.max_wait_ms, args.model_dir,
+                         model_name or None, model_version or None, args.watch_interval, args.engine,
+                         args.drift_dir, calibrator_from_args(parser, args), None if args.no_audit else args.audit_db)
+    # SIGTERM（容器/进程管理器停止服务）按正常退出处理，以便执行退出时的快照等清理
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"预测服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""测试共用的模型工件和样例患者（模块位于仓库根目录）"""
+import os
+import sys
+import warnings
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import FEATURE_INPUTS, load_artifacts  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def artifacts():
+    """(模型, 标准化器, 特征列)"""
+    with warnings.catch_warnings():
+        # 随仓库提交的pickle由旧版本xgboost/scikit-learn生成
+        warnings.simplefilter('ignore')
+        return load_artifacts()
+
+
+@pytest.fixture(scope='session')
+def patients(artifacts):
+    """在各特征输入范围内均匀抽样的200个患者（原始特征值）"""
+    feature_columns = artifacts[2]
+    rng = np.random.default_rng(0)
+    lower = np.array([FEATURE_INPUTS[c]['min_value'] for c in feature_columns], dtype=np.float64)
+    upper = np.array([FEATURE_INPUTS[c]['max_value'] for c in feature_columns], dtype=np.float64)
+    return lower + rng.random((200, len(feature_columns))) * (upper - lower)
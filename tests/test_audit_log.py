@@ -0,0 +1,67 @@
+import json
+import time
+
+import numpy as np
+
+import audit_log
+from audit_log import AuditLog, query
+from inference import FEATURE_NAMES
+
+
+def spill_line(model='m:1'):
+    record = [time.time(), model, np.zeros(len(FEATURE_NAMES)).tobytes().hex(), 0.5, '中等概率',
+              None, None, 'service', 0.5]
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def test_logged_predictions_round_trip(tmp_path):
+    path = str(tmp_path / 'audit.sqlite3')
+    log = AuditLog(path, flush_interval=0.05)
+    features = np.arange(len(FEATURE_NAMES), dtype=np.float64)
+    log.log('pcos:1.0', features, 0.8, '高概率', shap_value=np.ones(len(FEATURE_NAMES)), expected_value=0.1,
+            raw_prob=0.75)
+    log.log_many('pcos:1.0', np.vstack([features, features]), [0.2, 0.4], ['低概率', '中等概率'], 'bulk')
+    log.close()
+
+    frame = query(path=path)
+    assert log.stats()['written'] == 3 and log.stats()['queued'] == 0
+    assert frame['birth_prob'].tolist() == [0.8, 0.2, 0.4]
+    assert frame['raw_prob'].tolist() == [0.75, 0.2, 0.4]
+    np.testing.assert_array_equal(frame[FEATURE_NAMES].to_numpy()[0], features)
+    assert frame['shap_age'].isna().tolist() == [False, True, True]
+
+
+def test_full_queue_spills_instead_of_blocking(tmp_path, monkeypatch):
+    path = str(tmp_path / 'audit.sqlite3')
+    log = AuditLog(path, max_queue=1, batch_size=1, put_timeout=0.05)
+    # 写入线程卡住：第一批被取走后队列很快占满
+    monkeypatch.setattr(log, '_write', lambda conn, batch: time.sleep(1.0))
+    started = time.perf_counter()
+    for _ in range(4):
+        log.log_many('m:1', np.zeros((3, len(FEATURE_NAMES))), [0.5] * 3, ['中等概率'] * 3, 'service')
+
+    assert time.perf_counter() - started < 1.0
+    assert log.stats()['overflowed'] > 0
+    with open(log.spill_path, encoding='utf-8') as f:
+        assert sum(1 for _ in f) == log.stats()['overflowed']
+
+
+def test_recovery_skips_spill_files_of_live_processes(tmp_path):
+    path = str(tmp_path / 'audit.sqlite3')
+    live_spill, dead_spill = f'{path}.spill-999998.jsonl', f'{path}.spill-999999.jsonl'
+    for spill in (live_spill, dead_spill):
+        with open(spill, 'w', encoding='utf-8') as f:
+            f.write(spill_line())
+    # 模拟仍在运行的进程：持有其锁文件的锁
+    owner = open(f'{path}.spill-999998.lock', 'a+b')
+    assert audit_log._try_lock(owner)
+    try:
+        log = AuditLog(path)
+        log.close()
+    finally:
+        owner.close()
+
+    assert log.stats()['recovered'] == 1
+    assert len(query(path=path)) == 1
+    with open(live_spill, encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
@@ -0,0 +1,34 @@
+import sys
+
+import pandas as pd
+import pytest
+
+import batch_predict
+
+
+@pytest.fixture
+def patients_csv(artifacts, patients, tmp_path):
+    frame = pd.DataFrame(patients[:30], columns=artifacts[2])
+    frame.insert(0, 'patient_id', [f'{i:04d}' for i in range(len(frame))])
+    path = tmp_path / 'patients.csv'
+    frame.to_csv(path, index=False)
+    return path
+
+
+def test_scores_keep_columns_verbatim(patients_csv, tmp_path):
+    output = tmp_path / 'scores.csv'
+    batch_predict.main([str(patients_csv), '-o', str(output), '--keep', 'patient_id', '--chunk-size', '7',
+                        '--no-calibration'])
+
+    scores = pd.read_csv(output, dtype={'patient_id': str})
+    assert scores['patient_id'].tolist() == [f'{i:04d}' for i in range(30)]
+    assert scores['birth_prob'].between(0, 1).all() and 'raw_birth_prob' not in scores
+
+
+def test_parquet_without_pyarrow_is_a_usage_error(patients_csv, tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(SystemExit) as exc:
+        batch_predict.main([str(patients_csv), '-o', str(tmp_path / 'scores.parquet'), '--no-calibration'])
+
+    assert exc.value.code == 2
+    assert 'pip install pyarrow' in capsys.readouterr().err
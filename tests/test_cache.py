@@ -0,0 +1,43 @@
+from cache import LRUCache, PredictionCache
+from inference import FEATURE_INPUTS, FEATURE_NAMES
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_get_or_create_calls_factory_once():
+    cache = LRUCache()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return 'value'
+
+    assert cache.get_or_create('k', factory) == 'value'
+    assert cache.get_or_create('k', factory) == 'value'
+    assert len(calls) == 1
+
+
+def test_prediction_key_quantizes_to_input_grid():
+    cache = PredictionCache.from_inputs(FEATURE_INPUTS, FEATURE_NAMES)
+    base = [FEATURE_INPUTS[f]['value'] for f in FEATURE_NAMES]
+    drifted = list(base)
+    # 步长0.1累加产生的浮点误差不影响缓存键
+    drifted[FEATURE_NAMES.index('LDL')] = 0.1 * 28
+    assert cache.key(base) == cache.key(drifted)
+
+    # 网格外的手动输入按原值记录，不与相邻网格点共用结果
+    off_grid = list(base)
+    off_grid[FEATURE_NAMES.index('LDL')] = 2.85
+    assert cache.key(off_grid) != cache.key(base)
+    assert ('raw', 2.85) in cache.key(off_grid)
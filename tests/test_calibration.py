@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calibration
+from calibration import Calibrator, calibration_metrics, choose_thresholds, threshold_sweep
+
+
+@pytest.fixture
+def miscalibrated():
+    """模型输出偏低：实际发生率为 sqrt(输出概率)"""
+    rng = np.random.default_rng(0)
+    probs = rng.random(20000)
+    labels = (rng.random(len(probs)) < np.sqrt(probs)).astype(np.int64)
+    return probs, labels
+
+
+def test_sweep_matches_direct_counts():
+    rng = np.random.default_rng(1)
+    probs, labels = rng.random(500), rng.integers(0, 2, 500)
+    sweep = threshold_sweep(probs, labels, thresholds=[0.2, 0.5, 0.8])
+
+    for threshold, row in zip([0.2, 0.5, 0.8], sweep.itertuples()):
+        predicted = probs >= threshold
+        assert row.ppv == pytest.approx(labels[predicted].mean())
+        assert row.npv == pytest.approx(1 - labels[~predicted].mean())
+        assert row.sensitivity == pytest.approx(predicted[labels == 1].mean())
+
+
+@pytest.mark.parametrize('method', calibration.METHODS)
+def test_calibration_reduces_error(miscalibrated, method):
+    probs, labels = miscalibrated
+    calibrator = Calibrator.fit(probs[:10000], labels[:10000], method)
+    calibrated = calibrator.calibrate(probs[10000:])
+
+    assert np.all(np.diff(calibrator.calibrate(np.linspace(0, 1, 101))) >= 0)
+    before = calibration_metrics(probs[10000:], labels[10000:])
+    after = calibration_metrics(calibrated, labels[10000:])
+    assert after['ece'] < before['ece'] / 2
+
+
+def test_save_load_round_trip(miscalibrated, tmp_path):
+    probs, labels = miscalibrated
+    calibrator = Calibrator.fit(probs, labels, thresholds=(0.25, 0.75))
+    calibrator.save(tmp_path / 'calibration.npz')
+    loaded = Calibrator.load(tmp_path / 'calibration.npz')
+
+    assert loaded.fingerprint == calibrator.fingerprint and loaded.thresholds == (0.25, 0.75)
+    np.testing.assert_array_equal(loaded.calibrate(probs[:100]), calibrator.calibrate(probs[:100]))
+
+
+def test_choose_thresholds_meets_targets(miscalibrated):
+    probs, labels = miscalibrated
+    sweep = threshold_sweep(probs, labels)
+    low, high = choose_thresholds(sweep, high_ppv=0.9, low_npv=0.6)
+
+    assert labels[probs >= high].mean() >= 0.9
+    assert 1 - labels[probs < low].mean() >= 0.6
+    assert choose_thresholds(sweep, high_ppv=1.1) == (None, None)
+
+
+def test_thresholds_chosen_on_held_out_split(artifacts, patients, tmp_path, monkeypatch):
+    feature_columns = artifacts[2]
+    frame = pd.DataFrame(patients, columns=feature_columns)
+    frame['live_birth'] = np.random.default_rng(2).integers(0, 2, len(frame))
+    frame.to_csv(tmp_path / 'labelled.csv', index=False)
+
+    swept = []
+
+    def recording_sweep(probs, labels, *args, **kwargs):
+        swept.append(len(probs))
+        return threshold_sweep(probs, labels, *args, **kwargs)
+
+    monkeypatch.setattr(calibration, 'threshold_sweep', recording_sweep)
+    calibration.main([str(tmp_path / 'labelled.csv'), '--label', 'live_birth', '--test-size', '0.3',
+                      '-o', str(tmp_path / 'calibration.npz')])
+
+    held_out = int((np.random.default_rng(0).random(len(frame)) < 0.3).sum())
+    assert swept == [held_out]
+    assert Calibrator.load(tmp_path / 'calibration.npz').n_samples == len(frame) - held_out
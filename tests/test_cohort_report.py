@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cohort_report
+
+
+@pytest.fixture
+def cohort_csv(artifacts, patients, tmp_path):
+    frame = pd.DataFrame(patients[:120], columns=artifacts[2])
+    frame.insert(0, 'patient_id', [f'{i:05d}' for i in range(len(frame))])
+    path = tmp_path / 'patients.csv'
+    frame.to_csv(path, index=False)
+    return path
+
+
+def run(cohort_csv, report_dir, *extra):
+    cohort_report.main([str(cohort_csv), '-o', str(report_dir), '--chunk-size', '50', '--keep', 'patient_id',
+                        '--no-calibration', *extra])
+
+
+def test_report_keeps_ids_and_removes_parts(cohort_csv, tmp_path):
+    report_dir = tmp_path / 'report'
+    run(cohort_csv, report_dir)
+
+    scores = pd.read_csv(report_dir / 'scores.csv', dtype={'patient_id': str})
+    assert scores['patient_id'].tolist() == [f'{i:05d}' for i in range(120)]
+    assert scores['birth_prob'].between(0, 1).all()
+    manifest = json.loads((report_dir / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest['complete'] and manifest['stats']['rows'] == 120 and manifest['completed_chunks'] == 3
+    assert not (report_dir / 'parts').exists() and (report_dir / 'report.html').exists()
+
+
+def test_resume_after_interrupted_merge(cohort_csv, tmp_path, monkeypatch):
+    report_dir = tmp_path / 'report'
+    merge_parts = cohort_report.merge_parts
+
+    def interrupted(*args, **kwargs):
+        merge_parts(*args, **kwargs)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(cohort_report, 'merge_parts', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run(cohort_csv, report_dir)
+    monkeypatch.undo()
+
+    run(cohort_csv, report_dir)
+    assert len(pd.read_csv(report_dir / 'scores.csv')) == 120
+
+
+def test_resume_after_interrupted_cleanup(cohort_csv, tmp_path, monkeypatch):
+    report_dir = tmp_path / 'report'
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(cohort_report.shutil, 'rmtree', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run(cohort_csv, report_dir)
+    monkeypatch.undo()
+    assert json.loads((report_dir / 'manifest.json').read_text(encoding='utf-8'))['complete']
+
+    run(cohort_csv, report_dir)
+    assert not (report_dir / 'parts').exists()
+    assert len(pd.read_csv(report_dir / 'scores.csv')) == 120
+
+
+def test_mismatched_arguments_refuse_to_resume(cohort_csv, tmp_path):
+    report_dir = tmp_path / 'report'
+    run(cohort_csv, report_dir)
+    with pytest.raises(SystemExit):
+        run(cohort_csv, report_dir, '--top-k', '5')
+
+
+def test_top_contributors_sorted_by_magnitude():
+    attributions = np.array([[0.1, -0.5, 0.3], [0.0, 0.2, -0.1]])
+    columns = cohort_report.top_contributors(attributions, ['a', 'b', 'c'], 2)
+
+    assert columns['top1_feature'].tolist() == ['b', 'b'] and columns['top2_feature'].tolist() == ['c', 'c']
+    np.testing.assert_array_equal(columns['top1_impact'], [-0.5, 0.2])
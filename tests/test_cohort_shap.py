@@ -0,0 +1,20 @@
+import numpy as np
+
+from cohort_shap import CohortExplanations
+
+
+def test_fingerprint_changes_when_rows_are_added(tmp_path):
+    cohort = CohortExplanations.create(str(tmp_path), ['a', 'b'], 0.5)
+    empty = cohort.fingerprint
+
+    cohort.add(np.array([1.0, 2.0]), np.array([0.1, -0.2]), 0.3)
+    one = cohort.fingerprint
+    assert one != empty
+
+    # 另一个进程的实例 refresh 后看到相同的摘要
+    assert CohortExplanations(str(tmp_path)).fingerprint == one
+
+    # 行数不变但内容不同的参考人群，摘要也不同
+    other = CohortExplanations.create(str(tmp_path / 'other'), ['a', 'b'], 0.5)
+    other.add(np.array([3.0, 4.0]), np.array([0.5, 0.5]), 0.9)
+    assert other.n_rows == cohort.n_rows and other.fingerprint != one
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from drift_monitor import N_BINS, OUTPUT_COLUMN, DriftBaseline, DriftMonitor
+from inference import FEATURE_INPUTS, FEATURE_NAMES
+from percentiles import PercentileIndex
+
+
+def sample(rng, n):
+    """离散（整数步长）和连续特征混合的模拟患者及其预测概率"""
+    columns = []
+    for name in FEATURE_NAMES:
+        spec = FEATURE_INPUTS[name]
+        low, high, step = spec['min_value'], spec['max_value'], spec['step']
+        values = low + rng.beta(2.0, 5.0, n) * (high - low)
+        columns.append(low + np.round((values - low) / step) * step)
+    X = np.column_stack(columns)
+    # 移植周期数：少数几个取值、严重偏斜
+    X[:, FEATURE_NAMES.index('Cycles')] = np.minimum(rng.geometric(0.6, n), 10)
+    return X, rng.beta(5.0, 2.0, n)
+
+
+@pytest.fixture
+def reference(tmp_path):
+    X, probs = sample(np.random.default_rng(0), 50000)
+    index = PercentileIndex.build(FEATURE_NAMES + [OUTPUT_COLUMN], np.column_stack([X, probs]))
+    # 与线上一致：索引从文件加载（分位点以float32保存）
+    index.save(tmp_path / 'percentiles.npz')
+    scaler = SimpleNamespace(mean_=X.mean(axis=0), scale_=X.std(axis=0))
+    return scaler, PercentileIndex.load(tmp_path / 'percentiles.npz')
+
+
+def monitor_psi(baseline, X, probs, tmp_path):
+    monitor = DriftMonitor(baseline, state_dir=str(tmp_path / 'drift'))
+    monitor.record(X, probs)
+    return {row['column']: row['psi'] for row in monitor.report()}
+
+
+def test_undrifted_traffic_is_stable(reference, tmp_path):
+    scaler, index = reference
+    baseline = DriftBaseline.from_scaler(scaler, FEATURE_NAMES, index)
+    X, probs = sample(np.random.default_rng(1), 20000)
+
+    psi = monitor_psi(baseline, X, probs, tmp_path)
+    assert max(psi.values()) < 0.02, psi
+
+
+def test_shifted_feature_is_flagged(reference, tmp_path):
+    scaler, index = reference
+    baseline = DriftBaseline.from_scaler(scaler, FEATURE_NAMES, index)
+    X, probs = sample(np.random.default_rng(1), 20000)
+    X[:, FEATURE_NAMES.index('age')] += 5
+
+    psi = monitor_psi(baseline, X, probs, tmp_path)
+    assert psi['age'] > 0.25
+    assert psi['AMH'] < 0.02
+
+
+def test_normal_fallback_keeps_discrete_values_off_edges(reference):
+    scaler, _ = reference
+    baseline = DriftBaseline.from_scaler(scaler, FEATURE_NAMES)
+    cycles = baseline.edges[FEATURE_NAMES.index('Cycles')]
+
+    np.testing.assert_allclose(cycles % 1.0, 0.5)
+    np.testing.assert_allclose(baseline.expected[:-1].sum(axis=1), 1.0)
+    assert np.isnan(baseline.expected[-1]).all() and baseline.expected.shape[1] == N_BINS
+
+
+def test_state_survives_restart(reference, tmp_path):
+    scaler, index = reference
+    baseline = DriftBaseline.from_scaler(scaler, FEATURE_NAMES, index)
+    X, probs = sample(np.random.default_rng(2), 500)
+    monitor = DriftMonitor(baseline, state_dir=str(tmp_path))
+    monitor.record(X, probs)
+    monitor.snapshot()
+
+    restored = DriftMonitor(baseline, state_dir=str(tmp_path))
+    assert restored.report() == monitor.report()
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from explain import NativeExplainer, batch_shap_values, build_explainer, check_additivity, positive_class_shap
+
+
+def test_native_matches_shap_tree_explainer(artifacts, patients):
+    pytest.importorskip('shap')
+    model, scaler, _ = artifacts
+    X_scaled = scaler.transform(patients)
+
+    native = NativeExplainer(model)
+    reference = build_explainer(model, backend='shap')
+    expected, expected_value = positive_class_shap(reference.shap_values(X_scaled), reference.expected_value)
+
+    np.testing.assert_allclose(native.shap_values(X_scaled), expected, atol=1e-4)
+    assert native.expected_value == pytest.approx(expected_value, abs=1e-4)
+
+
+def test_additivity_holds_on_scaled_input(artifacts, patients):
+    model, scaler, _ = artifacts
+    attributions, expected_value = batch_shap_values(model, patients, scaler=scaler)
+    probs = model.predict_proba(scaler.transform(patients))[:, 1]
+
+    assert check_additivity(attributions, expected_value, probs) <= 1e-5
+
+
+def test_additivity_rejects_raw_input(artifacts, patients):
+    model, scaler, _ = artifacts
+    # 解释原始特征值（旧实现的错误）：归因不再对应模型实际评分的输入
+    attributions, expected_value = batch_shap_values(model, patients)
+    probs = model.predict_proba(scaler.transform(patients))[:, 1]
+
+    with pytest.raises(ValueError, match="SHAP值与预测概率不一致"):
+        check_additivity(attributions, expected_value, probs)
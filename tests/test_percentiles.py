@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from percentiles import PercentileIndex
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(0)
+    data = np.column_stack([rng.normal(50.0, 10.0, 20000), rng.integers(1, 5, 20000)])
+    return PercentileIndex.build(['continuous', 'discrete'], data), data
+
+
+def test_percentiles_match_empirical_ranks(index):
+    index, data = index
+    values = np.array([35.0, 50.0, 62.0])
+    expected = [100.0 * np.mean(data[:, 0] < v) for v in values]
+    got = [index.percentile('continuous', v) for v in values]
+    np.testing.assert_allclose(got, expected, atol=0.2)
+
+
+def test_ties_take_middle_percentile(index):
+    index, data = index
+    # 取值为1的约占25%，其百分位应位于这一段的中间
+    share = 100.0 * np.mean(data[:, 1] == 1)
+    assert index.percentile('discrete', 1) == pytest.approx(share / 2, abs=0.2)
+
+
+def test_out_of_range_values_clip(index):
+    index, _ = index
+    np.testing.assert_array_equal(index.percentiles([-1e9, 1e9], ['continuous', 'discrete']), [0.0, 100.0])
+
+
+def test_save_load_round_trip(index, tmp_path):
+    index, _ = index
+    path = tmp_path / 'percentiles.npz'
+    index.save(path)
+    loaded = PercentileIndex.load(path)
+
+    assert loaded.columns == index.columns and loaded.n_rows == index.n_rows
+    np.testing.assert_allclose(loaded.percentiles([48.0, 3]), index.percentiles([48.0, 3]), atol=0.1)
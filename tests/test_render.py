@@ -0,0 +1,26 @@
+import numpy as np
+
+from render import ExplanationRenderer
+
+LABELS = ['a', 'b', 'c']
+
+
+def test_cache_key_covers_every_render_input():
+    renderer = ExplanationRenderer()
+    x, shap_value = np.array([1.0, 2.0, 3.0]), np.array([0.5, -0.2, 0.1])
+    base = renderer.cache_key('waterfall', x, shap_value, 0.3, LABELS, 15, 'pcos:1.0')
+
+    assert renderer.cache_key('waterfall', x + 1e-9, shap_value, 0.3, LABELS, 15, 'pcos:1.0') == base
+    assert renderer.cache_key('waterfall', x, shap_value * 2, 0.3, LABELS, 15, 'pcos:1.0') != base
+    assert renderer.cache_key('waterfall', x, shap_value, 0.3, LABELS, 5, 'pcos:1.0') != base
+    assert renderer.cache_key('waterfall', x, shap_value, 0.3, LABELS, 15, 'pcos:2.0') != base
+
+
+def test_renders_for_another_model_are_not_reused():
+    renderer = ExplanationRenderer()
+    x = np.array([1.0, 2.0, 3.0])
+    first = renderer.waterfall(np.array([0.5, -0.2, 0.1]), 0.3, x, LABELS, model_key='pcos:1.0')
+    second = renderer.waterfall(np.array([-0.4, 0.3, 0.2]), 0.3, x, LABELS, model_key='pcos:2.0')
+
+    assert first != second and len(renderer.cache) == 2
+    assert renderer.waterfall(np.array([0.5, -0.2, 0.1]), 0.3, x, LABELS, model_key='pcos:1.0') is first
@@ -0,0 +1,36 @@
+import numpy as np
+
+from inference import FusedPredictor
+from tree_compiler import CompiledPredictor, CompiledTrees
+
+
+def test_compiled_matches_booster(artifacts, patients):
+    model, scaler, _ = artifacts
+    expected = FusedPredictor.from_artifacts(model, scaler).predict(patients)
+    compiled = CompiledPredictor.from_artifacts(model, scaler)
+
+    np.testing.assert_allclose(compiled.predict(patients), expected, atol=1e-6)
+    np.testing.assert_allclose(compiled.predict(patients[0]), expected[:1], atol=1e-6)
+
+
+def test_missing_and_infinite_inputs_match_booster(artifacts, patients):
+    model, scaler, _ = artifacts
+    X = patients[:20].copy()
+    X[::3, 4] = np.nan
+    X[1::3, 6] = np.inf
+    X[2::3, 0] = -np.inf
+    expected = FusedPredictor.from_artifacts(model, scaler).predict(X)
+
+    np.testing.assert_allclose(CompiledPredictor.from_artifacts(model, scaler).predict(X), expected, atol=1e-6)
+
+
+def test_saved_arrays_load_as_read_only_mmap(artifacts, patients, tmp_path):
+    model, scaler, _ = artifacts
+    compiled = CompiledPredictor.from_artifacts(model, scaler)
+    compiled.trees.save(tmp_path / 'compiled')
+
+    loaded = CompiledTrees.load(tmp_path / 'compiled')
+    # 只读映射的视图；若在加载时被复制则会是可写数组
+    assert not any(getattr(loaded, name).flags.writeable for name in ('feature', 'threshold', 'child', 'value'))
+    shared = CompiledPredictor.from_version_dir(model, scaler, tmp_path)
+    np.testing.assert_array_equal(shared.predict(patients), compiled.predict(patients))
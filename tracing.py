@@ -0,0 +1,103 @@
+"""热路径耗时统计
+
+用 span(stage) 包裹各阶段（模型加载、标准化、预测、SHAP计算、图表渲染等），
+在进程内保留每个阶段最近的耗时样本并计算 p50/p95/p99，
+可导出为Prometheus文本格式；设置环境变量 TRACE_LOG 后每次耗时还会追加写入JSON Lines日志。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# 每个阶段保留的最近样本数
+DEFAULT_WINDOW = 2048
+
+METRIC_NAME = 'clbr_stage_latency_seconds'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class StageStats:
+    """单个阶段的耗时样本（最近window个）与累计次数、总耗时"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+
+class Tracer:
+    def __init__(self, window=DEFAULT_WINDOW, log_path=None):
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._log = open(log_path, 'a', buffering=1, encoding='utf-8') if log_path else None
+
+    def record(self, stage, seconds):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(self.window)
+            stats.add(seconds)
+            if self._log is not None:
+                self._log.write(json.dumps({'ts': time.time(), 'stage': stage, 'ms': seconds * 1000.0}) + '\n')
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self):
+        """各阶段的次数、均值和分位数（毫秒）"""
+        with self._lock:
+            snapshot = {name: (list(s.samples), s.count, s.total) for name, s in self._stages.items()}
+
+        result = {}
+        for name, (samples, count, total) in snapshot.items():
+            ms = np.asarray(samples) * 1000.0
+            p50, p95, p99 = np.percentile(ms, [q * 100 for q in QUANTILES])
+            result[name] = {
+                'count': count,
+                'mean_ms': total / count * 1000.0,
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99
+            }
+        return result
+
+    def to_prometheus(self):
+        """Prometheus文本格式（summary类型，分位数基于最近样本）"""
+        with self._lock:
+            snapshot = {name: (list(s.samples), s.count, s.total) for name, s in self._stages.items()}
+
+        lines = [
+            f'# HELP {METRIC_NAME} Latency of prediction and explanation stages.',
+            f'# TYPE {METRIC_NAME} summary'
+        ]
+        for name, (samples, count, total) in sorted(snapshot.items()):
+            values = np.percentile(samples, [q * 100 for q in QUANTILES])
+            for q, v in zip(QUANTILES, values):
+                lines.append(f'{METRIC_NAME}{{stage="{name}",quantile="{q}"}} {v:.9f}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {total:.9f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+# 进程内共享的统计实例
+tracer = Tracer(log_path=os.environ.get('TRACE_LOG'))
+span = tracer.span
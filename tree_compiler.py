@@ -0,0 +1,215 @@
+"""树集成编译推理
+
+把XGBoost Booster的全部树展开为平铺的NumPy节点数组（特征、阈值、子节点、缺失值方向、叶子值），
+推理时对所有树（和所有行）同时做逐层遍历，每层只有几次向量化的数组索引，
+绕开DMatrix构造、参数校验等Python包装开销。适用于服务中的单行和小批量评分；
+上千行的大批量仍是 Booster 的C++实现更快（见 benchmarks/bench_compiled.py）。
+
+与 Booster 的计算口径一致：输入先转为float32，x < 阈值走左子树，缺失值（NaN）走默认方向，
+叶子值之和加上由 base_score 换算的初始边际，再经过logistic变换。
+
+节点重新编号：每棵树按广度优先排列，左右子节点相邻（右 = 左 + 1）；
+叶子节点的阈值为 NaN、子节点指向自身，遍历固定层数后所有路径都停在叶子上
+（x >= NaN 恒为假，输入为 +inf 时也不会离开叶子）。
+
+节点数组可保存为模型版本目录下 compiled/ 中的 .npy 文件（registry.py 发布时写入），
+以只读内存映射方式加载，多个工作进程共享同一份页缓存，不必各自重新编译。
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from tracing import span
+
+# 支持的目标函数（输出为logistic变换后的概率）
+SUPPORTED_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+# 大批量按块遍历，限制 (行数, 树数) 节点矩阵的内存占用
+BLOCK_ROWS = 16384
+
+# 模型版本目录下保存编译结果的子目录；节点数组各存为一个 .npy，标量参数存入 compiled.json
+COMPILED_DIR = 'compiled'
+COMPILED_METADATA_FILE = 'compiled.json'
+_ARRAYS = ('feature', 'threshold', 'child', 'default_left', 'value', 'roots')
+
+
+class CompiledTrees:
+    """平铺的树集成节点数组"""
+
+    def __init__(self, feature, threshold, child, default_left, value, roots, depth, base_margin):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float32)
+        self.child = np.ascontiguousarray(child, dtype=np.intp)
+        self.default_left = np.ascontiguousarray(default_left, dtype=bool)
+        self.value = np.ascontiguousarray(value, dtype=np.float32)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.depth = int(depth)
+        self.base_margin = float(base_margin)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_booster(cls, booster):
+        """由 Booster 的JSON模型编译"""
+        model = json.loads(bytes(booster.save_raw(raw_format='json')))
+        learner = model['learner']
+        objective = learner['objective']['name']
+        if objective not in SUPPORTED_OBJECTIVES:
+            raise ValueError(f"不支持的目标函数：{objective}")
+        gbm = learner['gradient_booster']
+        if gbm['name'] != 'gbtree':
+            raise ValueError(f"只支持gbtree模型，实际为 {gbm['name']}")
+
+        # base_score 为概率，换算为对数几率空间的初始边际（新版本保存为 "[8.2E-1]" 形式）
+        base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+        base_margin = np.log(base_score / (1.0 - base_score))
+
+        features, thresholds, children, defaults, values, roots = [], [], [], [], [], []
+        depth, offset = 0, 0
+        for tree in gbm['model']['trees']:
+            if any(tree.get('split_type', [])):
+                raise ValueError("不支持类别型分裂")
+            tree_arrays, tree_depth = _flatten_tree(tree, offset)
+            for out, array in zip((features, thresholds, children, defaults, values), tree_arrays):
+                out.append(array)
+            roots.append(offset)
+            offset += len(tree_arrays[0])
+            depth = max(depth, tree_depth)
+
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(children),
+                   np.concatenate(defaults), np.concatenate(values), roots, depth, base_margin)
+
+    def save(self, directory):
+        """把节点数组保存为 .npy（dtype与加载后一致，内存映射时不需要转换）"""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, COMPILED_METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'depth': self.depth, 'base_margin': self.base_margin, 'n_nodes': self.n_nodes}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """加载 save() 保存的节点数组；mmap_mode='r' 时为只读内存映射"""
+        with open(os.path.join(directory, COMPILED_METADATA_FILE), encoding='utf-8') as f:
+            metadata = json.load(f)
+        arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in _ARRAYS]
+        return cls(*arrays, metadata['depth'], metadata['base_margin'])
+
+    def margin(self, X):
+        """各行的边际（对数几率）；X 为 float32 的 (n, n_features) 矩阵"""
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        # 行偏移 + 特征号 即为该行该特征在 flat 中的位置
+        row_offset = (np.arange(n_rows) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        has_missing = np.isnan(flat).any()
+        for _ in range(self.depth):
+            x = flat[row_offset + self.feature[nodes]]
+            go_right = x >= self.threshold[nodes]
+            if has_missing:
+                go_right |= np.isnan(x) & ~self.default_left[nodes]
+            nodes = self.child[nodes] + go_right
+        return self.value[nodes].sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def predict(self, X):
+        """累积活产概率（一维数组）"""
+        if len(X) <= BLOCK_ROWS:
+            margin = self.margin(X)
+        else:
+            margin = np.concatenate([self.margin(X[i:i + BLOCK_ROWS]) for i in range(0, len(X), BLOCK_ROWS)])
+        return 1.0 / (1.0 + np.exp(-margin))
+
+
+def _flatten_tree(tree, offset):
+    """把一棵树按广度优先重新编号，返回节点数组和深度"""
+    left, right = tree['left_children'], tree['right_children']
+    order, levels = [0], [0]
+    for node, level in zip(order, levels):
+        if left[node] != -1:
+            order.extend((left[node], right[node]))
+            levels.extend((level + 1, level + 1))
+    position = {node: i for i, node in enumerate(order)}
+
+    n_nodes = len(order)
+    feature = np.zeros(n_nodes, dtype=np.intp)
+    threshold = np.full(n_nodes, np.nan, dtype=np.float32)
+    child = np.arange(offset, offset + n_nodes, dtype=np.intp)
+    default_left = np.ones(n_nodes, dtype=bool)
+    value = np.zeros(n_nodes, dtype=np.float32)
+    for i, node in enumerate(order):
+        if left[node] == -1:
+            # 叶子：split_conditions 中保存的是叶子值
+            value[i] = tree['split_conditions'][node]
+        else:
+            feature[i] = tree['split_indices'][node]
+            threshold[i] = tree['split_conditions'][node]
+            child[i] = offset + position[left[node]]
+            default_left[i] = bool(tree['default_left'][node])
+    return (feature, threshold, child, default_left, value), max(levels)
+
+
+class CompiledPredictor:
+    """与 inference.FusedPredictor 接口相同的编译推理预测器
+
+    标准化在float64上完成后转为float32（与 Booster.inplace_predict 的内部转换一致），
+    缓冲区按线程分配，可在多线程中共用同一实例。
+    """
+
+    def __init__(self, trees, mean, scale):
+        self.trees = trees
+        self.mean = np.ascontiguousarray(mean, dtype=np.float64)
+        self.scale = np.ascontiguousarray(scale, dtype=np.float64)
+        self.n_features = len(self.mean)
+        self._local = threading.local()
+
+    @classmethod
+    def from_artifacts(cls, model, scaler):
+        """由 load_artifacts() 或 load_exported() 的模型和标准化器构建"""
+        from inference import BoosterClassifier
+
+        booster = model.booster if isinstance(model, BoosterClassifier) else model.get_booster()
+        return cls(CompiledTrees.from_booster(booster), scaler.mean_, scaler.scale_)
+
+    @classmethod
+    def from_version_dir(cls, model, scaler, path):
+        """模型版本目录中有预先编译的节点数组时以内存映射加载，否则在进程内编译"""
+        compiled_dir = os.path.join(path, COMPILED_DIR)
+        if not os.path.isdir(compiled_dir):
+            return cls.from_artifacts(model, scaler)
+        return cls(CompiledTrees.load(compiled_dir, mmap_mode='r'), scaler.mean_, scaler.scale_)
+
+    def _scaled(self, X):
+        buf = getattr(self._local, 'buf', None)
+        if buf is None or len(buf) < len(X):
+            buf = np.empty((max(len(X), 64), self.n_features), dtype=np.float64)
+            self._local.buf = buf
+        buf = buf[:len(X)]
+        np.subtract(X, self.mean, out=buf)
+        np.divide(buf, self.scale, out=buf)
+        return buf.astype(np.float32)
+
+    def predict(self, X):
+        """返回累积活产概率（一维数组）"""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"特征数量应为 {self.n_features}，实际为 {X.shape[1]}")
+
+        with span('scaler.transform'):
+            scaled = self._scaled(X)
+        with span('predict_proba'):
+            return self.trees.predict(scaled)
+
+    def predict_proba(self, X):
+        """返回 n×2 概率矩阵（无累积活产、累积活产）"""
+        birth_prob = self.predict(X)
+        return np.column_stack([1.0 - birth_prob, birth_prob])
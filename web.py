@@ -1,13 +1,26 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
-import pickle
-import matplotlib.pyplot as plt
-import matplotlib
-import shap
+import os
+import sys
+import threading
 import warnings
 
+from fonts import apply_chinese_font
+from inference import (load_artifacts, get_risk_level, risk_levels, out_of_bounds,
+                       FEATURE_INPUTS)
+from explain import build_explainer, positive_class_shap, check_additivity, contribution_table
+from render import ExplanationRenderer, bar_svg, beeswarm_svg, dependence_svg, heatmap_svg, response_curve_svg
+from cache import PredictionCache
+from cohort_shap import COHORT_DIR, META_FILE, CohortExplanations
+from percentiles import OUTPUT_COLUMN, load_index
+from drift_monitor import DRIFT_DIR, DriftMonitor, version_state_dir
+from audit_log import AuditLog
+from calibration import load_calibration
+from whatif import sweep_1d, sweep_2d
+from registry import DEFAULT_ENGINE, ModelRegistry, ModelVersion
+from tracing import span, tracer
+
 # 忽略不必要的警告
 warnings.filterwarnings('ignore', category=UserWarning)
 warnings.filterwarnings('ignore', category=FutureWarning)
@@ -17,51 +30,6 @@ warnings.filterwarnings('ignore', category=DeprecationWarning)
 if not hasattr(np, 'bool'):
     np.bool = bool
 
-# 全局设置matplotlib字体，确保负号正常显示
-def setup_chinese_font():
-    """设置中文字体"""
-    try:
-        import matplotlib.font_manager as fm
-
-        # 尝试多种中文字体
-        chinese_fonts = [
-            'WenQuanYi Zen Hei',  # 文泉驿正黑（Linux常用）
-            'WenQuanYi Micro Hei',  # 文泉驿微米黑
-            'SimHei',  # 黑体
-            'Microsoft YaHei',  # 微软雅黑
-            'PingFang SC',  # 苹果字体
-            'Hiragino Sans GB',  # 冬青黑体
-            'Noto Sans CJK SC',  # Google Noto字体
-            'Source Han Sans SC'  # 思源黑体
-        ]
-
-        # 获取系统可用字体
-        available_fonts = [f.name for f in fm.fontManager.ttflist]
-
-        # 查找可用的中文字体
-        for font in chinese_fonts:
-            if font in available_fonts:
-                matplotlib.rcParams['font.sans-serif'] = [font, 'DejaVu Sans', 'Arial']
-                matplotlib.rcParams['font.family'] = 'sans-serif'
-                print(f"使用中文字体: {font}")
-                return font
-
-        # 如果没有找到中文字体，使用默认字体
-        matplotlib.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial', 'Liberation Sans']
-        matplotlib.rcParams['font.family'] = 'sans-serif'
-        print("未找到中文字体，使用默认字体")
-        return None
-
-    except Exception as e:
-        print(f"字体设置失败: {e}")
-        matplotlib.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
-        matplotlib.rcParams['font.family'] = 'sans-serif'
-        return None
-
-# 设置字体和负号显示
-chinese_font = setup_chinese_font()
-matplotlib.rcParams['axes.unicode_minus'] = False
-
 # 设置页面标题和布局
 st.set_page_config(
     page_title="接受辅助生殖治疗的多囊卵巢综合征患者累积活产率预测系统V1.0",
@@ -69,9 +37,28 @@ st.set_page_config(
     layout="wide"
 )
 
-# 设置中文字体和负号显示
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+# 加载解释相关的重依赖（matplotlib）并设置字体和负号显示
+def _import_explanation_stack():
+    import matplotlib.pyplot  # noqa: F401
+
+    # 字体在进程内只解析一次，并持久化到磁盘缓存
+    chinese_font = apply_chinese_font()
+    print(f"使用中文字体: {chinese_font}" if chinese_font else "未找到中文字体，使用默认字体")
+
+# 后台线程预热解释依赖，首屏输入表单无需等待这些导入（每个进程只启动一次）
+@st.cache_resource
+def start_warmup():
+    thread = threading.Thread(target=_import_explanation_stack, name='explain-warmup', daemon=True)
+    thread.start()
+    return thread
+
+# 获取解释依赖；预热尚未完成时在此等待导入结束
+def explanation_stack():
+    start_warmup().join()
+    import matplotlib.pyplot as plt
+    return plt
+
+start_warmup()
 
 # 定义全局变量
 global feature_names, feature_dict, variable_descriptions
@@ -110,20 +97,315 @@ variable_descriptions = {
     'Cycles': '移植总周期数（次）'
 }
 
-# 加载XGBoost模型和相关文件
+# 模型注册表：设置环境变量 MODEL_NAME 时从版本化注册表加载（MODEL_VERSION 可固定版本），
+# 否则加载目录下的模型文件；推理引擎默认为编译推理，MODEL_ENGINE=xgboost 改用Booster
+MODEL_NAME = os.environ.get('MODEL_NAME')
+MODEL_VERSION = os.environ.get('MODEL_VERSION')
+MODEL_ENGINE = os.environ.get('MODEL_ENGINE', DEFAULT_ENGINE)
+
 @st.cache_resource
+def get_registry():
+    registry = ModelRegistry(engine=MODEL_ENGINE)
+    with span('load_model'):
+        registry.activate(MODEL_NAME, MODEL_VERSION)
+    return registry
+
+# 加载XGBoost模型和相关文件（含预测器：标准化与推理合并，热路径中不构造pandas对象）
+@st.cache_resource
+def load_default_model():
+    with span('load_model'):
+        return ModelVersion.from_artifacts(*load_artifacts(), engine=MODEL_ENGINE)
+
+# 当前模型版本；未固定版本时检查注册表中是否发布了新版本并原子切换，切换后释放旧版本
 def load_model():
-    # 加载XGBoost模型
-    model = joblib.load('./best_xgboost_model.pkl')
+    if not MODEL_NAME:
+        return load_default_model()
+    registry = get_registry()
+    if not MODEL_VERSION:
+        previous = registry.active(MODEL_NAME)
+        try:
+            if registry.refresh(MODEL_NAME):
+                registry.unload(MODEL_NAME, previous.version)
+                release_model_version(previous)
+                print(f"模型已切换：{previous.key} → {registry.active(MODEL_NAME).key}", file=sys.stderr)
+        except Exception as e:
+            # 新版本不完整或校验失败时继续使用当前版本
+            print(f"检查模型新版本失败: {e}", file=sys.stderr)
+    return registry.active(MODEL_NAME)
+
+# 释放旧版本的解释器缓存并停止其漂移监控线程
+def release_model_version(model_version):
+    load_explainer.clear()
+    monitors, lock = get_drift_monitors()
+    with lock:
+        monitor = monitors.pop(model_version.key, None)
+    if monitor is not None:
+        monitor.stop()
+
+# 解释图渲染器（进程内共享，渲染结果按模型版本、输入向量和SHAP向量LRU缓存）
+@st.cache_resource
+def get_renderer():
+    return ExplanationRenderer(maxsize=256)
+
+# 预测结果缓存（重复提交相同输入时直接复用概率、SHAP值和图表）
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache.from_inputs(FEATURE_INPUTS, feature_names_display, maxsize=1024)
+
+# 加载SHAP解释器（按模型版本缓存，避免每次点击重建）
+@st.cache_resource
+def load_explainer(model_key, _model_version):
+    model, feature_columns = _model_version.model, _model_version.feature_columns
+
+    # 使用XGBoost原生TreeSHAP，解释器只在进程内构建一次
+    with span('build_explainer'):
+        explainer = build_explainer(model)
 
-    # 加载标准化器
-    scaler = joblib.load('./scaler.pkl')
+    # 预热一次（shap后端首次计算SHAP值后expected_value才与shap_values的输出口径一致）
+    explainer.shap_values(pd.DataFrame(np.zeros((1, len(feature_columns))), columns=feature_columns))
+    expected_values = explainer.expected_value
 
-    # 加载特征列名
-    with open('./feature_columns.pkl', 'rb') as f:
-        feature_columns = pickle.load(f)
+    return explainer, expected_values
+
+# 参考人群百分位索引（percentiles.npz 不存在时返回None）
+@st.cache_resource
+def load_percentiles():
+    return load_index()
+
+# 各模型版本的输入漂移监控（每个版本单独的状态目录，后台线程定期写入快照，重启后从快照恢复；
+# 模型切换后停止旧版本的监控）
+@st.cache_resource
+def get_drift_monitors():
+    return {}, threading.Lock()
+
+def load_drift_monitor(model_version):
+    monitors, lock = get_drift_monitors()
+    with lock:
+        monitor = monitors.get(model_version.key)
+        if monitor is None:
+            monitor = DriftMonitor.from_artifacts(model_version.scaler, model_version.feature_columns, load_percentiles(),
+                                                  state_dir=version_state_dir(DRIFT_DIR, model_version.key)).start()
+            monitors[model_version.key] = monitor
+    return monitor
+
+# 概率校准查找表及风险分层边界（calibration.npz 不存在时为恒等映射和 0.3/0.7 分层）
+@st.cache_resource
+def get_calibrator():
+    return load_calibration()
+
+# 预测审计日志（进程内共享；记录入队后由后台线程批量写入SQLite）
+@st.cache_resource
+def get_audit_log():
+    return AuditLog()
+
+# 参考人群SHAP矩阵（内存映射，只读取汇总统计和抽样行）；未预先计算时返回None
+@st.cache_resource
+def load_cohort():
+    if not os.path.exists(os.path.join(COHORT_DIR, META_FILE)):
+        return None
+    try:
+        return CohortExplanations(COHORT_DIR)
+    except ValueError as e:
+        # 旧版本生成的参考人群（SHAP值基于未标准化的输入）不再显示
+        warnings.warn(str(e))
+        return None
+
+# 参考人群蜂群图（按参考人群内容的摘要缓存：追加患者或重新生成后自动重新渲染）
+@st.cache_data(max_entries=4)
+def cohort_beeswarm_svg(cohort_fingerprint, feature_labels, max_rows=300):
+    cohort = load_cohort()
+    X, shap_values, _ = cohort.sample(max_rows)
+    return beeswarm_svg(shap_values, X, list(feature_labels), order=np.argsort(-cohort.mean_abs_shap(), kind='stable'))
+
+# 参考人群解释：平均|SHAP|排序、蜂群图和单特征依赖图
+def cohort_view(cohort):
+    labels = [feature_dict.get(f, f) for f in cohort.feature_columns]
+    mean_abs = cohort.mean_abs_shap()
+    order = np.argsort(-mean_abs, kind='stable')
+
+    st.markdown(f"参考人群共 **{cohort.n_rows}** 例，平均累积活产概率 "
+                f"**{cohort.meta['prob_sum'] / cohort.n_rows:.2%}**")
+
+    st.subheader("平均|SHAP|排序")
+    st.markdown(bar_svg(mean_abs[order], [labels[i] for i in order]), unsafe_allow_html=True)
+
+    st.subheader("SHAP蜂群图")
+    with span('cohort_beeswarm'):
+        beeswarm = cohort_beeswarm_svg(cohort.fingerprint, tuple(labels))
+    st.markdown(f'<div style="overflow-x:auto">{beeswarm}</div>', unsafe_allow_html=True)
+
+    st.subheader("SHAP依赖图")
+    j = st.selectbox("选择特征", list(order), format_func=lambda i: labels[i])
+    X, shap_values, _ = cohort.sample(2000)
+    last_patient = st.session_state.get('last_patient')
+    highlight = None
+    if last_patient is not None:
+        highlight = (last_patient['features'][j], last_patient['shap_value'][j])
+    st.markdown(dependence_svg(X[:, j], shap_values[:, j], labels[j], highlight=highlight), unsafe_allow_html=True)
+
+    # 新患者只追加一行并累加汇总统计，不重新计算整个参考人群；
+    # 同一患者（按输入框步长量化的输入）在本会话中只加入一次，重复点击或重跑不会产生重复行
+    if last_patient is not None:
+        added = st.session_state.setdefault('cohort_added', set())
+        patient_key = (cohort.cohort_dir, get_prediction_cache().key(last_patient['features']))
+        if patient_key in added:
+            st.caption("当前患者已加入参考人群")
+        elif st.button("将当前患者加入参考人群"):
+            cohort.add(last_patient['features'], last_patient['shap_value'], last_patient['birth_prob'])
+            added.add(patient_key)
+            st.success(f"已加入参考人群（共 {cohort.n_rows} 例）")
+
+# 假设分析默认展示的治疗参数
+WHATIF_FEATURES = ['S_Dose', 'T_Dose', 'Cycles']
+
+# 假设分析：以当前患者为基准改变一个或两个特征，整批网格只做一次批量预测
+def whatif_view(model_version, base):
+    columns = list(model_version.feature_columns)
+    labels = {f: feature_dict.get(f, f) for f in columns}
+
+    st.subheader("单因素响应曲线")
+    features_1d = st.multiselect("调整的特征", columns, default=WHATIF_FEATURES, format_func=labels.get)
+    n_points = st.slider("每个特征的取值个数", 10, 500, 100, step=10)
+    calibrator = get_calibrator()
+    with span('whatif_1d'):
+        curves = sweep_1d(model_version.predictor, base, columns, features_1d, n_points)
+    chart_columns = st.columns(3)
+    for k, (feature, (values, probs)) in enumerate(curves.items()):
+        with chart_columns[k % 3]:
+            st.markdown(response_curve_svg(values, calibrator.calibrate(probs), labels[feature],
+                                           base[columns.index(feature)], calibrator.thresholds),
+                        unsafe_allow_html=True)
+
+    st.subheader("双因素响应面")
+    col_x, col_y, col_n = st.columns(3)
+    feature_x = col_x.selectbox("横轴特征", columns, index=columns.index('S_Dose'), format_func=labels.get)
+    feature_y = col_y.selectbox("纵轴特征", columns, index=columns.index('T_Dose'), format_func=labels.get)
+    n_grid = col_n.slider("每轴取值个数", 10, 100, 60, step=5)
+    if feature_x == feature_y:
+        st.info("请选择两个不同的特征")
+        return
+    with span('whatif_2d'):
+        values_x, values_y, probs = sweep_2d(model_version.predictor, base, columns, feature_x, feature_y, n_grid)
+    base_point = (base[columns.index(feature_x)], base[columns.index(feature_y)])
+    st.markdown(heatmap_svg(values_x, values_y, calibrator.calibrate(probs), labels[feature_x], labels[feature_y], base=base_point),
+                unsafe_allow_html=True)
+
+# 批量评分每块行数（每块完成后更新一次进度条）
+BULK_CHUNK_SIZE = 5000
+
+# 读取上传的CSV/Excel文件（Excel需要openpyxl，只支持.xlsx）
+def read_upload(uploaded):
+    if uploaded.name.lower().endswith('.xlsx'):
+        return pd.read_excel(uploaded)
+    return pd.read_csv(uploaded)
+
+# 校验并分块评分上传的患者；结果按文件和模型版本保存在会话中，之后的交互不再重新评分
+def score_upload(uploaded, model_version):
+    columns = list(model_version.feature_columns)
+    try:
+        df = read_upload(uploaded)
+    except ImportError:
+        st.error("读取Excel文件需要安装 openpyxl，也可另存为CSV后上传")
+        return None
+    except Exception as e:
+        st.error(f"无法读取文件: {e}")
+        return None
+
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        st.error(f"文件缺少特征列: {', '.join(missing)}")
+        return None
+    if df.empty:
+        st.warning("文件中没有患者记录")
+        return None
+
+    # 15个特征列只转换一次为NumPy矩阵，校验、评分和单行解释都直接使用它
+    X = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    invalid = out_of_bounds(X, columns)
+    valid_rows = np.flatnonzero(~invalid.any(axis=1))
+
+    calibrator = get_calibrator()
+    raw_probs = np.full(len(df), np.nan)
+    progress = st.progress(0.0, text="正在评分……")
+    with span('bulk_score'):
+        for start in range(0, len(valid_rows), BULK_CHUNK_SIZE):
+            rows = valid_rows[start:start + BULK_CHUNK_SIZE]
+            raw_probs[rows] = model_version.predictor.predict(X[rows])
+            done = start + len(rows)
+            progress.progress(done / len(valid_rows), text=f"正在评分……{done}/{len(valid_rows)}")
+    progress.empty()
+    probs = calibrator.calibrate(raw_probs)
+
+    # 结果列直接加到上传的DataFrame上，不另建副本
+    df['birth_prob'] = probs
+    df['risk_level'] = risk_levels(np.nan_to_num(probs), calibrator.thresholds)
+    df.loc[invalid.any(axis=1), 'risk_level'] = '输入超出范围'
+
+    # 已评分的行写入审计日志（不含SHAP向量）
+    get_audit_log().log_many(model_version.key, X[valid_rows], probs[valid_rows],
+                             df['risk_level'].to_numpy()[valid_rows], 'bulk', raw_probs[valid_rows])
+    return {
+        'file_id': uploaded.file_id,
+        'model': model_version.key,
+        'df': df,
+        'X': X,
+        'raw_probs': raw_probs,
+        'invalid': invalid
+    }
+
+# 批量上传标签页：校验汇总、结果预览与下载、单行SHAP解释
+def bulk_view(model_version):
+    uploaded = st.file_uploader("上传患者文件（CSV或Excel .xlsx），需包含15个特征列，列名同变量说明中的英文名",
+                                type=['csv', 'xlsx'])
+    if uploaded is None:
+        return
 
-    return model, scaler, feature_columns
+    state = st.session_state.get('bulk')
+    if state is None or state['file_id'] != uploaded.file_id or state['model'] != model_version.key:
+        state = score_upload(uploaded, model_version)
+        if state is None:
+            return
+        st.session_state['bulk'] = state
+
+    columns = list(model_version.feature_columns)
+    df, X, invalid = state['df'], state['X'], state['invalid']
+    n_invalid = int(invalid.any(axis=1).sum())
+    st.markdown(f"共 **{len(df)}** 行，已评分 **{len(df) - n_invalid}** 行，超出输入范围或缺失 **{n_invalid}** 行")
+    if n_invalid:
+        counts = invalid.sum(axis=0)
+        st.table(pd.DataFrame({
+            '特征': [feature_dict.get(c, c) for c in columns],
+            '允许范围': [f"{FEATURE_INPUTS[c]['min_value']} ~ {FEATURE_INPUTS[c]['max_value']}" for c in columns],
+            '不合格行数': counts
+        })[counts > 0])
+
+    # 预览只发送前1000行，完整结果通过下载获取
+    st.dataframe(df.head(1000))
+    # CSV在点击下载时才生成，会话中不保存编码后的副本
+    st.download_button("下载评分结果（CSV）", lambda: df.to_csv(index=False).encode('utf-8-sig'),
+                       file_name="评分结果.csv", mime="text/csv")
+
+    # 单行SHAP解释（按需计算）
+    row = st.number_input("查看单行SHAP解释（行号从0开始）", min_value=0, max_value=len(df) - 1, value=0, step=1)
+    if invalid[row].any():
+        st.warning("该行输入超出范围或缺失，未评分")
+        return
+    st.markdown(f"第 {row} 行：累积活产概率 **{df['birth_prob'].iat[row]:.2%}**（{df['risk_level'].iat[row]}）")
+    # SHAP值在模型实际评分的标准化输入上计算，瀑布图显示原始特征值；
+    # 与单患者预测相同，解释失败（含加性校验不通过）时只提示该行，不中断页面
+    try:
+        explainer, expected_values = load_explainer(model_version.key, model_version)
+        with span('shap_values'):
+            X_scaled = model_version.scaler.transform(X[row:row + 1])
+            shap_matrix, expected_value = positive_class_shap(explainer.shap_values(X_scaled), expected_values)
+        check_additivity(shap_matrix, expected_value, state['raw_probs'][row:row + 1])
+        waterfall = get_renderer().waterfall(shap_matrix[0], expected_value, X[row],
+                                             [feature_dict.get(c, c) for c in columns], max_display=15,
+                                             model_key=model_version.key)
+    except Exception as e:
+        st.error(f"无法生成第 {row} 行的SHAP解释: {str(e)}")
+        return
+    st.markdown(f'<div style="overflow-x:auto">{waterfall}</div>', unsafe_allow_html=True)
 
 # 主应用
 def main():
@@ -167,67 +449,72 @@ def main():
     st.title("接受辅助生殖治疗的多囊卵巢综合征患者累积活产率预测系统V1.0")
     st.markdown("### 基于XGBoost算法的累积活产率评估")
 
-    # 加载模型
-    try:
-        model, scaler, feature_columns = load_model()
-        st.sidebar.success("XGBoost模型加载成功！")
-    except Exception as e:
-        st.sidebar.error(f"模型加载失败: {e}")
-        return
-    
     # 创建输入表单
     st.header("患者信息输入")
     # st.markdown("### 请填写以下15个关键指标")
 
     # 创建标签页来组织输入
-    tab1, tab2, tab3, tab4 = st.tabs(["病人基线信息", "促排过程监测", "触发排卵指标", "胚胎检测与移植"])
+    tab1, tab2, tab3, tab4, tab_bulk = st.tabs(["病人基线信息", "促排过程监测", "触发排卵指标", "胚胎检测与移植", "批量上传"])
 
     with tab1:
         st.subheader("病人基线信息")
         col1, col2 = st.columns(2)
 
         with col1:
-            age = st.number_input("女方年龄（岁）", min_value=18, max_value=50, value=30)
-            ldl = st.number_input("低密度脂蛋白胆固醇（mmol/L）", min_value=1.0, max_value=8.0, value=2.8, step=0.1)
-            bprl = st.number_input("基线泌乳素（ng/mL）", min_value=1.0, max_value=100.0, value=15.0, step=0.1)
+            age = st.number_input("女方年龄（岁）", **FEATURE_INPUTS['age'])
+            ldl = st.number_input("低密度脂蛋白胆固醇（mmol/L）", **FEATURE_INPUTS['LDL'])
+            bprl = st.number_input("基线泌乳素（ng/mL）", **FEATURE_INPUTS['bPRL'])
 
         with col2:
-            be2 = st.number_input("基线雌二醇（pg/mL）", min_value=10.0, max_value=200.0, value=40.0, step=1.0)
-            amh = st.number_input("抗缪勒氏激素（ng/mL）", min_value=0.1, max_value=20.0, value=3.0, step=0.1)
+            be2 = st.number_input("基线雌二醇（pg/mL）", **FEATURE_INPUTS['bE2'])
+            amh = st.number_input("抗缪勒氏激素（ng/mL）", **FEATURE_INPUTS['AMH'])
 
     with tab2:
         st.subheader("促排过程监测")
         col1, col2 = st.columns(2)
 
         with col1:
-            s_dose = st.number_input("促性腺激素起始剂量（IU）", min_value=75, max_value=450, value=225)
-            t_dose = st.number_input("促性腺激素总剂量（IU）", min_value=500, max_value=5000, value=2250)
-            d5_fsh = st.number_input("促排第5天促卵泡刺激素（mIU/mL）", min_value=1.0, max_value=50.0, value=8.0, step=0.1)
+            s_dose = st.number_input("促性腺激素起始剂量（IU）", **FEATURE_INPUTS['S_Dose'])
+            t_dose = st.number_input("促性腺激素总剂量（IU）", **FEATURE_INPUTS['T_Dose'])
+            d5_fsh = st.number_input("促排第5天促卵泡刺激素（mIU/mL）", **FEATURE_INPUTS['D5_FSH'])
 
         with col2:
-            d5_lh = st.number_input("促排第5天促黄体生成素（mIU/mL）", min_value=0.5, max_value=30.0, value=3.0, step=0.1)
-            d5_e2 = st.number_input("促排第5天雌二醇（pg/mL）", min_value=50.0, max_value=2000.0, value=200.0, step=10.0)
+            d5_lh = st.number_input("促排第5天促黄体生成素（mIU/mL）", **FEATURE_INPUTS['D5_LH'])
+            d5_e2 = st.number_input("促排第5天雌二醇（pg/mL）", **FEATURE_INPUTS['D5_E2'])
     
     with tab3:
         st.subheader("触发排卵指标")
         col1, col2 = st.columns(2)
 
         with col1:
-            hcg_e2 = st.number_input("HCG日雌二醇（pg/mL）", min_value=500.0, max_value=8000.0, value=2000.0, step=50.0)
+            hcg_e2 = st.number_input("HCG日雌二醇（pg/mL）", **FEATURE_INPUTS['HCG_E2'])
 
         with col2:
-            hcg_lh = st.number_input("HCG日促黄体生成素（mIU/mL）", min_value=0.1, max_value=20.0, value=1.0, step=0.1)
+            hcg_lh = st.number_input("HCG日促黄体生成素（mIU/mL）", **FEATURE_INPUTS['HCG_LH'])
 
     with tab4:
         st.subheader("胚胎检测指标与移植周期数")
         col1, col2 = st.columns(2)
 
         with col1:
-            ocytes = st.number_input("获卵数（个）", min_value=1, max_value=50, value=12)
-            bfr = st.number_input("囊胚形成率（%）", min_value=0.0, max_value=100.0, value=40.0, step=1.0)
+            ocytes = st.number_input("获卵数（个）", **FEATURE_INPUTS['Ocytes'])
+            bfr = st.number_input("囊胚形成率（%）", **FEATURE_INPUTS['BFR'])
 
         with col2:
-            cycles = st.number_input("移植总周期数（次）", min_value=1, max_value=10, value=1)
+            cycles = st.number_input("移植总周期数（次）", **FEATURE_INPUTS['Cycles'])
+
+    # 加载模型（放在输入表单之后，首次加载时表单可先行显示）；本次运行始终使用同一个版本
+    try:
+        model_version = load_model()
+        model, feature_columns = model_version.model, model_version.feature_columns
+        st.sidebar.success(f"XGBoost模型加载成功！（{model_version.key}）" if MODEL_NAME else "XGBoost模型加载成功！")
+    except Exception as e:
+        st.sidebar.error(f"模型加载失败: {e}")
+        return
+
+    # 批量上传（模型加载后再渲染该标签页的内容）
+    with tab_bulk:
+        bulk_view(model_version)
 
     # 创建预测按钮
     predict_button = st.button("预测累积活产率", type="primary")
@@ -239,21 +526,27 @@ def main():
             d5_fsh, d5_lh, d5_e2, hcg_e2, hcg_lh, ocytes, bfr, cycles
         ]
 
-        # 转换为DataFrame（包含15个特征列）
-        input_df = pd.DataFrame([features], columns=feature_columns)
-
-        # 标准化连续变量（所有15个变量都是连续变量）
-        continuous_vars = ['age', 'LDL', 'bPRL', 'bE2', 'AMH', 'S_Dose', 'T_Dose',
-                          'D5_FSH', 'D5_LH', 'D5_E2', 'HCG_E2', 'HCG_LH', 'Ocytes', 'BFR', 'Cycles']
-
-        # 创建输入数据的副本用于标准化
-        input_scaled = input_df.copy()
-        input_scaled[continuous_vars] = scaler.transform(input_df[continuous_vars])
-
-        # 进行预测
-        prediction = model.predict_proba(input_scaled)[0]
-        no_birth_prob = prediction[0]
-        birth_prob = prediction[1]
+        # 相同输入（按输入框步长量化）直接复用缓存的预测、SHAP值和图表
+        prediction_cache = get_prediction_cache()
+        cache_key = (model_version.key, prediction_cache.key(features))
+        result = prediction_cache.get(cache_key)
+        if result is None:
+            result = {}
+            prediction_cache.put(cache_key, result)
+
+        # 进行预测（所有15个变量都是连续变量，标准化在融合预测器中原地完成）
+        if 'prediction' not in result:
+            result['prediction'] = model_version.predictor.predict_proba(np.array(features, dtype=np.float64))[0]
+        prediction = result['prediction']
+        raw_birth_prob = prediction[1]
+
+        # 显示和风险分层使用校准后的概率；百分位索引、漂移监控和参考人群基于模型原始输出
+        calibrator = get_calibrator()
+        birth_prob = calibrator.calibrate(raw_birth_prob)
+        no_birth_prob = 1.0 - birth_prob
+
+        # 记录到漂移监控（只追加到待处理列表，缓存命中的重复提交同样计入线上流量）
+        load_drift_monitor(model_version).record(features, raw_birth_prob)
         
         # 显示预测结果
         st.header("累积活产率预测结果")
@@ -270,11 +563,24 @@ def main():
             st.progress(float(birth_prob))
             st.write(f"{birth_prob:.2%}")
 
+        if not calibrator.is_identity:
+            st.caption(f"概率已按本中心 {calibrator.n_samples} 例带结局数据校准（{calibrator.method}）")
+
         # 风险评估
-        risk_level = "低概率" if birth_prob < 0.3 else "中等概率" if birth_prob < 0.7 else "高概率"
-        risk_color = "red" if birth_prob < 0.3 else "orange" if birth_prob < 0.7 else "green"
+        risk_level, risk_color = get_risk_level(birth_prob, calibrator.thresholds)
 
         st.markdown(f"### 累积活产评估: <span style='color:{risk_color}'>{risk_level}</span>", unsafe_allow_html=True)
+
+        # 该患者在参考人群中的位置（模型输出和15个输入特征的百分位，一次查询）
+        percentile_index = load_percentiles()
+        feature_percentiles = None
+        if percentile_index is not None:
+            percentiles = percentile_index.percentiles(
+                list(features) + [raw_birth_prob], list(feature_columns) + [OUTPUT_COLUMN]
+            )
+            feature_percentiles = percentiles[:-1]
+            st.markdown(f"累积活产概率高于参考人群中 **{percentiles[-1]:.1f}%** 的患者"
+                        f"（参考人群 {percentile_index.n_rows} 例）")
         
 
         
@@ -282,291 +588,133 @@ def main():
         st.write("---")
         st.subheader("模型解释")
 
+        # 解释部分先放占位符：依次计算SHAP值、渲染瀑布图和力图，完成一项填入一项
+        st.subheader("特征贡献分析")
+        table_slot = st.empty()
+        st.subheader("SHAP瀑布图")
+        waterfall_slot = st.empty()
+        st.subheader("SHAP力图")
+        force_slot = st.empty()
+        for slot in (table_slot, waterfall_slot, force_slot):
+            slot.caption("正在生成解释……")
+
         try:
-            # 创建SHAP解释器
-            explainer = shap.TreeExplainer(model)
-            shap_values = explainer.shap_values(input_df)
-
-            # 处理SHAP值格式 - 形状为(1, 10, 2)表示1个样本，10个特征，2个类别
-            if isinstance(shap_values, np.ndarray) and len(shap_values.shape) == 3:
-                # 取第一个样本的正类（DKD类，索引1）的SHAP值
-                shap_value = shap_values[0, :, 1]  # 形状变为(10,)
-                expected_value = explainer.expected_value[1]  # 正类的期望值
-            elif isinstance(shap_values, list):
-                # 如果是列表格式，取正类的SHAP值
-                shap_value = np.array(shap_values[1][0])
-                expected_value = explainer.expected_value[1] if isinstance(explainer.expected_value, list) else explainer.expected_value
-            else:
-                shap_value = np.array(shap_values[0])
-                expected_value = explainer.expected_value
+            # 转换为DataFrame（包含15个特征列，供SHAP解释使用）
+            input_df = pd.DataFrame([features], columns=feature_columns)
+
+            if 'shap_value' not in result:
+                # 获取缓存的SHAP解释器
+                explainer, expected_values = load_explainer(model_version.key, model_version)
+
+                # SHAP值在模型实际评分的标准化输入上计算；表格和图中显示原始特征值
+                X_scaled = model_version.scaler.transform(input_df.to_numpy(dtype=np.float64))
+                with span('shap_values'):
+                    shap_values = explainer.shap_values(X_scaled)
+
+                # 统一SHAP输出格式，取正类（累积活产）的SHAP值和期望值；期望值 + ΣSHAP 须还原出模型输出
+                shap_matrix, expected_value = positive_class_shap(shap_values, expected_values)
+                check_additivity(shap_matrix, expected_value, [raw_birth_prob])
+                result['expected_value'] = expected_value
+                result['shap_value'] = shap_matrix[0]
+            shap_value = result['shap_value']
+            expected_value = result['expected_value']
+
+            # 记录当前患者，供参考人群依赖图标注和加入参考人群使用
+            st.session_state['last_patient'] = {
+                'features': features,
+                'shap_value': shap_value,
+                'birth_prob': raw_birth_prob
+            }
+
+            # 瀑布图和力图（按输入向量缓存渲染结果），在表格显示之后依次渲染
+            renderer = get_renderer()
+            feature_values = input_df.iloc[0].values
+            feature_labels = [feature_dict.get(f, f) for f in feature_names_display]
+            renders = {
+                'waterfall_svg': ('waterfall_render', lambda: renderer.waterfall(
+                    shap_value, expected_value, feature_values, feature_labels, 15,  # 显示所有15个特征
+                    model_key=model_version.key)),
+                'force_svg': ('force_plot_render', lambda: renderer.force(
+                    shap_value, expected_value, feature_values, feature_labels, model_key=model_version.key))
+            }
 
             # 特征贡献分析表格
-            st.subheader("特征贡献分析")
-
-            # 创建贡献表格
-            feature_values = []
-            feature_impacts = []
-
-            # 获取SHAP值（现在没有ID列了）
-            for i, feature in enumerate(feature_names_display):
-                # 在input_df中查找对应的特征
-                feature_values.append(float(input_df[feature].iloc[0]))
-                # SHAP值现在应该是一维数组，直接使用索引
-                impact_value = float(shap_value[i])
-                feature_impacts.append(impact_value)
-
-            shap_df = pd.DataFrame({
-                '特征': [feature_dict.get(f, f) for f in feature_names_display],
-                '数值': feature_values,
-                '影响': feature_impacts
-            })
-
-            # 按绝对影响排序
-            shap_df['绝对影响'] = shap_df['影响'].abs()
-            shap_df = shap_df.sort_values('绝对影响', ascending=False)
-
-            # 显示表格
-            st.table(shap_df[['特征', '数值', '影响']])
-            
-            # SHAP瀑布图
-            st.subheader("SHAP瀑布图")
-            try:
-                # 创建SHAP瀑布图
-                import matplotlib.font_manager as fm
-
-                # 尝试设置中文字体
-                try:
-                    # 尝试使用系统中文字体（包含Linux云端服务器常用字体）
-                    chinese_fonts = [
-                        'WenQuanYi Zen Hei',  # 文泉驿正黑（Linux常用）
-                        'WenQuanYi Micro Hei',  # 文泉驿微米黑（Linux常用）
-                        'Noto Sans CJK SC',  # Google Noto字体
-                        'Source Han Sans SC',  # 思源黑体
-                        'SimHei',  # 黑体
-                        'Microsoft YaHei',  # 微软雅黑
-                        'PingFang SC',  # 苹果字体
-                        'Hiragino Sans GB'  # 冬青黑体
-                    ]
-                    available_fonts = [f.name for f in fm.fontManager.ttflist]
-
-                    chinese_font = None
-                    for font in chinese_fonts:
-                        if font in available_fonts:
-                            chinese_font = font
-                            break
-
-                    if chinese_font:
-                        plt.rcParams['font.sans-serif'] = [chinese_font, 'DejaVu Sans']
-                        plt.rcParams['font.family'] = 'sans-serif'
-                    else:
-                        # 如果没有中文字体，使用英文字体
-                        plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
-                        plt.rcParams['font.family'] = 'sans-serif'
-
-                except Exception:
-                    # 字体设置失败，使用默认字体
-                    plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
-                    plt.rcParams['font.family'] = 'sans-serif'
-
-                plt.rcParams['axes.unicode_minus'] = False
-
-                fig_waterfall = plt.figure(figsize=(12, 8))
-
-                # 创建英文特征名（确保云端显示正常）
-                english_feature_map = {
-                    'Insemination': 'Treatment_Method', 'Complication': 'Complication',
-                    'Years': 'Infertility_Years', 'Type': 'Infertility_Type',
-                    'age': 'Female_Age', 'BMI': 'BMI', 'AMH': 'AMH', 'AFC': 'AFC',
-                    'FBG': 'Fasting_Glucose', 'TC': 'Total_Cholesterol', 'TG': 'Triglycerides',
-                    'HDL': 'HDL_Cholesterol', 'LDL': 'LDL_Cholesterol',
-                    'bFSH': 'Baseline_FSH', 'bLH': 'Baseline_LH', 'bPRL': 'Baseline_PRL',
-                    'bE2': 'Baseline_E2', 'bP': 'Baseline_P', 'bT': 'Baseline_T',
-                    'D3_FSH': 'Day3_FSH', 'D3_LH': 'Day3_LH', 'D3_E2': 'Day3_E2',
-                    'D5_FSH': 'Day5_FSH', 'D5_LH': 'Day5_LH', 'D5_E2': 'Day5_E2',
-                    'COS': 'Stimulation_Protocol', 'S_Dose': 'Starting_Dose',
-                    'T_Days': 'Treatment_Days', 'T_Dose': 'Total_Dose',
-                    'HCG_LH': 'HCG_Day_LH', 'HCG_E2': 'HCG_Day_E2', 'HCG_P': 'HCG_Day_P',
-                    'Ocytes': 'Retrieved_Oocytes', 'MII': 'MII_Rate', '2PN': 'Fertilization_Rate',
-                    'CR': 'Cleavage_Rate', 'GVE': 'Good_Embryo_Rate',
-                    'BFR': 'Blastocyst_Rate', 'Stage': 'Transfer_Stage',
-                    'Cycles': 'Transfer_Cycles'
-                }
-
-                english_names = [english_feature_map.get(f, f) for f in feature_names_display]
-
-                # 尝试使用中文特征名，如果失败则使用英文
-                try:
-                    # 首先尝试中文特征名
-                    shap.waterfall_plot(
-                        shap.Explanation(
-                            values=shap_value,  # 现在没有ID列了
-                            base_values=expected_value,
-                            data=input_df.iloc[0].values,  # 现在没有ID列了
-                            feature_names=[feature_dict.get(f, f) for f in feature_names_display]
-                        ),
-                        max_display=15,  # 显示所有15个特征
-                        show=False
-                    )
-                    # st.success("✅ 瀑布图使用中文特征名显示")
-                except Exception as chinese_error:
-                    st.warning("中文特征名显示失败，使用英文特征名")
-                    # 如果中文失败，使用英文特征名
-                    shap.waterfall_plot(
-                        shap.Explanation(
-                            values=shap_value,
-                            base_values=expected_value,
-                            data=input_df.iloc[0].values,
-                            feature_names=english_names
-                        ),
-                        max_display=15,
-                        show=False
-                    )
-
-                # 手动设置中文字体和修复负号显示
-                for ax in fig_waterfall.get_axes():
-                    # 设置坐标轴标签字体
-                    ax.tick_params(labelsize=10)
-
-                    # 修复所有文本的字体和负号
-                    for text in ax.texts:
-                        text_content = text.get_text()
-                        # 替换unicode minus
-                        if '−' in text_content:
-                            text.set_text(text_content.replace('−', '-'))
-                        # 设置字体
-                        if chinese_font:
-                            text.set_fontfamily(chinese_font)
-                        text.set_fontsize(10)
-
-                    # 设置y轴标签字体
-                    for label in ax.get_yticklabels():
-                        if chinese_font:
-                            label.set_fontfamily(chinese_font)
-                        label.set_fontsize(10)
-
-                    # 设置x轴标签字体
-                    for label in ax.get_xticklabels():
-                        if chinese_font:
-                            label.set_fontfamily(chinese_font)
-                        label.set_fontsize(10)
-
-                plt.tight_layout()
-                st.pyplot(fig_waterfall)
-                plt.close(fig_waterfall)
-
-
-            except Exception as e:
-                st.error(f"无法生成瀑布图: {str(e)}")
-                # 使用条形图作为替代（跳过ID列）
-                fig_bar = plt.figure(figsize=(10, 6))
-
-                # 设置中文字体
-                try:
-                    import matplotlib.font_manager as fm
-                    chinese_fonts = ['SimHei', 'Microsoft YaHei', 'PingFang SC', 'Hiragino Sans GB', 'WenQuanYi Micro Hei']
-                    available_fonts = [f.name for f in fm.fontManager.ttflist]
-
-                    chinese_font = None
-                    for font in chinese_fonts:
-                        if font in available_fonts:
-                            chinese_font = font
-                            break
-
-                    if chinese_font:
-                        plt.rcParams['font.sans-serif'] = [chinese_font, 'DejaVu Sans']
-                    else:
-                        plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
-                except Exception:
-                    plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
-
-                plt.rcParams['axes.unicode_minus'] = False
-
-                sorted_idx = np.argsort(np.abs(shap_value))[-15:]  # 显示所有15个特征
-
-                bars = plt.barh(range(len(sorted_idx)), shap_value[sorted_idx])
+            shap_df = contribution_table(
+                input_df[feature_names_display].iloc[0].values,
+                shap_value,
+                feature_labels
+            )
 
-                # 设置y轴标签（特征名）
-                feature_labels = [feature_dict.get(feature_names_display[i], feature_names_display[i]) for i in sorted_idx]
-                plt.yticks(range(len(sorted_idx)), feature_labels)
+            # 各特征取值在参考人群中的百分位（shap_df保留原特征顺序的索引）
+            if feature_percentiles is not None:
+                shap_df['人群百分位'] = [f"{p:.1f}%" for p in feature_percentiles[shap_df.index]]
 
-                plt.xlabel('SHAP值')
-                plt.title('特征对累积活产预测的影响')
-
-                # 为正负值设置不同颜色
-                for i, bar in enumerate(bars):
-                    if shap_value[sorted_idx[i]] >= 0:
-                        bar.set_color('lightcoral')
-                    else:
-                        bar.set_color('lightblue')
-
-                plt.tight_layout()
-                st.pyplot(fig_bar)
-                plt.close(fig_bar)
-
-            # SHAP力图
-            st.subheader("SHAP力图")
-
-            try:
-                # 使用官方SHAP力图，HTML格式
-                import streamlit.components.v1 as components
-                import matplotlib
-
-                # 设置字体确保负号显示
-                matplotlib.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial', 'Liberation Sans']
-                matplotlib.rcParams['axes.unicode_minus'] = False
-
-                force_plot = shap.force_plot(
-                    expected_value,
-                    shap_value,  # 现在没有ID列了
-                    input_df.iloc[0],  # 现在没有ID列了
-                    feature_names=[feature_dict.get(f, f) for f in feature_names_display]
-                )
-
-                # 获取SHAP的HTML内容，添加CSS来修复遮挡问题
-                shap_html = f"""
-                <head>
-                    {shap.getjs()}
-                    <style>
-                        body {{
-                            margin: 0;
-                            padding: 20px 10px 40px 10px;
-                            overflow: visible;
-                        }}
-                        .force-plot {{
-                            margin: 20px 0 40px 0 !important;
-                            padding: 20px 0 40px 0 !important;
-                        }}
-                        svg {{
-                            margin: 20px 0 40px 0 !important;
-                        }}
-                        .tick text {{
-                            margin-bottom: 20px !important;
-                        }}
-                        .force-plot-container {{
-                            min-height: 200px !important;
-                            padding-bottom: 50px !important;
-                        }}
-                    </style>
-                </head>
-                <body>
-                    <div class="force-plot-container">
-                        {force_plot.html()}
-                    </div>
-                </body>
-                """
-
-                # 增加更多高度空间
-                components.html(shap_html, height=400, scrolling=False)
-
-            except Exception as e:
-                st.error(f"无法生成HTML力图: {str(e)}")
-                st.info("请检查SHAP版本是否兼容")
+            # 显示表格
+            table_slot.table(shap_df)
+
+            def show_waterfall(error=None):
+                if error is None:
+                    waterfall_slot.markdown(f'<div style="overflow-x:auto">{result["waterfall_svg"]}</div>',
+                                            unsafe_allow_html=True)
+                    return
+
+                with waterfall_slot.container():
+                    st.error(f"无法生成瀑布图: {str(error)}")
+                    # 使用条形图作为替代（跳过ID列）
+                    plt = explanation_stack()
+                    fig_bar = plt.figure(figsize=(10, 6))
+
+                    # 设置中文字体（复用进程内已解析的字体）
+                    chinese_font = apply_chinese_font()
+
+                    sorted_idx = np.argsort(np.abs(shap_value))[-15:]  # 显示所有15个特征
+
+                    bars = plt.barh(range(len(sorted_idx)), shap_value[sorted_idx])
+
+                    # 设置y轴标签（特征名）
+                    bar_labels = [feature_dict.get(feature_names_display[i], feature_names_display[i]) for i in sorted_idx]
+                    plt.yticks(range(len(sorted_idx)), bar_labels)
+
+                    plt.xlabel('SHAP值')
+                    plt.title('特征对累积活产预测的影响')
+
+                    # 为正负值设置不同颜色
+                    for i, bar in enumerate(bars):
+                        if shap_value[sorted_idx[i]] >= 0:
+                            bar.set_color('lightcoral')
+                        else:
+                            bar.set_color('lightblue')
+
+                    plt.tight_layout()
+                    st.pyplot(fig_bar)
+                    plt.close(fig_bar)
+
+            def show_force(error=None):
+                if error is None:
+                    force_slot.markdown(f'<div style="overflow-x:auto">{result["force_svg"]}</div>',
+                                        unsafe_allow_html=True)
+                else:
+                    force_slot.error(f"无法生成力图: {str(error)}")
+
+            show = {'waterfall_svg': show_waterfall, 'force_svg': show_force}
+            for key, (stage, render) in renders.items():
+                if key not in result:
+                    try:
+                        with span(stage):
+                            result[key] = render()
+                    except Exception as e:
+                        show[key](e)
+                        continue
+                show[key]()
             
         except Exception as e:
             st.error(f"无法生成SHAP解释: {str(e)}")
             import traceback
             st.error(traceback.format_exc())
             st.info("使用模型特征重要性作为替代")
+            for slot in (table_slot, waterfall_slot, force_slot):
+                slot.empty()
+            plt = explanation_stack()
 
             # 显示模型特征重要性
             st.write("---")
@@ -583,26 +731,8 @@ def main():
 
                 fig, ax = plt.subplots(figsize=(12, 8))
 
-                # 设置中文字体
-                try:
-                    import matplotlib.font_manager as fm
-                    chinese_fonts = ['SimHei', 'Microsoft YaHei', 'PingFang SC', 'Hiragino Sans GB', 'WenQuanYi Micro Hei']
-                    available_fonts = [f.name for f in fm.fontManager.ttflist]
-
-                    chinese_font = None
-                    for font in chinese_fonts:
-                        if font in available_fonts:
-                            chinese_font = font
-                            break
-
-                    if chinese_font:
-                        plt.rcParams['font.sans-serif'] = [chinese_font, 'DejaVu Sans']
-                    else:
-                        plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
-                except Exception:
-                    plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
-
-                plt.rcParams['axes.unicode_minus'] = False
+                # 设置中文字体（复用进程内已解析的字体）
+                chinese_font = apply_chinese_font()
 
                 bars = plt.barh(range(len(importance_df)), importance_df['重要性'], color='skyblue')
                 plt.yticks(range(len(importance_df)), importance_df['特征'])
@@ -611,7 +741,7 @@ def main():
                 plt.title('特征重要性')
 
                 # 设置字体
-                if 'chinese_font' in locals() and chinese_font:
+                if chinese_font:
                     ax.set_xlabel('重要性', fontfamily=chinese_font)
                     ax.set_ylabel('特征', fontfamily=chinese_font)
                     ax.set_title('特征重要性', fontfamily=chinese_font)
@@ -626,5 +756,50 @@ def main():
             except Exception as e2:
                 st.error(f"无法显示特征重要性: {str(e2)}")
 
+        # 写入审计日志（输入、模型版本、概率、风险分层和SHAP向量；SHAP计算失败时只记录预测）
+        get_audit_log().log(model_version.key, features, birth_prob, risk_level,
+                            result.get('shap_value'), result.get('expected_value'), raw_prob=raw_birth_prob)
+
+    # 假设分析（以最近一次预测的患者为基准）
+    last_patient = st.session_state.get('last_patient')
+    if last_patient is not None:
+        with st.expander("假设分析：调整治疗参数后的累积活产概率", expanded=True):
+            whatif_view(model_version, last_patient['features'])
+
+    # 参考人群解释（预先用 cohort_shap.py 计算参考人群SHAP矩阵后显示）
+    cohort = load_cohort()
+    if cohort is not None and cohort.refresh().n_rows:
+        with st.expander("参考人群模型解释"):
+            cohort_view(cohort)
+
+    # 预测缓存命中情况
+    with st.sidebar.expander("预测缓存"):
+        st.json(get_prediction_cache().stats())
+
+    # 各阶段耗时统计（访问时加上 ?admin=1 显示）
+    if st.query_params.get('admin') == '1':
+        with st.expander("性能统计（管理员）"):
+            stage_summary = tracer.summary()
+            if stage_summary:
+                st.dataframe(pd.DataFrame(stage_summary).T.round(3))
+            else:
+                st.info("暂无耗时数据")
+            st.download_button("导出Prometheus指标", tracer.to_prometheus(),
+                               file_name="metrics.prom", mime="text/plain")
+
+        with st.expander("输入漂移与数据质量（管理员）"):
+            drift_monitor = load_drift_monitor(model_version)
+            which = st.radio("统计范围", ['total', 'window'], horizontal=True,
+                             format_func=lambda w: "累计" if w == 'total' else "当前窗口")
+            drift_report = pd.DataFrame(drift_monitor.report(which)).set_index('column')
+            drift_report.index = [feature_dict.get(c, c) for c in drift_report.index]
+            st.caption(f"已记录 {int(drift_report['count'].max())} 次评分；PSI < 0.1 稳定，"
+                       f"0.1~0.25 轻度漂移，> 0.25 显著漂移（特征基线为scaler均值/标准差的正态近似）")
+            st.dataframe(drift_report[['mean', 'mean_shift', 'variance_ratio', 'psi', 'ks', 'drift',
+                                       'missing_rate', 'out_of_range_rate']].round(3))
+
+        with st.expander("预测审计日志（管理员）"):
+            st.json(get_audit_log().stats())
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,64 @@
+"""假设分析（What-if）网格
+
+以当前患者的输入为基准，在输入框范围（inference.FEATURE_INPUTS）内改变一个或两个特征，
+生成整批变体后用一次批量预测得到响应曲线或响应面，不经过SHAP和绘图流水线。
+"""
+import numpy as np
+
+from inference import FEATURE_INPUTS
+
+
+def sweep_values(feature, n_points, base_value=None):
+    """在输入框范围内取约n_points个对齐到步长的取值，并包含当前取值"""
+    spec = FEATURE_INPUTS[feature]
+    lo, hi, step = spec['min_value'], spec['max_value'], spec['step']
+    n_steps = int(round((hi - lo) / step))
+    grid = np.unique(np.round(np.linspace(0, n_steps, min(n_points, n_steps + 1))).astype(np.int64))
+    values = lo + grid * step
+    if base_value is not None:
+        values = np.union1d(values, [base_value])
+    return values.astype(np.float64)
+
+
+def grid_1d(base, feature_columns, feature, values):
+    """(len(values), 15) 矩阵：只把一个特征替换为 values，其余保持基准值"""
+    X = np.tile(np.asarray(base, dtype=np.float64), (len(values), 1))
+    X[:, list(feature_columns).index(feature)] = values
+    return X
+
+
+def grid_2d(base, feature_columns, feature_x, values_x, feature_y, values_y):
+    """(len(values_y) * len(values_x), 15) 矩阵，行优先：第 i*len(values_x)+j 行对应 (values_y[i], values_x[j])"""
+    columns = list(feature_columns)
+    X = np.tile(np.asarray(base, dtype=np.float64), (len(values_x) * len(values_y), 1))
+    grid_y, grid_x = np.meshgrid(values_y, values_x, indexing='ij')
+    X[:, columns.index(feature_x)] = grid_x.ravel()
+    X[:, columns.index(feature_y)] = grid_y.ravel()
+    return X
+
+
+def sweep_1d(predictor, base, feature_columns, features, n_points=100):
+    """多个特征各自的一维响应曲线，所有特征的变体合并为一次批量预测
+
+    返回 {特征: (取值, 累积活产概率)}。
+    """
+    values = {f: sweep_values(f, n_points, base[list(feature_columns).index(f)]) for f in features}
+    if not values:
+        return {}
+    X = np.vstack([grid_1d(base, feature_columns, f, v) for f, v in values.items()])
+    probs = predictor.predict(X)
+
+    curves, offset = {}, 0
+    for f, v in values.items():
+        curves[f] = (v, probs[offset:offset + len(v)])
+        offset += len(v)
+    return curves
+
+
+def sweep_2d(predictor, base, feature_columns, feature_x, feature_y, n_points=60):
+    """两个特征的二维响应面，返回 (x取值, y取值, 概率矩阵[len(y), len(x)])"""
+    columns = list(feature_columns)
+    values_x = sweep_values(feature_x, n_points, base[columns.index(feature_x)])
+    values_y = sweep_values(feature_y, n_points, base[columns.index(feature_y)])
+    probs = predictor.predict(grid_2d(base, columns, feature_x, values_x, feature_y, values_y))
+    return values_x, values_y, probs.reshape(len(values_y), len(values_x))